@@ -6,83 +6,381 @@ Batch Markdown to HTML Converter
 """
 
 import argparse
+import contextlib
+import fnmatch
+import hashlib
+import io
+import json
+import os
 import sys
+import tempfile
 from pathlib import Path
-from typing import List
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from markdown_to_html import WeChatHTMLConverter
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Iterator, Sequence
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from markdown_to_html import (WeChatHTMLConverter, StageTimer, available_themes, convert_themes,
+                              read_markdown, write_html, CONVERTER_VERSION)
+from batch_report import BatchReport, peak_rss_kb, print_report_summary
+from shard_plan import ShardPlan, parse_shard, load_timings, write_shard_manifest, merge_shard_manifests, print_merge_summary
 import time
 
+# 增量构建清单文件名（位于输出目录；未指定输出目录时位于输入目录）
+MANIFEST_NAME = '.wechat-manifest.json'
+
+# 执行方式：线程池（默认）或进程池。转换是纯Python的CPU计算，受GIL限制，
+# 多核机器上进程池才能真正并行
+EXECUTORS = ('thread', 'process')
+DEFAULT_THREAD_WORKERS = 4
+
+# Markdown文件扩展名
+MARKDOWN_SUFFIXES = ('.md', '.markdown')
+
+# 同时在途的任务数上限 = 并发数 × 该系数；文件边发现边提交，内存占用与目录规模无关
+SUBMIT_WINDOW_FACTOR = 2
+
+# 进程池模式下每个工作进程各自持有的转换器（_init_worker 中创建一次，之后复用）
+_worker_converters: Dict[str, WeChatHTMLConverter] = {}
+
+
+def _init_worker(themes: Sequence[str]) -> None:
+    """工作进程初始化：为每个主题创建本进程的转换器（主题编译结果从磁盘缓存读取）"""
+    global _worker_converters
+    _worker_converters = {theme: WeChatHTMLConverter(theme=theme) for theme in themes}
+
+
+def _convert_in_worker(input_file: Path, output_files: Dict[str, Path], collect_metrics: bool = False) -> tuple:
+    """在工作进程中转换并直接写出文件，只把结果记录（不含HTML）传回父进程"""
+    return _convert_file(_worker_converters, input_file, output_files, collect_metrics)
+
+
+def _convert_file(converters: Dict[str, WeChatHTMLConverter], input_file: Path, output_files: Dict[str, Path],
+                  collect_metrics: bool = False) -> tuple:
+    """
+    转换单个文件，返回 (是否成功, 源文件, 输出路径或错误信息, 耗时, 性能指标)
+
+    多个主题时一次解析扇出到所有主题（convert_themes），输出路径为各主题输出的列表。
+    collect_metrics 为 True 时性能指标包含各阶段耗时、输入输出字节数和峰值内存，否则为 None
+    """
+    timings = {} if collect_metrics else None
+    try:
+        start_time = time.perf_counter()
+        if len(converters) == 1:
+            (theme, converter), = converters.items()
+            output_path = converter.convert_file(str(input_file), str(output_files[theme]), timings)
+            output_paths = [output_path]
+        else:
+            timer = StageTimer(timings)
+            markdown_text = read_markdown(str(input_file))
+            timer.mark('read')
+            rendered = convert_themes(markdown_text, list(converters.values()), timings)
+            timer = StageTimer(timings)
+            output_paths = [write_html(rendered[theme], str(input_file), str(output_files[theme]))
+                            for theme in converters]
+            timer.mark('write')
+            output_path = output_paths
+        elapsed = time.perf_counter() - start_time
+
+        metrics = None
+        if collect_metrics:
+            metrics = {
+                'elapsed': round(elapsed, 6),
+                'input_bytes': os.path.getsize(input_file),
+                'output_bytes': sum(os.path.getsize(path) for path in output_paths),
+                'peak_rss_kb': peak_rss_kb(),
+                'pid': os.getpid(),
+                'stages': {stage: round(seconds, 6) for stage, seconds in timings.items()},
+            }
+        return True, input_file, output_path, elapsed, metrics
+
+    except Exception as e:
+        return False, input_file, str(e), 0, None
+
+
+def _as_list(value) -> list:
+    return value if isinstance(value, list) else [value]
+
+
+def _single_or_list(values: list):
+    return values[0] if len(values) == 1 else values
+
+
+def _matches_any(rel_path: str, name: str, patterns: Sequence[str]) -> bool:
+    """相对路径或文件名匹配任一glob模式"""
+    return any(fnmatch.fnmatch(rel_path, p) or fnmatch.fnmatch(name, p) for p in patterns)
+
+
+def iter_markdown_files(input_path: str, recursive: bool = False,
+                        include: Sequence[str] = (), exclude: Sequence[str] = ()) -> Iterator[Path]:
+    """
+    基于 os.scandir 逐个产出Markdown文件，边遍历边过滤
+
+    Args:
+        include: glob模式，指定后只保留匹配的文件（匹配相对输入目录的路径或文件名）
+        exclude: glob模式，匹配的文件被跳过，匹配的目录整个不再进入
+
+    每个目录内按名称排序，整体顺序稳定；不跟随指向目录的符号链接，避免循环
+    """
+    path = Path(input_path)
+
+    if path.is_file():
+        if path.suffix.lower() in MARKDOWN_SUFFIXES:
+            return iter([path])
+        print(f'⚠️  警告: {path} 不是Markdown文件，已跳过')
+        return iter([])
+
+    if not path.is_dir():
+        raise FileNotFoundError(f'路径不存在: {input_path}')
+
+    def walk(directory: str, rel_dir: str) -> Iterator[Path]:
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            print(f'⚠️  警告: 无法读取目录 {directory}: {e}')
+            return
+
+        subdirs = []
+        for entry in entries:
+            rel_path = f'{rel_dir}{entry.name}'
+            if exclude and _matches_any(rel_path, entry.name, exclude):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append((entry.path, rel_path))
+            elif (os.path.splitext(entry.name)[1].lower() in MARKDOWN_SUFFIXES
+                    and (not include or _matches_any(rel_path, entry.name, include))):
+                yield Path(entry.path)
+
+        if recursive:
+            for sub_path, rel_path in subdirs:
+                yield from walk(sub_path, f'{rel_path}/')
+
+    return walk(str(path), '')
+
+
+def default_workers(executor: str) -> int:
+    """默认并发数：进程池为CPU核心数，线程池为4"""
+    if executor == 'process':
+        return os.cpu_count() or 1
+    return DEFAULT_THREAD_WORKERS
+
 
 class BatchConverter:
     """批量转换器"""
 
-    def __init__(self, theme: str = 'tech', output_dir: str = None, workers: int = 4):
-        self.theme = theme
+    def __init__(self, theme: str = 'tech', output_dir: str = None, workers: Optional[int] = None,
+                 force: bool = False, manifest_dir: str = None, executor: str = 'thread',
+                 manifest_name: str = MANIFEST_NAME, report: Optional[BatchReport] = None,
+                 themes: Optional[Sequence[str]] = None):
+        if executor not in EXECUTORS:
+            raise ValueError(f'不支持的执行方式: {executor}（可选: {", ".join(EXECUTORS)}）')
+        # 多主题：每篇文章只解析一次，同时输出所有主题（输出文件名带主题，见 output_paths_for）
+        self.themes = list(dict.fromkeys(themes)) if themes else [theme]
+        self.theme = ','.join(self.themes)
         self.output_dir = Path(output_dir) if output_dir else None
-        self.workers = workers
-        self.converter = WeChatHTMLConverter(theme=theme)
+        self.executor = executor
+        self.workers = workers or default_workers(executor)
+        self.converters = {name: WeChatHTMLConverter(theme=name) for name in self.themes}
+        self.converter = self.converters[self.themes[0]]
+
+        # 增量构建：清单记录每个源文件的内容哈希，源文件、主题和转换器版本都未变化时跳过
+        self.force = force
+        self.manifest_dir = Path(manifest_dir) if manifest_dir else self.output_dir
+        self.manifest_name = manifest_name
+        self.manifest = self.load_manifest()
 
         # 统计信息
         self.total_files = 0
         self.success_count = 0
         self.failed_count = 0
+        self.skipped_count = 0
         self.failed_files = []
 
-    def find_markdown_files(self, input_path: str, recursive: bool = False) -> List[Path]:
-        """查找Markdown文件"""
-        path = Path(input_path)
+        # 每个文件的结果记录：源文件 → {status, output, elapsed, error}
+        self.results: Dict[Path, Dict[str, Any]] = {}
 
-        if path.is_file():
-            if path.suffix.lower() in ['.md', '.markdown']:
-                return [path]
-            else:
-                print(f'⚠️  警告: {path} 不是Markdown文件，已跳过')
-                return []
+        # 性能报告（--report）：启用后逐文件采集各阶段耗时
+        self.report = report
 
-        elif path.is_dir():
-            pattern = '**/*.md' if recursive else '*.md'
-            markdown_files = list(path.glob(pattern))
+    def find_markdown_files(self, input_path: str, recursive: bool = False,
+                            include: Sequence[str] = (), exclude: Sequence[str] = ()) -> List[Path]:
+        """查找Markdown文件（一次性返回排序后的列表；批量转换请直接传入 iter_markdown_files 的结果）"""
+        return sorted(iter_markdown_files(input_path, recursive, include, exclude))
 
-            # 也查找.markdown扩展名
-            markdown_pattern = '**/*.markdown' if recursive else '*.markdown'
-            markdown_files.extend(path.glob(markdown_pattern))
+    def _manifest_path(self) -> Optional[Path]:
+        return self.manifest_dir / self.manifest_name if self.manifest_dir else None
 
-            return sorted(set(markdown_files))
+    def _manifest_key(self, path: Path) -> str:
+        """清单中的路径相对于清单所在目录保存，整个目录移动后清单依然有效"""
+        return os.path.relpath(os.path.abspath(path), os.path.abspath(self.manifest_dir))
 
-        else:
-            raise FileNotFoundError(f'路径不存在: {input_path}')
+    def load_manifest(self) -> Dict[str, Dict[str, Any]]:
+        """
+        读取增量构建清单，返回 源文件 → 记录 映射
 
-    def convert_single_file(self, input_file: Path) -> tuple:
-        """转换单个文件"""
+        主题CSS或转换器版本变化时所有输出都需要重新生成，返回空清单
+        """
+        manifest_path = self._manifest_path()
+        if manifest_path is None:
+            return {}
         try:
-            # 确定输出文件路径
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        if (manifest.get('version') != CONVERTER_VERSION
+                or manifest.get('theme') != self.theme
+                or manifest.get('theme_hash') != self.theme_hash):
+            return {}
+        return manifest.get('files', {})
+
+    def save_manifest(self) -> None:
+        """写入增量构建清单（先写临时文件再原子替换）"""
+        manifest_path = self._manifest_path()
+        if manifest_path is None:
+            return
+        manifest = {
+            'version': CONVERTER_VERSION,
+            'theme': self.theme,
+            'theme_hash': self.theme_hash,
+            'files': dict(sorted(self.manifest.items())),
+        }
+        tmp_path = manifest_path.with_name(f'{manifest_path.name}.{os.getpid()}.tmp')
+        manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, manifest_path)
+
+    def _fingerprint(self, input_file: Path, entry: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        源文件指纹（大小、修改时间、内容哈希）
+
+        大小和修改时间都与清单一致时直接沿用记录的哈希，不再读取文件；
+        只是 touch 过而内容未变的文件会重新计算哈希，并仍被判定为未变化
+        """
+        stat = input_file.stat()
+        if entry and entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+            source_hash = entry['source_hash']
+        else:
+            source_hash = hashlib.sha256(input_file.read_bytes()).hexdigest()
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'source_hash': source_hash}
+
+    @property
+    def theme_hash(self) -> str:
+        """主题CSS哈希（多主题时为各主题哈希的组合），任一主题修改后增量清单失效"""
+        if len(self.themes) == 1:
+            return self.converter.theme_hash
+        combined = ','.join(self.converters[name].theme_hash for name in self.themes)
+        return hashlib.sha256(combined.encode('utf-8')).hexdigest()
+
+    def output_path_for(self, input_file: Path) -> Path:
+        """源文件对应的输出路径（多主题时为第一个主题的输出）"""
+        return self.output_paths_for(input_file)[self.themes[0]]
+
+    def output_paths_for(self, input_file: Path) -> Dict[str, Path]:
+        """
+        源文件对应的各主题输出路径
+
+        单主题: 输出目录/文章.html，或源文件旁的 文章.html
+        多主题: 输出目录/主题/文章.html，或源文件旁的 文章.主题.html
+        """
+        if len(self.themes) == 1:
             if self.output_dir:
-                output_file = self.output_dir / f'{input_file.stem}.html'
-            else:
-                output_file = input_file.with_suffix('.html')
-
-            # 转换
-            start_time = time.time()
-            output_path = self.converter.convert_file(str(input_file), str(output_file))
-            elapsed = time.time() - start_time
-
-            return True, input_file, output_path, elapsed
-
-        except Exception as e:
-            return False, input_file, str(e), 0
+                return {self.themes[0]: self.output_dir / f'{input_file.stem}.html'}
+            return {self.themes[0]: input_file.with_suffix('.html')}
 
-    def convert_batch(self, input_files: List[Path], show_progress: bool = True) -> None:
-        """批量转换文件"""
-        self.total_files = len(input_files)
-
-        if self.total_files == 0:
-            print('⚠️  未找到Markdown文件')
-            return
+        if self.output_dir:
+            return {theme: self.output_dir / theme / f'{input_file.stem}.html' for theme in self.themes}
+        return {theme: input_file.with_suffix(f'.{theme}.html') for theme in self.themes}
+
+    def _manifest_outputs(self, output_files: Iterable) -> Any:
+        """清单中记录的输出：单主题为一个路径，多主题为路径列表"""
+        outputs = [self._manifest_key(Path(path)) for path in output_files]
+        return outputs[0] if len(self.themes) == 1 else outputs
+
+    def plan(self, input_file: Path) -> Optional[Dict[str, Any]]:
+        """
+        对照清单判断文件是否需要转换
+
+        Returns:
+            需要转换时返回文件指纹（未启用清单时为空字典）；
+            未变化且输出文件仍存在时返回 None，并计入 skipped_count
+        """
+        if not self.manifest_dir:
+            return {}
+
+        entry = self.manifest.get(self._manifest_key(input_file))
+        fingerprint = self._fingerprint(input_file, entry)
+
+        output_files = self.output_paths_for(input_file).values()
+        if (not self.force
+                and entry is not None
+                and entry.get('source_hash') == fingerprint['source_hash']
+                and entry.get('output') == self._manifest_outputs(output_files)
+                and all(path.exists() for path in output_files)):
+            self.skipped_count += 1
+            # 只是修改时间变了：更新记录，下次无需重新计算哈希
+            entry.update(fingerprint)
+            self.results[input_file] = {
+                'status': 'skipped',
+                'output': _single_or_list([str(path) for path in output_files]),
+                'elapsed': entry.get('elapsed'),
+            }
+            if self.report:
+                self.report.record(str(input_file), 'skipped')
+            return None
+        return fingerprint
+
+    def find_stale_outputs(self) -> List[Tuple[str, str]]:
+        """清单中源文件已被删除的记录，返回 [(源文件, 输出文件)]（相对清单目录，多主题时每个输出一条）"""
+        if not self.manifest_dir:
+            return []
+        return [
+            (source, output)
+            for source, entry in sorted(self.manifest.items())
+            if not (self.manifest_dir / source).exists()
+            for output in _as_list(entry['output'])
+        ]
+
+    def prune_stale_outputs(self) -> List[Tuple[str, str]]:
+        """删除源文件已不存在的输出文件，并从清单中移除对应记录"""
+        stale = self.find_stale_outputs()
+        for source, output in stale:
+            try:
+                (self.manifest_dir / output).unlink()
+            except FileNotFoundError:
+                pass
+            self.manifest.pop(source, None)
+        return stale
 
-        print(f'📚 找到 {self.total_files} 个Markdown文件')
+    def convert_single_file(self, input_file: Path) -> tuple:
+        """转换单个文件"""
+        return _convert_file(self.converters, input_file, self.output_paths_for(input_file),
+                             self.report is not None)
+
+    def _create_executor(self) -> Executor:
+        if self.executor == 'process':
+            # 先在父进程编译主题并写入磁盘缓存，工作进程初始化时直接读取，不必各自编译
+            for converter in self.converters.values():
+                converter.compiled_theme
+            return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                       initargs=(self.themes,))
+        return ThreadPoolExecutor(max_workers=self.workers)
+
+    def _submit(self, executor: Executor, input_file: Path):
+        if self.executor == 'process':
+            return executor.submit(_convert_in_worker, input_file, self.output_paths_for(input_file),
+                                   self.report is not None)
+        return executor.submit(self.convert_single_file, input_file)
+
+    def convert_batch(self, input_files: Iterable[Path], show_progress: bool = True) -> None:
+        """
+        批量转换文件
+
+        input_files 可以是生成器（如 iter_markdown_files）：边发现边提交，
+        在途任务数不超过 并发数 × SUBMIT_WINDOW_FACTOR，第一个文件发现后立即开始转换
+        """
         print(f'🎨 使用主题: {self.theme}')
-        print(f'⚙️  并发数: {self.workers}')
+        print(f'⚙️  并发数: {self.workers}（{"进程" if self.executor == "process" else "线程"}）')
         print()
 
         # 确保输出目录存在
@@ -96,42 +394,84 @@ class BatchConverter:
         print('🚀 开始转换...')
         print('─' * 60)
 
-        # 使用线程池并发转换
-        with ThreadPoolExecutor(max_workers=self.workers) as executor:
-            # 提交所有任务
-            future_to_file = {
-                executor.submit(self.convert_single_file, file): file
-                for file in input_files
-            }
+        max_in_flight = self.workers * SUBMIT_WINDOW_FACTOR
+
+        # 使用线程池/进程池并发转换
+        with self._create_executor() as executor:
+            # 在途任务 → 源文件指纹
+            in_flight = {}
+
+            for input_file in input_files:
+                self.total_files += 1
+
+                # 对照清单跳过未变化的文件
+                fingerprint = self.plan(input_file)
+                if fingerprint is None:
+                    continue
 
-            # 处理完成的任务
-            for future in as_completed(future_to_file):
-                success, input_file, result, elapsed = future.result()
-
-                if success:
-                    self.success_count += 1
-                    status = '✅'
-                    output_path = result
-                    message = f'{input_file.name} → {Path(output_path).name} ({elapsed:.2f}s)'
-                else:
-                    self.failed_count += 1
-                    self.failed_files.append((input_file, result))
-                    status = '❌'
-                    message = f'{input_file.name} - 失败: {result}'
-
-                if show_progress:
-                    progress = f'[{self.success_count + self.failed_count}/{self.total_files}]'
-                    print(f'{status} {progress} {message}')
+                # 在途任务已满时先等待至少一个完成，再提交新任务
+                while len(in_flight) >= max_in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._handle_result(future.result(), in_flight.pop(future), show_progress)
+
+                in_flight[self._submit(executor, input_file)] = fingerprint
+
+            # 处理剩余任务
+            for future in as_completed(in_flight):
+                self._handle_result(future.result(), in_flight[future], show_progress)
+
+        self.save_manifest()
+
+        if self.total_files == 0:
+            print('⚠️  未找到Markdown文件')
+        elif self.skipped_count:
+            print(f'⏭️  未变化跳过: {self.skipped_count} 个（--force 强制全部重新转换）')
 
         print('─' * 60)
         print()
 
+    def _handle_result(self, record: tuple, fingerprint: Dict[str, Any], show_progress: bool) -> None:
+        """记录单个文件的转换结果"""
+        success, input_file, result, elapsed, metrics = record
+
+        if success:
+            self.success_count += 1
+            status = '✅'
+            output_path = result
+            if self.manifest_dir:
+                self.manifest[self._manifest_key(input_file)] = {
+                    **fingerprint,
+                    'output': self._manifest_outputs(_as_list(output_path)),
+                    'elapsed': round(elapsed, 4),
+                }
+            self.results[input_file] = {'status': 'success', 'output': output_path, 'elapsed': round(elapsed, 4)}
+            if self.report:
+                self.report.record(str(input_file), 'success', metrics, output=output_path)
+            if isinstance(output_path, list):
+                message = f'{input_file.name} → {len(output_path)} 个主题 ({elapsed:.2f}s)'
+            else:
+                message = f'{input_file.name} → {Path(output_path).name} ({elapsed:.2f}s)'
+        else:
+            self.failed_count += 1
+            self.failed_files.append((input_file, result))
+            self.results[input_file] = {'status': 'failed', 'error': result}
+            if self.report:
+                self.report.record(str(input_file), 'failed', error=result)
+            status = '❌'
+            message = f'{input_file.name} - 失败: {result}'
+
+        if show_progress:
+            # 文件边发现边转换，总数在全部完成前未知
+            print(f'{status} [{self.success_count + self.failed_count}] {message}')
+
     def print_summary(self) -> None:
         """打印转换摘要"""
         print('📊 转换摘要')
         print('─' * 60)
         print(f'总文件数: {self.total_files}')
         print(f'✅ 成功: {self.success_count}')
+        print(f'⏭️  跳过: {self.skipped_count}')
         print(f'❌ 失败: {self.failed_count}')
 
         if self.failed_files:
@@ -144,10 +484,27 @@ class BatchConverter:
 
         # 计算成功率
         if self.total_files > 0:
-            success_rate = (self.success_count / self.total_files) * 100
+            success_rate = ((self.success_count + self.skipped_count) / self.total_files) * 100
             print(f'✨ 成功率: {success_rate:.1f}%')
 
 
+def benchmark(input_files: List[Path], theme: str = 'tech', workers: Optional[int] = None) -> Dict[str, float]:
+    """
+    分别用线程池和进程池转换同一批文件（输出到临时目录，不使用清单），返回各自耗时（秒）
+    """
+    timings = {}
+    for executor in EXECUTORS:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            converter = BatchConverter(theme=theme, output_dir=tmp_dir, workers=workers, executor=executor)
+            start_time = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                converter.convert_batch(input_files, show_progress=False)
+            timings[executor] = time.perf_counter() - start_time
+            if converter.failed_count:
+                raise RuntimeError(f'{executor} 模式有 {converter.failed_count} 个文件转换失败')
+    return timings
+
+
 def main():
     """命令行入口"""
     parser = argparse.ArgumentParser(
@@ -164,17 +521,41 @@ def main():
   # 递归转换目录及子目录下的所有Markdown文件
   python batch_convert.py --input articles/ --recursive
 
+  # 只转换 2024 目录下的文章，跳过草稿
+  python batch_convert.py --input articles/ -r --include '2024/*' --exclude 'drafts' --exclude '*.draft.md'
+
   # 指定输出目录
   python batch_convert.py --input articles/ --output output/ --theme minimal
 
+  # 同时输出三个主题（每篇只解析一次）：output/tech/、output/minimal/、output/business/
+  python batch_convert.py --input articles/ --output output/ --themes tech,minimal,business
+
   # 使用8个并发线程加快转换速度
   python batch_convert.py --input articles/ --workers 8
 
+  # 多核机器上使用进程池（默认进程数为CPU核心数）
+  python batch_convert.py --input articles/ --executor process
+
+  # 对比线程池和进程池的耗时
+  python batch_convert.py --input articles/ --benchmark
+
+  # 逐文件记录各阶段耗时、字节数和峰值内存，汇总吞吐量、p50/p95/p99和最慢文件
+  python batch_convert.py --input articles/ -r --force --report perf.jsonl
+
+  # 忽略增量清单，全部重新转换；删除源文件已不存在的旧输出
+  python batch_convert.py --input articles/ --output output/ --force --prune
+
+  # 分4台机器转换（每台指定自己的分片），按上次的耗时均衡分配，最后合并结果
+  python batch_convert.py --input articles/ -r -o out/ --shard 1/4 --balance-from last-merged.json
+  python batch_convert.py merge out*/.wechat-shard-*-of-4.json -o last-merged.json
+
 转换规则:
   - 默认情况下，HTML文件与Markdown文件在同一目录
   - 使用--output指定统一的输出目录
   - 支持.md和.markdown扩展名
-  - 并发转换提高效率（默认4个线程）
+  - 并发转换提高效率（默认4个线程；--executor process 时默认CPU核心数个进程）
+  - 增量构建：清单 .wechat-manifest.json 记录源文件内容哈希、主题哈希和转换器版本，
+    三者都未变化且输出文件存在时跳过（清单在输出目录，未指定时在输入目录）
         '''
     )
 
@@ -183,37 +564,139 @@ def main():
     parser.add_argument('-o', '--output',
                         help='输出目录（默认：与源文件相同目录）')
     parser.add_argument('-t', '--theme', default='tech',
-                        choices=['tech', 'minimal', 'business'],
+                        choices=list(available_themes()),
                         help='选择主题样式（默认：tech）')
+    parser.add_argument('--themes', metavar='T1,T2,...',
+                        help='同时输出多个主题（逗号分隔），每篇文章只解析一次；'
+                             '输出到 输出目录/主题/，未指定输出目录时为 文章.主题.html')
     parser.add_argument('-r', '--recursive', action='store_true',
                         help='递归查找子目录中的Markdown文件')
-    parser.add_argument('-w', '--workers', type=int, default=4,
-                        help='并发转换的线程数（默认：4）')
+    parser.add_argument('-w', '--workers', type=int,
+                        help=f'并发数（默认：线程池 {DEFAULT_THREAD_WORKERS}，进程池为CPU核心数）')
+    parser.add_argument('-e', '--executor', default='thread', choices=EXECUTORS,
+                        help='执行方式：thread（默认）或 process（多核并行，绕开GIL）')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='分别用线程池和进程池转换到临时目录并对比耗时，不写输出')
+    parser.add_argument('--report', metavar='JSONL',
+                        help='写出性能报告（逐文件各阶段耗时、输入输出字节、峰值内存，末行为汇总）')
+    parser.add_argument('--include', action='append', default=[], metavar='GLOB',
+                        help='只转换匹配的文件（匹配相对输入目录的路径或文件名，可多次指定）')
+    parser.add_argument('--exclude', action='append', default=[], metavar='GLOB',
+                        help='跳过匹配的文件或目录（可多次指定）')
     parser.add_argument('-q', '--quiet', action='store_true',
                         help='静默模式，只显示摘要')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='忽略增量清单，重新转换所有文件')
+    parser.add_argument('--prune', action='store_true',
+                        help='删除源文件已不存在的旧输出（默认只报告）')
+    parser.add_argument('--shard', metavar='i/N',
+                        help='只转换第i个分片（共N个，i从1开始），并写出分片结果清单')
+    parser.add_argument('--balance-from', metavar='JSON',
+                        help='按此文件（上次的合并结果或分片结果清单）中的耗时均衡分片；各分片须使用同一文件')
+    parser.add_argument('--shard-manifest', metavar='JSON',
+                        help='分片结果清单路径（默认：清单目录下 .wechat-shard-i-of-N.json）')
+
+    if sys.argv[1:2] == ['merge']:
+        merge_main(sys.argv[2:])
+        return
 
     args = parser.parse_args()
 
+    themes = None
+    if args.themes:
+        themes = [name.strip() for name in args.themes.split(',') if name.strip()]
+        unknown = [name for name in themes if name not in available_themes()]
+        if unknown:
+            parser.error(f'未知主题: {", ".join(unknown)}（可选: {", ".join(available_themes())}）')
+
     try:
+        if args.benchmark:
+            markdown_files = BatchConverter(theme=args.theme).find_markdown_files(
+                args.input, args.recursive, args.include, args.exclude)
+            if not markdown_files:
+                print('❌ 未找到Markdown文件')
+                sys.exit(1)
+            print(f'⏱️  基准测试: {len(markdown_files)} 个文件，主题 {args.theme}')
+            timings = benchmark(markdown_files, args.theme, args.workers)
+            for executor, elapsed in timings.items():
+                workers = args.workers or default_workers(executor)
+                print(f'   {executor:8s} ({workers} workers): {elapsed:.2f}s  '
+                      f'{len(markdown_files) / elapsed:.1f} 文件/秒')
+            print(f'🚀 进程池加速比: {timings["thread"] / timings["process"]:.2f}x')
+            return
+
+        # 清单位置：输出目录，未指定时为输入目录（输入为单个文件时取其所在目录）
+        input_path = Path(args.input)
+        input_root = input_path if input_path.is_dir() else input_path.parent
+        manifest_dir = args.output or input_root
+
+        # 分片：每个分片有自己的增量清单，多个分片共用输出目录时互不覆盖
+        shard_plan = None
+        manifest_name = MANIFEST_NAME
+        if args.shard:
+            index, count = parse_shard(args.shard)
+            shard_plan = ShardPlan(index, count, load_timings(args.balance_from) if args.balance_from else None)
+            manifest_name = f'.wechat-manifest.{index}-of-{count}.json'
+
         # 创建批量转换器
         converter = BatchConverter(
             theme=args.theme,
             output_dir=args.output,
-            workers=args.workers
+            workers=args.workers,
+            force=args.force,
+            manifest_dir=manifest_dir,
+            executor=args.executor,
+            manifest_name=manifest_name,
+            report=BatchReport(args.report) if args.report else None,
+            themes=themes
         )
 
-        # 查找Markdown文件
-        markdown_files = converter.find_markdown_files(args.input, args.recursive)
+        # 边查找边转换
+        markdown_files = iter_markdown_files(args.input, args.recursive, args.include, args.exclude)
+        if shard_plan:
+            # 分片以相对输入目录的路径为键，各机器检出位置不同也能得到相同的分配
+            markdown_files = (f for f in markdown_files
+                              if shard_plan.owns(f.relative_to(input_root).as_posix()))
+            print(f'🧩 分片: {shard_plan.index}/{shard_plan.count}'
+                  + (f'（按历史耗时均衡，预计 {shard_plan.expected_load():.1f}s）' if shard_plan.timings else ''))
 
-        if not markdown_files:
+        start_time = time.perf_counter()
+        try:
+            converter.convert_batch(markdown_files, show_progress=not args.quiet)
+        finally:
+            report_summary = converter.report.close() if converter.report else None
+
+        if shard_plan:
+            shard_manifest = Path(args.shard_manifest or Path(manifest_dir) / f'.wechat-shard-{index}-of-{count}.json')
+            write_shard_manifest(
+                shard_manifest, index, count, converter.theme,
+                {f.relative_to(input_root).as_posix(): record for f, record in converter.results.items()},
+                time.perf_counter() - start_time,
+            )
+            print(f'🧩 分片结果清单: {shard_manifest}')
+
+        if converter.total_files == 0 and not shard_plan:
             print('❌ 未找到Markdown文件')
             sys.exit(1)
 
-        # 执行批量转换
-        converter.convert_batch(markdown_files, show_progress=not args.quiet)
+        # 源文件已删除的旧输出：报告或清理
+        if args.prune:
+            stale = converter.prune_stale_outputs()
+            converter.save_manifest()
+            for source, output in stale:
+                print(f'🗑️  已删除旧输出: {output}（源文件 {source} 已不存在）')
+        else:
+            stale = converter.find_stale_outputs()
+            for source, output in stale:
+                print(f'⚠️  旧输出: {output}（源文件 {source} 已不存在，--prune 可删除）')
+        if stale:
+            print()
 
         # 打印摘要
         converter.print_summary()
+        if report_summary:
+            print()
+            print_report_summary(report_summary, args.report)
 
         # 退出码
         sys.exit(0 if converter.failed_count == 0 else 1)
@@ -223,5 +706,31 @@ def main():
         sys.exit(1)
 
 
+def merge_main(argv: List[str]) -> None:
+    """merge 子命令：合并各分片结果清单"""
+    parser = argparse.ArgumentParser(
+        prog='batch_convert.py merge',
+        description='合并各分片的结果清单，汇总失败、耗时和输出；合并结果可作为下次的 --balance-from'
+    )
+    parser.add_argument('manifests', nargs='+', help='各分片的结果清单（.wechat-shard-i-of-N.json）')
+    parser.add_argument('-o', '--output', help='合并结果输出路径')
+
+    args = parser.parse_args(argv)
+
+    try:
+        merged = merge_shard_manifests(args.manifests)
+        print_merge_summary(merged)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(merged, f, ensure_ascii=False, indent=1)
+            print(f'💾 合并结果: {args.output}')
+    except (OSError, ValueError, KeyError) as e:
+        print(f'❌ 合并失败: {e}', file=sys.stderr)
+        sys.exit(1)
+
+    failed = any(r['status'] == 'failed' for r in merged['files'].values())
+    sys.exit(1 if failed or merged['missing_shards'] else 0)
+
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batch Conversion Performance Report
+批量转换性能报告：逐文件记录各阶段耗时、输入输出字节数和峰值内存，汇总吞吐量与延迟分位数
+
+报告为JSON Lines，每转换完一个文件写一行（type=file），结束时追加一行汇总（type=summary）：
+  {"type": "file", "file": "...", "status": "success", "elapsed": 0.12, "input_bytes": 4096,
+   "output_bytes": 30512, "peak_rss_kb": 61234, "pid": 123, "stages": {"markdown": 0.03, ...}}
+"""
+
+import json
+import os
+import time
+from typing import Dict, Any, List, Optional, TextIO
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    # Windows 没有 resource 模块，不记录峰值内存
+    RESOURCE_AVAILABLE = False
+
+
+def peak_rss_kb() -> Optional[int]:
+    """
+    当前进程的峰值常驻内存（KB）；不支持的平台返回 None
+
+    这是进程级的历史最高值：线程池模式下所有文件共享同一进程，该值只增不减
+    """
+    if not RESOURCE_AVAILABLE:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为KB，macOS 为字节
+    return peak // 1024 if os.uname().sysname == 'Darwin' else peak
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """最近秩法分位数（sorted_values 须已排序且非空）"""
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class BatchReport:
+    """
+    批量转换性能报告
+
+    每条记录立即写入文件，只在内存中保留汇总所需的耗时列表和各阶段累计值
+    """
+
+    def __init__(self, path: str, slowest: int = 10):
+        self.path = path
+        self.slowest = slowest
+        self._file: TextIO = open(path, 'w', encoding='utf-8')
+        self._started = time.perf_counter()
+        self.wall_time = 0.0
+
+        self.latencies: List[float] = []
+        self.slowest_files: List[tuple] = []
+        self.stage_totals: Dict[str, float] = {}
+        self.input_bytes = 0
+        self.output_bytes = 0
+        self.peak_rss_kb = 0
+        self.counts = {'success': 0, 'failed': 0, 'skipped': 0}
+
+    def record(self, file: str, status: str, metrics: Optional[Dict[str, Any]] = None, **fields) -> None:
+        """记录一个文件的结果（metrics 为转换时采集的 elapsed/input_bytes/output_bytes/stages 等）"""
+        entry = {'type': 'file', 'file': file, 'status': status, **fields, **(metrics or {})}
+        self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+        self.counts[status] = self.counts.get(status, 0) + 1
+        if status != 'success' or not metrics:
+            return
+
+        elapsed = metrics['elapsed']
+        self.latencies.append(elapsed)
+        self.slowest_files.append((elapsed, file))
+        if len(self.slowest_files) > self.slowest * 4:
+            # 定期裁剪，只保留可能进入最慢列表的记录
+            self.slowest_files = sorted(self.slowest_files, reverse=True)[:self.slowest]
+        self.input_bytes += metrics.get('input_bytes', 0)
+        self.output_bytes += metrics.get('output_bytes', 0)
+        self.peak_rss_kb = max(self.peak_rss_kb, metrics.get('peak_rss_kb') or 0)
+        for stage, seconds in metrics.get('stages', {}).items():
+            self.stage_totals[stage] = self.stage_totals.get(stage, 0.0) + seconds
+
+    def summary(self) -> Dict[str, Any]:
+        """汇总：吞吐量、延迟分位数、最慢文件、各阶段累计耗时"""
+        wall_time = self.wall_time or (time.perf_counter() - self._started)
+        latencies = sorted(self.latencies)
+        summary = {
+            'type': 'summary',
+            **self.counts,
+            'wall_time': round(wall_time, 4),
+            'files_per_s': round(len(latencies) / wall_time, 2) if wall_time else 0.0,
+            'mb_per_s': round(self.input_bytes / 1024 / 1024 / wall_time, 3) if wall_time else 0.0,
+            'input_bytes': self.input_bytes,
+            'output_bytes': self.output_bytes,
+            'peak_rss_kb': self.peak_rss_kb or None,
+            'stages': {stage: round(seconds, 4) for stage, seconds in
+                       sorted(self.stage_totals.items(), key=lambda item: -item[1])},
+            'slowest': [{'file': file, 'elapsed': round(elapsed, 4)} for elapsed, file in
+                        sorted(self.slowest_files, reverse=True)[:self.slowest]],
+        }
+        if latencies:
+            summary.update({f'p{p}': round(percentile(latencies, p), 4) for p in (50, 95, 99)})
+        return summary
+
+    def close(self) -> Dict[str, Any]:
+        """写入汇总行并关闭报告文件，返回汇总"""
+        self.wall_time = time.perf_counter() - self._started
+        summary = self.summary()
+        self._file.write(json.dumps(summary, ensure_ascii=False) + '\n')
+        self._file.close()
+        return summary
+
+
+def print_report_summary(summary: Dict[str, Any], path: str) -> None:
+    """打印性能报告摘要"""
+    print('⏱️  性能报告')
+    print('─' * 60)
+    print(f'吞吐量: {summary["files_per_s"]} 文件/秒，{summary["mb_per_s"]} MB/秒'
+          f'（输入 {summary["input_bytes"] / 1024:.0f}KB → 输出 {summary["output_bytes"] / 1024:.0f}KB）')
+    if 'p50' in summary:
+        print(f'单文件延迟: p50 {summary["p50"] * 1000:.0f}ms  p95 {summary["p95"] * 1000:.0f}ms  '
+              f'p99 {summary["p99"] * 1000:.0f}ms')
+    if summary['peak_rss_kb']:
+        print(f'峰值内存: {summary["peak_rss_kb"] / 1024:.1f}MB')
+
+    total = sum(summary['stages'].values())
+    if total:
+        print()
+        print('各阶段累计耗时:')
+        for stage, seconds in summary['stages'].items():
+            print(f'  {stage:22s} {seconds:8.3f}s  {seconds / total * 100:5.1f}%')
+
+    if summary['slowest']:
+        print()
+        print('最慢的文件:')
+        for item in summary['slowest']:
+            print(f'  • {item["file"]}: {item["elapsed"] * 1000:.0f}ms')
+
+    print('─' * 60)
+    print(f'📄 逐文件明细: {path}')
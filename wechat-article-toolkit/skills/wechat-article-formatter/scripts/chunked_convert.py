@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Chunked Parallel Conversion for Large Markdown Documents
+超长文章分块并行转换：在安全的顶层块边界切分，多进程分别转换后按顺序拼接
+
+输出与 WeChatHTMLConverter.convert() 逐字节一致，依据如下：
+  - 只在"空行 + 标题行"处切分，且不在围栏代码块内；标题总是开启新的顶层元素，
+    会结束此前的段落、列表、表格和缩进代码块，两侧的Markdown互不影响
+  - 围栏代码块用 fenced_code 扩展自身的正则识别；有不构成代码块的围栏状行
+    （信息串不合语法，如 ```js title=app.js，或未闭合）时不切分
+  - 文章含顶层原始HTML块（可能跨越空行）时不切分
+  - 引用式链接定义（[id]: url）是全文共享的，复制到每个分块开头（定义本身不产生输出）；
+    同一id定义多次、定义在引用块或列表项等容器内、定义跨行（网址或标题在下一行）时不切分
+  - Markdown输出的顶层元素以换行分隔，各分块结果以换行拼接即与整体转换一致
+  - 主题中没有依赖顶层元素位置的规则（见 CSSInliner.depends_on_top_level_position）
+    且只使用内置DOM pass时，解析、内联样式和序列化也在工作进程中完成；否则工作进程只做
+    Markdown转换和代码高亮，拼接后在主进程统一解析和内联
+
+验证：python -m pytest tests/test_chunked_convert.py（仓库语料 + 边界情况），
+      或 python chunked_convert.py --verify 文章1.md 文章2.md ...
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Dict, Set
+
+from markdown_to_html import WeChatHTMLConverter, StageTimer, available_themes
+
+# 短于此长度的文章直接串行转换（进程间传输和调度的开销超过并行收益）
+MIN_PARALLEL_CHARS = 20000
+
+# 每个工作进程分到的分块数（分块略多于进程数，长短不一的分块更容易均衡）
+CHUNKS_PER_WORKER = 2
+
+FENCE_PATTERN = re.compile(r'^(`{3,}|~{3,})')
+HEADING_PATTERN = re.compile(r'^#{1,6}[ \t]')
+RAW_HTML_PATTERN = re.compile(r'^ {0,3}<[A-Za-z!?/]')
+REFERENCE_PATTERN = re.compile(r'^ {0,3}\[([^\]]+)\]:[ \t]*\S')
+# 去掉容器前缀（缩进、引用块的 >、列表标记）后像引用定义的行，以及定义下一行的标题
+CONTAINED_REFERENCE_PATTERN = re.compile(r'^(?:[ \t]*(?:>|[-*+](?=[ \t])|\d+[.)](?=[ \t])))*[ \t]*\[[^\]]+\]:')
+REFERENCE_TITLE_PATTERN = re.compile(r'^[ \t]*["\'(]')
+
+
+def _fenced_code_lines(markdown_text: str) -> Optional[Set[int]]:
+    """
+    围栏代码块占用的行号（含起止围栏行），与 fenced_code 扩展的识别结果一致
+
+    按扩展自身的 FENCED_BLOCK_RE 从前向后查找，文本先做与 Markdown 相同的空白规范化
+    （展开制表符、清空只含空格的行，均不改变行数）；含单独的 \\r 时行数会变化，返回 None
+    """
+    from markdown.extensions.fenced_code import FencedBlockPreprocessor, get_attrs_and_remainder
+
+    text = markdown_text.replace('\r\n', '\n')
+    if '\r' in text:
+        return None
+    text = re.sub(r'(?<=\n) +\n', '\n', text.expandtabs(4) + '\n\n')
+
+    lines: Set[int] = set()
+    index = 0
+    while True:
+        match = FencedBlockPreprocessor.FENCED_BLOCK_RE.search(text, index)
+        if match is None:
+            return lines
+        if match.group('attrs') and get_attrs_and_remainder(match.group('attrs'))[1]:
+            # 花括号不匹配的 {attrs} 不构成代码块（与扩展一致，跳过后继续查找）
+            index = match.end('attrs')
+            continue
+        first = text.count('\n', 0, match.start())
+        lines.update(range(first, first + text.count('\n', match.start(), match.end()) + 1))
+        index = match.end()
+
+
+def split_sections(markdown_text: str) -> Optional[List[str]]:
+    """
+    在安全边界（空行之后的标题行，围栏代码块之外）把文章切分为若干节
+
+    Returns:
+        各节文本（以换行拼接即为原文）；文章不适合切分时返回 None
+    """
+    code_lines = _fenced_code_lines(markdown_text)
+    if code_lines is None:
+        return None
+
+    lines = markdown_text.split('\n')
+    boundaries = [0]
+    references: Dict[str, str] = {}
+
+    for i, line in enumerate(lines):
+        if i in code_lines:
+            continue
+
+        # 代码块之外的围栏状行：fenced_code 不把它当作代码块，切分位置无法确定
+        if FENCE_PATTERN.match(line):
+            return None
+
+        if RAW_HTML_PATTERN.match(line):
+            return None
+
+        reference = REFERENCE_PATTERN.match(line)
+        if reference:
+            ref_id = reference.group(1).lower()
+            if ref_id in references:
+                return None
+            # 标题写在下一行的定义只复制第一行会丢失标题
+            if i + 1 < len(lines) and REFERENCE_TITLE_PATTERN.match(lines[i + 1]):
+                return None
+            references[ref_id] = line
+        elif CONTAINED_REFERENCE_PATTERN.match(line):
+            # 容器内的定义同样全文共享，但无法单独复制；网址在下一行的定义也归入此类
+            return None
+
+        if i > 0 and HEADING_PATTERN.match(line) and not lines[i - 1].strip():
+            boundaries.append(i)
+
+    boundaries.append(len(lines))
+    sections = ['\n'.join(lines[start:end]) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+    # 引用式链接定义复制到每一节开头（以空行隔开）
+    if references:
+        prefix = '\n'.join(references.values()) + '\n\n'
+        sections = [prefix + section for section in sections]
+    return sections
+
+
+def group_sections(sections: List[str], count: int) -> List[str]:
+    """把相邻的节合并为约 count 个长度相近的分块"""
+    total = sum(len(section) for section in sections)
+    target = total / max(count, 1)
+    chunks = []
+    current: List[str] = []
+    size = 0
+    for section in sections:
+        current.append(section)
+        size += len(section)
+        if size >= target:
+            chunks.append('\n'.join(current))
+            current, size = [], 0
+    if current:
+        chunks.append('\n'.join(current))
+    return chunks
+
+
+# 工作进程各自持有的转换器
+_worker_converter: Optional[WeChatHTMLConverter] = None
+
+
+def _init_worker(theme: str) -> None:
+    global _worker_converter
+    _worker_converter = WeChatHTMLConverter(theme=theme)
+
+
+def _render_chunk(chunk: str, with_passes: bool) -> str:
+    return render_chunk(_worker_converter, chunk, with_passes)
+
+
+def passes_chunk_safe(converter: WeChatHTMLConverter) -> bool:
+    """DOM pass 能否按分块分别执行（只用内置pass，且主题规则与顶层元素位置无关）"""
+    return (converter.passes == [converter._enhance_code_blocks, converter._process_images,
+                                 converter._apply_inline_styles]
+            and not converter.inliner.depends_on_top_level_position())
+
+
+def render_chunk(converter: WeChatHTMLConverter, chunk: str, with_passes: bool) -> str:
+    """转换一个分块：Markdown → 代码高亮 →（可选）解析、DOM pass、序列化"""
+    timer = StageTimer()
+    html_content = converter._highlight_code_blocks(converter._render_markdown(chunk, timer))
+    if not with_passes:
+        return html_content
+
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html_content, 'html.parser')
+    for dom_pass in converter.passes:
+        dom_pass(soup)
+    return str(soup)
+
+
+class ChunkedConverter:
+    """
+    分块并行转换器
+
+    工作进程池在第一次需要并行时创建，之后复用；用完调用 close()，或作为上下文管理器使用
+    """
+
+    def __init__(self, theme: str = 'tech', workers: Optional[int] = None,
+                 min_chars: int = MIN_PARALLEL_CHARS):
+        self.converter = WeChatHTMLConverter(theme=theme)
+        self.workers = workers
+        self.min_chars = min_chars
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self) -> 'ChunkedConverter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # 先在主进程编译主题写入磁盘缓存，工作进程直接读取
+            self.converter.compiled_theme
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             initargs=(self.converter.theme,))
+        return self._pool
+
+    def passes_chunk_safe(self) -> bool:
+        return passes_chunk_safe(self.converter)
+
+    def split(self, markdown_text: str) -> Optional[List[str]]:
+        """切分为分块；文章太短、不适合切分或只有一节时返回 None"""
+        if len(markdown_text) < self.min_chars:
+            return None
+        sections = split_sections(self.converter._strip_h1(markdown_text))
+        if sections is None or len(sections) < 2:
+            return None
+        return group_sections(sections, (self.workers or os.cpu_count() or 1) * CHUNKS_PER_WORKER)
+
+    def convert(self, markdown_text: str) -> str:
+        """转换Markdown为HTML，输出与 WeChatHTMLConverter.convert() 一致"""
+        chunks = self.split(markdown_text)
+        if chunks is None or len(chunks) < 2:
+            return self.converter.convert(markdown_text)
+
+        with_passes = self.passes_chunk_safe()
+        rendered = list(self.pool.map(_render_chunk, chunks, [with_passes] * len(chunks)))
+        # 只含空行或引用定义的分块没有输出，不参与拼接
+        html_content = '\n'.join(html for html in rendered if html)
+
+        if not with_passes:
+            from bs4 import BeautifulSoup
+
+            soup = BeautifulSoup(html_content, 'html.parser')
+            return self.converter._render_document(soup, StageTimer())
+        return self.converter._wrap_html(html_content)
+
+
+def verify(paths: List[str], themes: List[str], workers: Optional[int]) -> int:
+    """逐个文件对比分块并行与串行的输出，返回不一致的数量"""
+    mismatches = 0
+    for theme in themes:
+        with ChunkedConverter(theme=theme, workers=workers, min_chars=0) as chunked:
+            for path in paths:
+                markdown_text = Path(path).read_text(encoding='utf-8')
+                chunks = chunked.split(markdown_text)
+                expected = chunked.converter.convert(markdown_text)
+                actual = chunked.convert(markdown_text)
+                same = actual == expected
+                mismatches += not same
+                print(f'{"✅" if same else "❌"} [{theme}] {path} '
+                      f'（{len(chunks) if chunks else 1} 块）')
+    return mismatches
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(
+        description='超长Markdown文章分块并行转换（输出与串行转换逐字节一致）',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''
+示例用法:
+  # 并行转换一篇长文
+  python chunked_convert.py --input compilation.md --theme tech
+
+  # 验证分块并行与串行输出一致（每个主题、每个文件强制分块）
+  python chunked_convert.py --verify ../references/*.md
+
+  # 对比耗时
+  python chunked_convert.py --input compilation.md --benchmark
+        '''
+    )
+    parser.add_argument('-i', '--input', help='输入的Markdown文件路径')
+    parser.add_argument('-o', '--output', help='输出的HTML文件路径（默认：与输入文件同名.html）')
+    parser.add_argument('-t', '--theme', default='tech', choices=list(available_themes()),
+                        help='选择主题样式（默认：tech）')
+    parser.add_argument('-w', '--workers', type=int, help='工作进程数（默认：CPU核心数）')
+    parser.add_argument('--verify', nargs='+', metavar='MD', help='验证这些文件的并行输出与串行一致')
+    parser.add_argument('--benchmark', action='store_true', help='对比串行与并行转换耗时')
+
+    args = parser.parse_args()
+
+    if args.verify:
+        mismatches = verify(args.verify, list(available_themes()), args.workers)
+        print(f'\n{"✅ 全部一致" if not mismatches else f"❌ {mismatches} 个不一致"}')
+        sys.exit(1 if mismatches else 0)
+
+    if not args.input:
+        parser.error('需要 --input 或 --verify')
+
+    from markdown_to_html import read_markdown, write_html
+
+    markdown_text = read_markdown(args.input)
+    with ChunkedConverter(theme=args.theme, workers=args.workers) as chunked:
+        if args.benchmark:
+            chunked.convert(markdown_text)  # 预热进程池
+            start = time.perf_counter()
+            serial = chunked.converter.convert(markdown_text)
+            serial_time = time.perf_counter() - start
+            start = time.perf_counter()
+            parallel = chunked.convert(markdown_text)
+            parallel_time = time.perf_counter() - start
+            chunks = chunked.split(markdown_text)
+            print(f'📄 {args.input}: {len(markdown_text)} 字符，{len(chunks) if chunks else 1} 块')
+            print(f'   串行: {serial_time * 1000:.0f}ms  并行: {parallel_time * 1000:.0f}ms  '
+                  f'加速比: {serial_time / parallel_time:.2f}x  输出一致: {serial == parallel}')
+            return
+
+        start = time.perf_counter()
+        html_content = chunked.convert(markdown_text)
+        output_path = write_html(html_content, args.input, args.output)
+        print(f'✅ 转换成功！ ({(time.perf_counter() - start) * 1000:.0f}ms)')
+        print(f'📄 输出文件: {output_path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Code Highlighter for WeChat HTML
+带内容哈希缓存的代码高亮、不依赖 guess_lexer 的快速语言识别，以及输出紧凑内联样式的微信格式化器
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Pygments 为可选依赖：未安装时与 codehilite 一样只转义代码、不做高亮
+try:
+    import pygments
+    from pygments import highlight
+    from pygments.formatter import Formatter
+    from pygments.formatters import HtmlFormatter
+    from pygments.lexers import get_lexer_by_name
+    from pygments.styles import get_all_styles
+    from pygments.token import Token
+    from pygments.util import ClassNotFound
+    PYGMENTS_AVAILABLE = True
+except ImportError:
+    Formatter = object
+    HtmlFormatter = None
+    PYGMENTS_AVAILABLE = False
+
+# shebang 解释器 → 语言
+SHEBANG_LANGUAGES = {
+    'python': 'python', 'python3': 'python', 'bash': 'bash', 'sh': 'bash', 'zsh': 'bash',
+    'node': 'javascript', 'ruby': 'ruby', 'perl': 'perl', 'php': 'php',
+}
+
+# 语言特征：(语言, 正则)，按顺序匹配，命中即返回；越具体的规则越靠前
+LANGUAGE_HINTS = [
+    ('php', re.compile(r'^\s*<\?php')),
+    ('xml', re.compile(r'^\s*<\?xml')),
+    ('html', re.compile(r'^\s*<(!DOCTYPE|html|head|body|div|span|p|section|table|ul|a|img)\b', re.I)),
+    ('python', re.compile(r'^\s*(def \w+\(.*\)\s*(->.*)?:|class \w+(\(.*\))?:|from [\w.]+ import |import [\w.]+\s*$|if __name__ == |print\()', re.M)),
+    ('go', re.compile(r'^\s*(package \w+\s*$|func (\(\w+ \*?\w+\) )?\w+\()', re.M)),
+    ('rust', re.compile(r'^\s*(fn \w+|let mut |use \w+::|impl\b|pub fn )', re.M)),
+    ('java', re.compile(r'^\s*(public|private|protected) (static )?(final )?(class|interface|void|[\w<>\[\]]+) \w+', re.M)),
+    ('cpp', re.compile(r'^\s*#include\s*[<"]|\bstd::', re.M)),
+    ('typescript', re.compile(r'^\s*(interface \w+ \{|type \w+ = |(const|let) \w+: (string|number|boolean)\b)', re.M)),
+    ('javascript', re.compile(r'^\s*(const |let |var |function\b|import .* from |export |console\.log\()|=>\s*[{(]', re.M)),
+    ('sql', re.compile(r'^\s*(SELECT\b.*\bFROM\b|INSERT INTO|UPDATE \w+ SET|DELETE FROM|CREATE (TABLE|INDEX|VIEW)|ALTER TABLE)', re.M | re.I)),
+    ('bash', re.compile(r'^\s*(\$ |sudo |npm |npx |pnpm |yarn |pip3? |uv |brew |apt(-get)? |git |cd |mkdir |export \w+=|curl |docker |python3? \S+)', re.M)),
+    ('css', re.compile(r'^\s*[.#]?[\w-]+[^{\n]*\{\s*\n\s*[\w-]+\s*:[^;\n]+;', re.M)),
+    ('yaml', re.compile(r'^[\w-]+:( \S.*)?\n(( {2,}|- ).*\n?)+', re.M)),
+]
+
+
+def detect_language(code: str) -> Optional[str]:
+    """
+    用少量特征正则识别代码语言（替代 Pygments guess_lexer 逐个尝试所有lexer的扫描）
+
+    Returns:
+        Pygments lexer 别名；无法识别时返回None
+    """
+    stripped = code.lstrip()
+    if not stripped:
+        return None
+
+    if stripped.startswith('#!'):
+        interpreter = stripped.split('\n', 1)[0].split('/')[-1].split()
+        if interpreter:
+            name = interpreter[-1] if interpreter[0] == 'env' else interpreter[0]
+            language = SHEBANG_LANGUAGES.get(re.sub(r'[\d.]+$', '', name)) or SHEBANG_LANGUAGES.get(name)
+            if language:
+                return language
+
+    if stripped[0] in '{[':
+        try:
+            json.loads(stripped)
+            return 'json'
+        except ValueError:
+            pass
+
+    for language, pattern in LANGUAGE_HINTS:
+        if pattern.search(code):
+            return language
+
+    return None
+
+
+@lru_cache(maxsize=None)
+def _get_lexer(language: str):
+    """按名称获取lexer（lexer无状态，可在多次高亮间复用）"""
+    try:
+        return get_lexer_by_name(language)
+    except ClassNotFound:
+        return None
+
+
+def _escape_html(text: str) -> str:
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+
+
+class WeChatFormatter(Formatter):
+    """
+    微信公众号专用Pygments格式化器
+
+    微信会丢弃 <style> 和 class，只能用内联样式着色。与 HtmlFormatter(noclasses=True) 的逐token
+    <span style> 相比：
+    - 相邻且样式相同的token合并为一个span
+    - 与代码块默认前景色相同的样式直接省略（背景、字体由主题的 pre/code 样式提供）
+    - 不影响显示的空白token并入相邻的span
+    - 样式只保留实际生效的最少声明（color / font-weight / font-style / text-decoration）
+    """
+
+    name = 'WeChat'
+    aliases = ['wechat']
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.cssclass = options.get('cssclass', 'codehilite')
+        self._default = self.style.style_for_token(Token)
+        self._token_css: Dict[object, str] = {}
+
+    def _css_for(self, ttype) -> str:
+        """token的最小内联样式（与默认样式相同时为空字符串）"""
+        css = self._token_css.get(ttype)
+        if css is None:
+            # 样式表未定义的token子类型（如YAML的 Literal.Scalar.Plain）沿用最近的父类型样式
+            styled = ttype
+            while not self.style.styles_token(styled) and styled.parent is not None:
+                styled = styled.parent
+            style = self.style.style_for_token(styled)
+            declarations = []
+            if style['color'] and style['color'] != self._default['color']:
+                declarations.append(f'color:#{style["color"]}')
+            if style['bold'] and not self._default['bold']:
+                declarations.append('font-weight:bold')
+            if style['italic'] and not self._default['italic']:
+                declarations.append('font-style:italic')
+            if style['underline'] and not self._default['underline']:
+                declarations.append('text-decoration:underline')
+            if style['bgcolor'] and style['bgcolor'] != self._default['bgcolor']:
+                declarations.append(f'background-color:#{style["bgcolor"]}')
+            css = ';'.join(declarations)
+            self._token_css[ttype] = css
+        return css
+
+    def _runs(self, tokensource) -> List[Tuple[str, str]]:
+        """把token流合并为 (样式, 文本) 片段"""
+        runs: List[Tuple[str, str]] = []
+        run_css: Optional[str] = None  # None 表示当前片段只有可随意着色的空白
+        run_text: List[str] = []
+
+        for ttype, value in tokensource:
+            css = self._css_for(ttype)
+
+            # 空白只有在带背景或下划线时才需要保留自己的样式
+            if value.isspace() and 'background' not in css and 'underline' not in css:
+                run_text.append(value)
+                continue
+
+            if run_css is None or css == run_css:
+                run_css = css
+            else:
+                runs.append((run_css, ''.join(run_text)))
+                run_css, run_text = css, []
+            run_text.append(value)
+
+        if run_text:
+            runs.append((run_css or '', ''.join(run_text)))
+        return runs
+
+    def format_unencoded(self, tokensource, outfile):
+        outfile.write(f'<div class="{self.cssclass}"><pre><code>')
+        for css, text in self._runs(tokensource):
+            escaped = _escape_html(text)
+            outfile.write(f'<span style="{css}">{escaped}</span>' if css else escaped)
+        outfile.write('</code></pre></div>\n')
+
+
+class HighlightCache:
+    """代码高亮结果缓存：内存LRU + 可选的磁盘缓存（按内容哈希寻址）"""
+
+    def __init__(self, max_entries: int = 1024, cache_dir: Optional[str] = None):
+        self.max_entries = max_entries
+        self.cache_dir = Path(cache_dir).expanduser() if cache_dir else None
+        self._entries: 'OrderedDict[str, str]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _disk_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f'{key}.html'
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，依次查找内存、磁盘"""
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return html
+
+        if self.cache_dir is not None:
+            try:
+                html = self._disk_path(key).read_text(encoding='utf-8')
+            except OSError:
+                html = None
+            if html is not None:
+                self._remember(key, html)
+                with self._lock:
+                    self.hits += 1
+                return html
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, html: str) -> None:
+        """写入缓存（磁盘写入失败时静默忽略）"""
+        self._remember(key, html)
+
+        if self.cache_dir is not None:
+            path = self._disk_path(key)
+            tmp_path = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path.write_text(html, encoding='utf-8')
+                os.replace(tmp_path, path)
+            except OSError:
+                try:
+                    tmp_path.unlink()
+                except OSError:
+                    pass
+
+    def _remember(self, key: str, html: str) -> None:
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+# 进程内共享的高亮缓存（同一进程中的多个转换器/主题共用）
+SHARED_HIGHLIGHT_CACHE = HighlightCache()
+
+
+class CodeHighlighter:
+    """
+    带缓存的Pygments代码高亮器
+
+    缓存键为 (代码文本, 语言, 格式化选项, Pygments版本) 的哈希；未标注语言的代码块用
+    detect_language() 识别，识别不出时按纯文本处理。
+    """
+
+    DEFAULT_OPTIONS = {
+        'cssclass': 'codehilite',
+        'style': 'default',
+    }
+
+    # 格式化器类型（子类可替换为其他Pygments格式化器）
+    formatter_class = WeChatFormatter
+
+    def __init__(self, cache: Optional[HighlightCache] = None, guess_lang: bool = True, **formatter_options):
+        self.cache = cache if cache is not None else SHARED_HIGHLIGHT_CACHE
+        self.guess_lang = guess_lang
+        self.options = {**self.DEFAULT_OPTIONS, **formatter_options}
+
+        if PYGMENTS_AVAILABLE and self.options['style'] not in set(get_all_styles()):
+            raise ValueError(f"Unknown code highlight style: {self.options['style']}. "
+                             f"Available: {', '.join(sorted(get_all_styles()))}")
+        self._options_key = json.dumps(
+            [
+                getattr(self.formatter_class, '__name__', None),
+                pygments.__version__ if PYGMENTS_AVAILABLE else None,
+                guess_lang,
+                sorted(self.options.items()),
+            ],
+            default=str,
+        )
+
+    def resolve_language(self, code: str, language: Optional[str] = None) -> str:
+        """确定代码块使用的lexer别名"""
+        if language and _get_lexer(language) is not None:
+            return language
+        if self.guess_lang:
+            detected = detect_language(code)
+            if detected and _get_lexer(detected) is not None:
+                return detected
+        return 'text'
+
+    def highlight(self, code: str, language: Optional[str] = None) -> str:
+        """高亮代码并返回HTML片段（命中缓存时既不识别语言也不调用Pygments）"""
+        code = code.strip('\n')
+
+        key = hashlib.sha256(f'{self._options_key}\0{language or ""}\0{code}'.encode('utf-8')).hexdigest()
+        html = self.cache.get(key)
+        if html is None:
+            if PYGMENTS_AVAILABLE:
+                lexer = _get_lexer(self.resolve_language(code, language))
+                # 格式化器按次创建，避免多线程共享同一实例
+                html = highlight(code, lexer, self.formatter_class(**self.options))
+            else:
+                html = self._plain_block(code, language)
+            self.cache.put(key, html)
+        return html
+
+    def _plain_block(self, code: str, language: Optional[str]) -> str:
+        """未安装Pygments时的输出（与codehilite的非Pygments输出一致）"""
+        escaped = _escape_html(code)
+        lang_attr = f' class="language-{language}"' if language else ''
+        return f'<pre class="{self.options["cssclass"]}"><code{lang_attr}>{escaped}\n</code></pre>\n'
+
+
+def compare_output_size(code: str, language: Optional[str] = None, style: str = 'default') -> Tuple[int, int]:
+    """
+    对比同一段代码的输出体积
+
+    Returns:
+        (HtmlFormatter(noclasses=True) 逐token内联输出的字节数, WeChatFormatter 输出的字节数)
+    """
+    code = code.strip('\n')
+    lexer = _get_lexer(CodeHighlighter(cache=HighlightCache(), style=style).resolve_language(code, language))
+    stock = highlight(code, lexer, HtmlFormatter(noclasses=True, style=style, cssclass='codehilite', wrapcode=True))
+    compact = highlight(code, lexer, WeChatFormatter(style=style, cssclass='codehilite'))
+    return len(stock.encode('utf-8')), len(compact.encode('utf-8'))
+
+
+def main():
+    """命令行入口：统计Markdown文章中代码块高亮输出的体积变化"""
+    parser = argparse.ArgumentParser(
+        description='对比代码块逐token内联样式与微信紧凑格式的输出体积',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''
+示例用法:
+  python code_highlighter.py article.md
+  python code_highlighter.py article.md --style one-dark
+        '''
+    )
+    parser.add_argument('input', help='Markdown文件路径')
+    parser.add_argument('-s', '--style', default='default', help='Pygments样式（默认：default）')
+    args = parser.parse_args()
+
+    if not PYGMENTS_AVAILABLE:
+        print('❌ 未安装Pygments', file=sys.stderr)
+        sys.exit(1)
+
+    with open(args.input, 'r', encoding='utf-8') as f:
+        text = f.read()
+
+    blocks = re.findall(r'^```([\w#+.-]*)[^\n]*\n(.*?)^```', text, flags=re.M | re.S)
+    if not blocks:
+        print('⚠️  未找到代码块')
+        return
+
+    stock_total = compact_total = 0
+    for language, code in blocks:
+        stock, compact = compare_output_size(code, language or None, args.style)
+        stock_total += stock
+        compact_total += compact
+
+    saved = stock_total - compact_total
+    print(f'📦 代码块数: {len(blocks)}')
+    print(f'   逐token内联: {stock_total:,} 字节')
+    print(f'   微信紧凑格式: {compact_total:,} 字节')
+    print(f'✨ 减少: {saved:,} 字节 ({saved / stock_total * 100:.1f}%)')
+
+
+if __name__ == '__main__':
+    main()
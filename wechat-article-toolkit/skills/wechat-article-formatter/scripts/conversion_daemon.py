@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Conversion Daemon for WeChat Article Formatter
+常驻转换服务：为每个主题保持预热的转换器，通过Unix域套接字接收转换请求
+
+命令行每转换一篇文章都要付出解释器启动、依赖导入和主题编译的开销；
+守护进程把这些开销只付一次，之后每篇文章只剩真正的转换耗时。
+
+协议（每个连接一个请求）:
+  请求: 一行JSON，如 {"op": "convert", "theme": "tech", "version": "1.3.0", "markdown": "...",
+                      "highlight_cache": false}
+        highlight_cache 为 true 时代码高亮结果持久化到磁盘缓存（同 --highlight-cache）
+  响应: 一行JSON头 {"ok": true, "length": N, "meta": {...}}，随后是N字节UTF-8编码的HTML
+        出错时 {"ok": false, "error": "..."}，无正文
+
+客户端部分（request_conversion 等）只依赖标准库，不导入转换器，
+markdown_to_html.py 借此在守护进程运行时跳过所有第三方导入。
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any, Tuple
+
+# 默认套接字路径，可用环境变量 WECHAT_FORMATTER_SOCKET 覆盖
+DEFAULT_SOCKET_PATH = os.path.expanduser("~/.wechat-article-formatter/daemon.sock")
+
+# 客户端等待守护进程响应的超时（秒）；超时后回退到进程内转换
+CLIENT_TIMEOUT = 30.0
+
+# 协议头最大长度，防止异常客户端占满内存
+MAX_HEADER_BYTES = 64 * 1024 * 1024
+
+DAEMON_AVAILABLE = hasattr(socket, 'AF_UNIX')
+
+
+class DaemonError(Exception):
+    """守护进程返回了错误响应"""
+
+
+def socket_path(path: Optional[str] = None) -> str:
+    """解析套接字路径：参数 > 环境变量 > 默认值"""
+    return path or os.environ.get('WECHAT_FORMATTER_SOCKET') or DEFAULT_SOCKET_PATH
+
+
+# ---------------------------------------------------------------------------
+# 客户端（只依赖标准库）
+# ---------------------------------------------------------------------------
+
+def _read_line(stream) -> bytes:
+    line = stream.readline(MAX_HEADER_BYTES)
+    if not line.endswith(b'\n'):
+        raise DaemonError('响应不完整')
+    return line
+
+
+def _request(payload: Dict[str, Any], path: Optional[str] = None,
+             timeout: float = CLIENT_TIMEOUT) -> Tuple[Dict[str, Any], bytes]:
+    """发送一个请求，返回 (响应头, 正文)；连接失败时抛出 OSError"""
+    if not DAEMON_AVAILABLE:
+        raise OSError('当前平台不支持Unix域套接字')
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path(path))
+        sock.sendall(json.dumps(payload, ensure_ascii=False).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as stream:
+            header = json.loads(_read_line(stream))
+            if not header.get('ok'):
+                raise DaemonError(header.get('error', '未知错误'))
+            length = header.get('length', 0)
+            body = stream.read(length)
+            if len(body) != length:
+                raise DaemonError('响应正文不完整')
+    return header, body
+
+
+def request_conversion(markdown_text: str, theme: str, version: str, path: Optional[str] = None,
+                       highlight_cache: bool = False) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """
+    请求守护进程转换一篇文章（highlight_cache: 代码高亮结果持久化到磁盘缓存）
+
+    Returns:
+        (html, meta)；守护进程未运行时返回 None，调用方应回退到进程内转换
+
+    Raises:
+        DaemonError: 守护进程在运行但转换失败（如版本不一致、主题不存在）
+    """
+    payload = {'op': 'convert', 'theme': theme, 'version': version, 'markdown': markdown_text,
+               'highlight_cache': highlight_cache}
+    try:
+        header, body = _request(payload, path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        # 没有守护进程，或套接字文件是上次异常退出留下的
+        return None
+    except (socket.timeout, OSError, ValueError) as e:
+        raise DaemonError(f'与守护进程通信失败: {e}')
+    return body.decode('utf-8'), header.get('meta', {})
+
+
+def ping(path: Optional[str] = None, timeout: float = 1.0) -> Optional[Dict[str, Any]]:
+    """检查守护进程是否在运行，返回其状态信息；未运行时返回 None"""
+    try:
+        header, _ = _request({'op': 'ping'}, path, timeout=timeout)
+    except (OSError, ValueError, DaemonError):
+        return None
+    return header.get('meta', {})
+
+
+# ---------------------------------------------------------------------------
+# 服务端
+# ---------------------------------------------------------------------------
+
+class ConversionDaemon:
+    """
+    常驻转换服务
+
+    每个主题一个预热好的 WeChatHTMLConverter（主题已编译、依赖已导入、高亮器已创建），
+    按主题加锁串行转换；不同主题的请求可并行处理。主题CSS文件修改后自动重建对应转换器。
+
+    启动时指定 highlight_cache_dir 则所有请求都使用磁盘高亮缓存；
+    否则只有请求中 highlight_cache 为 true 时使用（默认目录 HIGHLIGHT_CACHE_DIR）。
+    """
+
+    def __init__(self, path: Optional[str] = None, highlight_cache_dir: Optional[str] = None):
+        from markdown_to_html import WeChatHTMLConverter, available_themes, CONVERTER_VERSION, HIGHLIGHT_CACHE_DIR
+        from code_highlighter import HighlightCache
+
+        self.path = socket_path(path)
+        self.version = CONVERTER_VERSION
+        self._converter_class = WeChatHTMLConverter
+        self._available_themes = available_themes
+        self.highlight_cache_always = highlight_cache_dir is not None
+        self.highlight_cache = HighlightCache(cache_dir=highlight_cache_dir or HIGHLIGHT_CACHE_DIR)
+
+        # (主题名, 是否使用磁盘高亮缓存) → (转换器, 主题文件mtime, 锁)
+        self._converters: Dict[Tuple[str, bool], Tuple[Any, int, threading.Lock]] = {}
+        self._converters_lock = threading.Lock()
+        self._server = None
+        self.started_at = time.time()
+        self.requests = 0
+        self._requests_lock = threading.Lock()
+
+    def warm_up(self) -> None:
+        """为所有主题创建转换器并各转换一次样例，让导入、主题编译和高亮器初始化都在启动时完成"""
+        sample = '## warm up\n\n**text** `code`\n\n```python\nprint(1)\n```\n\n| a |\n|---|\n| b |\n'
+        for theme in self._available_themes():
+            converter, lock = self._get_converter(theme, self.highlight_cache_always)
+            with lock:
+                converter.convert(sample)
+
+    def _get_converter(self, theme: str, highlight_cache: bool = False):
+        theme_file = self._available_themes().get(theme)
+        if theme_file is None:
+            raise DaemonError(f'主题不存在: {theme}')
+        mtime = theme_file.stat().st_mtime_ns
+
+        key = (theme, highlight_cache)
+        with self._converters_lock:
+            entry = self._converters.get(key)
+            if entry is None or entry[1] != mtime:
+                converter = self._converter_class(theme=theme,
+                                                  highlight_cache=self.highlight_cache if highlight_cache else None)
+                converter.compiled_theme  # 在锁内完成编译，避免并发请求重复编译
+                entry = (converter, mtime, threading.Lock())
+                self._converters[key] = entry
+        return entry[0], entry[2]
+
+    def handle(self, request: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+        """处理一个请求，返回 (响应头, 正文)"""
+        op = request.get('op')
+
+        if op == 'ping':
+            return {'ok': True, 'length': 0, 'meta': {
+                'pid': os.getpid(),
+                'version': self.version,
+                'themes': sorted({theme for theme, _ in self._converters}),
+                'requests': self.requests,
+                'uptime_s': round(time.time() - self.started_at, 1),
+            }}, b''
+
+        if op == 'shutdown':
+            threading.Thread(target=self._server.shutdown, daemon=True).start()
+            return {'ok': True, 'length': 0}, b''
+
+        if op == 'convert':
+            # 客户端与守护进程代码版本不一致时拒绝转换，客户端会回退到进程内转换
+            if request.get('version') != self.version:
+                raise DaemonError(f'版本不一致: 守护进程 {self.version}，客户端 {request.get("version")}，请重启守护进程')
+
+            start = time.perf_counter()
+            highlight_cache = self.highlight_cache_always or bool(request.get('highlight_cache'))
+            converter, lock = self._get_converter(request.get('theme', 'tech'), highlight_cache)
+            with lock:
+                waited = time.perf_counter()
+                html_content = converter.convert(request.get('markdown', ''))
+            done = time.perf_counter()
+
+            with self._requests_lock:
+                self.requests += 1
+            body = html_content.encode('utf-8')
+            return {'ok': True, 'length': len(body), 'meta': {
+                'theme': converter.theme,
+                'wait_ms': round((waited - start) * 1000, 3),
+                'convert_ms': round((done - waited) * 1000, 3),
+                'pid': os.getpid(),
+            }}, body
+
+        raise DaemonError(f'未知操作: {op}')
+
+    def serve_forever(self) -> None:
+        """绑定套接字并处理请求，直到收到 shutdown 或被中断"""
+        import socketserver
+
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    request = json.loads(_read_line(self.rfile))
+                    header, body = daemon.handle(request)
+                except Exception as e:
+                    header, body = {'ok': False, 'error': str(e)}, b''
+                self.wfile.write(json.dumps(header, ensure_ascii=False).encode('utf-8') + b'\n')
+                if body:
+                    self.wfile.write(body)
+
+        class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+
+        # 清理上次异常退出留下的套接字文件；已有守护进程在运行时不抢占
+        if os.path.exists(self.path):
+            if ping(self.path) is not None:
+                raise RuntimeError(f'守护进程已在运行: {self.path}')
+            os.unlink(self.path)
+        Path(self.path).parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+        # 套接字文件在 bind() 时创建，用umask保证创建时就只有当前用户可访问
+        old_umask = os.umask(0o177)
+        try:
+            self._server = Server(self.path, Handler)
+        finally:
+            os.umask(old_umask)
+        os.chmod(self.path, 0o600)
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+
+def start_background(path: Optional[str] = None, highlight_cache: bool = False,
+                     wait: float = 10.0) -> Optional[Dict[str, Any]]:
+    """在后台启动守护进程，等待其就绪后返回状态信息（超时返回 None）"""
+    command = [sys.executable, os.path.abspath(__file__), 'serve', '--socket', socket_path(path)]
+    if highlight_cache:
+        command.append('--highlight-cache')
+    subprocess.Popen(
+        command,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+    deadline = time.time() + wait
+    while time.time() < deadline:
+        status = ping(path)
+        if status is not None:
+            return status
+        time.sleep(0.05)
+    return None
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(
+        description='常驻转换服务：预热所有主题，markdown_to_html.py 检测到后自动使用',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''
+示例用法:
+  # 后台启动
+  python conversion_daemon.py start
+
+  # 前台运行（查看日志、调试）
+  python conversion_daemon.py serve
+
+  # 查看状态 / 停止
+  python conversion_daemon.py status
+  python conversion_daemon.py stop
+
+守护进程运行时 markdown_to_html.py 自动通过它转换（--no-daemon 可禁用），
+未运行时回退到进程内转换，输出完全一致。
+        '''
+    )
+    parser.add_argument('command', choices=['start', 'serve', 'status', 'stop'], help='操作')
+    parser.add_argument('--socket', help=f'套接字路径（默认：$WECHAT_FORMATTER_SOCKET 或 {DEFAULT_SOCKET_PATH}）')
+    parser.add_argument('--highlight-cache', action='store_true',
+                        help='将代码高亮结果持久化到磁盘缓存')
+
+    args = parser.parse_args()
+
+    if not DAEMON_AVAILABLE:
+        print('❌ 当前平台不支持Unix域套接字，无法运行守护进程', file=sys.stderr)
+        sys.exit(1)
+
+    path = socket_path(args.socket)
+
+    if args.command == 'status':
+        status = ping(path)
+        if status is None:
+            print(f'⚪ 守护进程未运行 ({path})')
+            sys.exit(1)
+        print(f'🟢 守护进程运行中 ({path})')
+        print(f'   PID: {status["pid"]}  版本: {status["version"]}  '
+              f'已处理: {status["requests"]} 篇  运行: {status["uptime_s"]}s')
+        print(f'   已加载主题: {", ".join(status["themes"])}')
+
+    elif args.command == 'stop':
+        try:
+            _request({'op': 'shutdown'}, path, timeout=5.0)
+            print('✅ 守护进程已停止')
+        except (OSError, DaemonError):
+            print(f'⚪ 守护进程未运行 ({path})')
+
+    elif args.command == 'start':
+        status = ping(path)
+        if status is not None:
+            print(f'🟢 守护进程已在运行 (PID {status["pid"]})')
+            return
+        status = start_background(path, args.highlight_cache)
+        if status is None:
+            print('❌ 守护进程启动超时，请使用 serve 命令在前台运行查看错误', file=sys.stderr)
+            sys.exit(1)
+        print(f'✅ 守护进程已启动 (PID {status["pid"]}, {path})')
+
+    else:
+        from markdown_to_html import HIGHLIGHT_CACHE_DIR
+
+        daemon = ConversionDaemon(path, HIGHLIGHT_CACHE_DIR if args.highlight_cache else None)
+        start = time.perf_counter()
+        daemon.warm_up()
+        print(f'🔥 已预热 {len(daemon._converters)} 个主题 ({(time.perf_counter() - start) * 1000:.0f}ms)')
+        print(f'👂 监听 {path}，按 Ctrl+C 停止')
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        except RuntimeError as e:
+            print(f'❌ {e}', file=sys.stderr)
+            sys.exit(1)
+        print('👋 守护进程已退出')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CSS Inliner for WeChat HTML
+预编译CSS选择器，按特异性和源顺序层叠，单次遍历DOM完成样式内联
+"""
+
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, FrozenSet, Set, Tuple
+from bs4 import BeautifulSoup, Tag
+
+# 选择器词法：组合器、标签/通配符、#id、.class、[属性]、::伪元素、:伪类
+TOKEN_PATTERN = re.compile(r'''
+    (?P<combinator>\s*[>+~]\s*|\s+)
+  | (?P<tag>\*|[a-zA-Z][\w-]*)
+  | \#(?P<id>[\w-]+)
+  | \.(?P<cls>[\w-]+)
+  | \[\s*(?P<attr>[\w-]+)\s*
+      (?:(?P<op>[~|^$*]?=)\s*(?:"(?P<dq>[^"]*)"|'(?P<sq>[^']*)'|(?P<bare>[\w-]+))\s*)?
+    \]
+  | (?P<pseudo_element>::[\w-]+)
+  | :(?P<pseudo>[\w-]+)(?:\(\s*(?P<arg>[^)]*?)\s*\))?
+''', re.VERBOSE)
+
+NTH_PATTERN = re.compile(r'^(?:(?P<a>[+-]?\d*)n\s*(?:(?P<sign>[+-])\s*(?P<b>\d+))?|(?P<index>[+-]?\d+))$')
+
+# 可内联的结构伪类（:hover、::before 等依赖交互或生成内容，无法写进style属性）
+STRUCTURAL_PSEUDOS = {'first-child', 'last-child', 'only-child', 'nth-child', 'nth-last-child'}
+
+Specificity = Tuple[int, int, int]
+
+
+class AttributeCondition(NamedTuple):
+    """属性选择器条件，如 [href]、[lang|=zh]"""
+    name: str
+    op: Optional[str]
+    value: Optional[str]
+
+    def matches(self, elem: Tag) -> bool:
+        actual = elem.get(self.name)
+        if actual is None:
+            return False
+        if isinstance(actual, list):
+            # class 等多值属性
+            actual = ' '.join(actual)
+        if self.op is None:
+            return True
+        if self.op == '=':
+            return actual == self.value
+        if self.op == '~=':
+            return self.value in actual.split()
+        if self.op == '|=':
+            return actual == self.value or actual.startswith(f'{self.value}-')
+        if not self.value:
+            # ^= $= *= 的空值永不匹配
+            return False
+        if self.op == '^=':
+            return actual.startswith(self.value)
+        if self.op == '$=':
+            return actual.endswith(self.value)
+        return self.value in actual
+
+
+class NthCondition(NamedTuple):
+    """:nth-child / :nth-last-child 条件（:first-child 等同于 :nth-child(1)）"""
+    from_end: bool
+    a: int
+    b: int
+
+    def matches(self, position: int) -> bool:
+        if self.a == 0:
+            return position == self.b
+        offset = position - self.b
+        return offset % self.a == 0 and offset // self.a >= 0
+
+
+class Compound(NamedTuple):
+    """复合选择器，所有条件需同时满足"""
+    tag: Optional[str]
+    element_id: Optional[str]
+    classes: FrozenSet[str]
+    attributes: Tuple[AttributeCondition, ...]
+    nth: Tuple[NthCondition, ...]
+
+    def matches(self, elem: Tag, positions: 'SiblingPositions') -> bool:
+        """判断元素是否满足该复合选择器"""
+        if self.tag is not None and elem.name != self.tag:
+            return False
+        if self.element_id is not None and elem.get('id') != self.element_id:
+            return False
+        if self.classes and not self.classes.issubset(elem.get('class') or ()):
+            return False
+        for attribute in self.attributes:
+            if not attribute.matches(elem):
+                return False
+        if self.nth:
+            index, count = positions.lookup(elem)
+            for condition in self.nth:
+                if not condition.matches(count - index + 1 if condition.from_end else index):
+                    return False
+        return True
+
+
+class Selector(NamedTuple):
+    """预编译的选择器：从左到右的复合选择器及其间的组合器"""
+    text: str
+    compounds: Tuple[Compound, ...]
+    combinators: Tuple[str, ...]
+    specificity: Specificity
+
+
+class SiblingPositions:
+    """按父节点缓存子元素序号，使 :nth-child 在长列表/表格中保持线性成本"""
+
+    def __init__(self):
+        self._cache: Dict[int, Tuple[Dict[int, int], int]] = {}
+
+    def lookup(self, elem: Tag) -> Tuple[int, int]:
+        """返回 (元素在兄弟元素中的序号，从1开始, 兄弟元素总数)"""
+        parent = elem.parent
+        if parent is None:
+            return 1, 1
+
+        entry = self._cache.get(id(parent))
+        if entry is None:
+            children = [child for child in parent.children if isinstance(child, Tag)]
+            entry = ({id(child): i for i, child in enumerate(children, 1)}, len(children))
+            self._cache[id(parent)] = entry
+
+        index_map, count = entry
+        return index_map[id(elem)], count
+
+
+def _parse_nth(arg: Optional[str]) -> Optional[Tuple[int, int]]:
+    """解析 an+b 表达式（支持 odd / even）"""
+    if arg is None:
+        return None
+    arg = arg.strip().lower()
+    if arg == 'odd':
+        return 2, 1
+    if arg == 'even':
+        return 2, 0
+
+    match = NTH_PATTERN.match(arg.replace(' ', ''))
+    if not match:
+        return None
+    if match.group('index') is not None:
+        return 0, int(match.group('index'))
+
+    a = match.group('a')
+    a = 1 if a in ('', '+') else -1 if a == '-' else int(a)
+    b = int(match.group('b') or 0)
+    return a, -b if match.group('sign') == '-' else b
+
+
+def parse_selector(selector: str) -> Optional[Selector]:
+    """
+    解析单个选择器（不含逗号）
+
+    Returns:
+        预编译的选择器；包含无法内联的语法（:hover、::before、未知伪类等）时返回None
+    """
+    text = selector.strip()
+    compounds: List[Compound] = []
+    combinators: List[str] = []
+    ids = classes = tags = 0
+
+    pos = 0
+    current = None
+
+    def finish_compound():
+        if current is None:
+            return False
+        compounds.append(Compound(
+            tag=current['tag'],
+            element_id=current['id'],
+            classes=frozenset(current['classes']),
+            attributes=tuple(current['attributes']),
+            nth=tuple(current['nth']),
+        ))
+        return True
+
+    while pos < len(text):
+        match = TOKEN_PATTERN.match(text, pos)
+        if not match or match.end() == pos:
+            return None
+        pos = match.end()
+
+        if match.group('combinator') is not None:
+            if not finish_compound():
+                return None
+            combinators.append(match.group('combinator').strip() or ' ')
+            current = None
+            continue
+
+        if current is None:
+            current = {'tag': None, 'id': None, 'classes': [], 'attributes': [], 'nth': []}
+
+        if match.group('tag') is not None:
+            if current['tag'] is not None or current['classes'] or current['id'] or current['attributes'] or current['nth']:
+                # 标签名只能出现在复合选择器开头
+                return None
+            tag = match.group('tag').lower()
+            if tag != '*':
+                current['tag'] = tag
+                tags += 1
+        elif match.group('id') is not None:
+            if current['id'] is not None and current['id'] != match.group('id'):
+                # 同一元素不可能有两个不同的id
+                return None
+            current['id'] = match.group('id')
+            ids += 1
+        elif match.group('cls') is not None:
+            current['classes'].append(match.group('cls'))
+            classes += 1
+        elif match.group('attr') is not None:
+            value = next((v for v in (match.group('dq'), match.group('sq'), match.group('bare')) if v is not None), None)
+            current['attributes'].append(AttributeCondition(match.group('attr').lower(), match.group('op'), value))
+            classes += 1
+        elif match.group('pseudo_element') is not None:
+            return None
+        else:
+            name = match.group('pseudo').lower()
+            if name not in STRUCTURAL_PSEUDOS:
+                return None
+            if name in ('nth-child', 'nth-last-child'):
+                nth = _parse_nth(match.group('arg'))
+                if nth is None:
+                    return None
+                current['nth'].append(NthCondition(name == 'nth-last-child', *nth))
+            elif match.group('arg') is not None:
+                return None
+            else:
+                if name in ('first-child', 'only-child'):
+                    current['nth'].append(NthCondition(False, 0, 1))
+                if name in ('last-child', 'only-child'):
+                    current['nth'].append(NthCondition(True, 0, 1))
+            classes += 1
+
+    if not finish_compound() or len(combinators) != len(compounds) - 1:
+        return None
+
+    return Selector(text, tuple(compounds), tuple(combinators), (ids, classes, tags))
+
+
+def parse_style(style: str) -> Dict[str, str]:
+    """解析style属性为有序字典"""
+    style_dict = {}
+    for item in style.split(';'):
+        if ':' in item:
+            key, value = item.split(':', 1)
+            style_dict[key.strip()] = value.strip()
+    return style_dict
+
+
+class CSSInliner:
+    """
+    层叠式样式内联器
+
+    规则按最右侧复合选择器的 ID / 类 / 标签 建立索引，遍历DOM时每个元素只检查可能命中的规则，
+    并从右向左匹配组合器（后代、子代、相邻兄弟、通用兄弟）。命中的声明按 特异性 → 源顺序 层叠到
+    同一个声明字典后一次性写回style；元素上已有的内联样式优先级最高，不会被覆盖。
+    """
+
+    def __init__(self, css_rules: Iterable[Tuple[str, Dict[str, str]]]):
+        self.selectors: List[Selector] = []
+        self.styles: List[Dict[str, str]] = []
+        self.by_id: Dict[str, List[int]] = {}
+        self.by_class: Dict[str, List[int]] = {}
+        self.by_tag: Dict[str, List[int]] = {}
+        self.universal: List[int] = []
+
+        for selector_text, styles in css_rules:
+            selector = parse_selector(selector_text)
+            if selector is None:
+                continue
+
+            rule_index = len(self.selectors)
+            self.selectors.append(selector)
+            self.styles.append(styles)
+
+            # 只需按一个键索引：最右侧复合选择器的所有条件都要满足，任取其一即可筛出候选
+            key = selector.compounds[-1]
+            if key.element_id is not None:
+                self.by_id.setdefault(key.element_id, []).append(rule_index)
+            elif key.classes:
+                self.by_class.setdefault(min(key.classes), []).append(rule_index)
+            elif key.tag is not None:
+                self.by_tag.setdefault(key.tag, []).append(rule_index)
+            else:
+                self.universal.append(rule_index)
+
+    def depends_on_top_level_position(self) -> bool:
+        """
+        是否有规则的匹配结果取决于顶层元素之间的位置关系
+
+        顶层元素没有父元素，只有从最左侧开始、仅以兄弟组合器（+ ~）相连的复合选择器可能作用于它；
+        其中出现兄弟组合器或 :nth-child 类伪类时，顶层元素的样式与它前后的顶层元素有关。
+        返回 False 时，文档可按顶层元素切分后分别内联样式，结果与整体内联一致。
+        """
+        for selector in self.selectors:
+            for index, compound in enumerate(selector.compounds):
+                if compound.nth:
+                    return True
+                if index == len(selector.combinators) or selector.combinators[index] not in ('+', '~'):
+                    break
+                return True
+        return False
+
+    def _candidate_rules(self, elem: Tag) -> Set[int]:
+        """根据元素的标签、类、ID查出可能命中的规则"""
+        candidates = set(self.universal)
+        candidates.update(self.by_tag.get(elem.name, ()))
+
+        for cls in elem.get('class') or ():
+            candidates.update(self.by_class.get(cls, ()))
+
+        elem_id = elem.get('id')
+        if elem_id is not None:
+            candidates.update(self.by_id.get(elem_id, ()))
+
+        return candidates
+
+    @staticmethod
+    def _parent(elem: Tag) -> Optional[Tag]:
+        parent = elem.parent
+        return None if parent is None or isinstance(parent, BeautifulSoup) else parent
+
+    @staticmethod
+    def _previous_siblings(elem: Tag):
+        sibling = elem.previous_sibling
+        while sibling is not None:
+            if isinstance(sibling, Tag):
+                yield sibling
+            sibling = sibling.previous_sibling
+
+    def _matches_from(self, selector: Selector, index: int, elem: Tag, positions: SiblingPositions) -> bool:
+        """elem 已满足第 index 个复合选择器，继续向左匹配剩余部分"""
+        if index == 0:
+            return True
+
+        combinator = selector.combinators[index - 1]
+        compound = selector.compounds[index - 1]
+
+        if combinator == '>':
+            parent = self._parent(elem)
+            return (parent is not None and compound.matches(parent, positions)
+                    and self._matches_from(selector, index - 1, parent, positions))
+
+        if combinator == ' ':
+            ancestor = self._parent(elem)
+            while ancestor is not None:
+                if compound.matches(ancestor, positions) and self._matches_from(selector, index - 1, ancestor, positions):
+                    return True
+                ancestor = self._parent(ancestor)
+            return False
+
+        for sibling in self._previous_siblings(elem):
+            if compound.matches(sibling, positions) and self._matches_from(selector, index - 1, sibling, positions):
+                return True
+            if combinator == '+':
+                # 相邻兄弟只检查紧邻的前一个元素
+                return False
+        return False
+
+    def matches(self, selector: Selector, elem: Tag, positions: Optional[SiblingPositions] = None) -> bool:
+        """从右向左匹配选择器"""
+        positions = positions or SiblingPositions()
+        last = len(selector.compounds) - 1
+        return (selector.compounds[last].matches(elem, positions)
+                and self._matches_from(selector, last, elem, positions))
+
+    def apply(self, soup: BeautifulSoup) -> None:
+        """单次遍历DOM，将层叠后的CSS声明写入每个元素的style属性（不覆盖已有样式）"""
+        positions = SiblingPositions()
+
+        for elem in soup.find_all(True):
+            candidates = self._candidate_rules(elem)
+            if not candidates:
+                continue
+
+            matched = [i for i in candidates if self.matches(self.selectors[i], elem, positions)]
+            if not matched:
+                continue
+
+            # 按 特异性 → 源顺序 排序，后者覆盖前者
+            matched.sort(key=lambda i: (self.selectors[i].specificity, i))
+            cascaded: Dict[str, str] = {}
+            for rule_index in matched:
+                cascaded.update(self.styles[rule_index])
+
+            style_dict = parse_style(elem.get('style', ''))
+            for prop, value in cascaded.items():
+                if prop not in style_dict:
+                    style_dict[prop] = value
+
+            elem['style'] = '; '.join(f'{k}: {v}' for k, v in style_dict.items())
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Incremental Block-Level Rendering for Live Preview
+实时预览的增量渲染：按顶层块缓存渲染结果，每次保存只重新渲染改动过的块
+
+文章按 chunked_convert.split_sections 的规则（空行之后的标题行）切分为若干块，
+每块以内容哈希为键缓存转换结果，拼接后与 WeChatHTMLConverter.convert() 逐字节一致：
+  - 主题规则与顶层元素位置无关时，缓存的是内联样式之后的HTML，未改动的块完全不再处理
+  - 否则缓存Markdown转换和代码高亮的结果，拼接后统一解析和内联样式
+  - 主题文件修改（mtime变化）时重建转换器并清空缓存
+  - 文章不适合切分时整篇转换（判断与分块并行转换共用 split_sections：含顶层原始HTML块、
+    引用定义重复，或定义在引用块、列表项内或跨行时）
+
+同时渲染多个主题（对比预览）时，改动的块用 convert_themes 转换，Markdown转换和代码高亮
+各主题共用一次；有主题的规则与顶层元素位置有关时，每次整篇调用 convert_themes。
+"""
+
+import hashlib
+from typing import Dict, List, Optional
+
+from markdown_to_html import WeChatHTMLConverter, StageTimer, available_themes, convert_themes
+from chunked_convert import split_sections, render_chunk, passes_chunk_safe
+
+
+class IncrementalRenderer:
+    """
+    增量渲染器（单线程使用）
+
+    缓存只保留最近一次渲染中出现的块，内存占用与文章大小相当
+    """
+
+    def __init__(self, theme: str = 'tech', themes: Optional[List[str]] = None):
+        # themes 指定多个主题时用 render_themes() 同时渲染；render() 返回第一个主题
+        self.themes = list(themes) if themes else [theme]
+        self.theme = self.themes[0]
+        self.theme_files = [available_themes()[name] for name in self.themes]
+        self._theme_mtimes: Optional[List[int]] = None
+        self.converters: List[WeChatHTMLConverter] = []
+        # 块内容哈希 → 主题名 → 该块的渲染结果
+        self._blocks: Dict[str, Dict[str, str]] = {}
+        self._with_passes = False
+
+        # 最近一次渲染的统计：重新渲染的块数 / 总块数（整篇转换时均为1）
+        self.rendered = 0
+        self.total = 0
+
+    def _check_theme(self) -> None:
+        """主题文件修改后重建转换器，已缓存的块全部失效"""
+        mtimes = [theme_file.stat().st_mtime_ns for theme_file in self.theme_files]
+        if mtimes != self._theme_mtimes:
+            self.converters = [WeChatHTMLConverter(theme=name) for name in self.themes]
+            self._theme_mtimes = mtimes
+            self._with_passes = all(passes_chunk_safe(converter) for converter in self.converters)
+            self._blocks = {}
+
+    def render(self, markdown_text: str) -> str:
+        """转换Markdown为HTML，输出与 WeChatHTMLConverter.convert() 一致"""
+        return self.render_themes(markdown_text)[self.theme]
+
+    def render_themes(self, markdown_text: str) -> Dict[str, str]:
+        """转换为所有主题，返回 主题名 → HTML"""
+        self._check_theme()
+        converters = self.converters
+        multi = len(converters) > 1
+
+        sections = split_sections(converters[0]._strip_h1(markdown_text))
+        if sections is None or (multi and not self._with_passes):
+            self._blocks = {}
+            self.rendered = self.total = 1
+            return convert_themes(markdown_text, converters)
+
+        blocks: Dict[str, Dict[str, str]] = {}
+        keys = []
+        for section in sections:
+            key = hashlib.sha1(section.encode('utf-8')).hexdigest()
+            keys.append(key)
+            if key in blocks:
+                continue
+            rendered = self._blocks.get(key)
+            if rendered is None:
+                if multi:
+                    rendered = convert_themes(section, converters, wrap=False)
+                else:
+                    rendered = {self.theme: render_chunk(converters[0], section, self._with_passes)}
+            blocks[key] = rendered
+
+        self.rendered = len(blocks) - len(self._blocks.keys() & blocks.keys())
+        self.total = len(sections)
+        self._blocks = blocks
+
+        results = {}
+        for converter in converters:
+            # 只含空行或引用定义的分块没有输出，不参与拼接
+            html_content = '\n'.join(blocks[key][converter.theme] for key in keys if blocks[key][converter.theme])
+            if self._with_passes:
+                results[converter.theme] = converter._wrap_html(html_content)
+            else:
+                from bs4 import BeautifulSoup
+
+                soup = BeautifulSoup(html_content, 'html.parser')
+                results[converter.theme] = converter._render_document(soup, StageTimer())
+        return results
@@ -6,40 +6,109 @@ Markdown to HTML Converter for WeChat Public Accounts
 """
 
 import argparse
+import hashlib
+import html as html_lib
+import json
 import os
 import sys
 import re
+import time
 from pathlib import Path
-from typing import Optional, Dict
-import markdown
-from markdown.extensions import codehilite, fenced_code, tables, nl2br
-from bs4 import BeautifulSoup
-import cssutils
-import logging
+from typing import Optional, Dict, Any, Callable, List, Tuple, TYPE_CHECKING
 
-# 禁用cssutils的警告日志
-cssutils.log.setLevel(logging.CRITICAL)
+# 第三方依赖（markdown、bs4、cssutils、pygments）均在首次使用时才导入：
+# 命令行每篇文章启动一次解释器，导入耗时占比很高；主题命中编译缓存时完全不需要cssutils
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+    from css_inliner import CSSInliner
+    from code_highlighter import CodeHighlighter, HighlightCache
+
+# 转换器版本：内联逻辑或编译产物格式变化时递增，旧的主题缓存随之失效
+CONVERTER_VERSION = '1.3.0'
+
+TEMPLATES_DIR = Path(__file__).parent.parent / 'templates'
+
+# 代码高亮磁盘缓存目录（--highlight-cache）
+HIGHLIGHT_CACHE_DIR = '~/.wechat-article-formatter/cache/highlight'
+
+# Markdown输出的代码块（fenced_code 带 language- 类，缩进代码块不带）
+CODE_BLOCK_PATTERN = re.compile(
+    r'<pre><code(?: class="language-(?P<lang>[^"]+)")?>(?P<code>.*?)</code></pre>',
+    re.DOTALL
+)
+
+
+class StageTimer:
+    """
+    分阶段计时：每次 mark(name) 记录距上一次 mark 的耗时（秒）
+
+    timings 为 None 时不计时，不传计时字典的调用几乎没有额外开销
+    """
+
+    def __init__(self, timings: Optional[Dict[str, float]] = None):
+        self.timings = timings
+        self._last = time.perf_counter() if timings is not None else 0.0
+
+    def mark(self, stage: str) -> None:
+        if self.timings is None:
+            return
+        now = time.perf_counter()
+        self.timings[stage] = self.timings.get(stage, 0.0) + now - self._last
+        self._last = now
+
+
+def available_themes() -> Dict[str, Path]:
+    """扫描templates目录，返回 主题名 → CSS文件 映射（xxx-theme.css → xxx）"""
+    return {
+        css_file.name[:-len('-theme.css')]: css_file
+        for css_file in sorted(TEMPLATES_DIR.glob('*-theme.css'))
+    }
 
 
 class WeChatHTMLConverter:
     """微信公众号HTML转换器"""
 
-    def __init__(self, theme: str = 'tech'):
+    # 编译后的主题缓存目录（按CSS内容哈希 + 转换器版本命名）
+    THEME_CACHE_DIR = os.path.expanduser("~/.wechat-article-formatter/cache/themes")
+
+    def __init__(self, theme: str = 'tech', highlight_cache: Optional['HighlightCache'] = None):
         self.theme = theme
+        # 代码高亮缓存（默认使用进程内共享的内存缓存，多个转换器复用同一份高亮结果）
+        self.highlight_cache = highlight_cache
+        self._highlighter = None
         self.theme_css = self._load_theme_css()
+        self.theme_hash = hashlib.sha256(self.theme_css.encode('utf-8')).hexdigest()
+        self._compiled_theme = None
+        self._inliner = None
+
+        # DOM处理流水线：HTML只解析一次，各pass依次原地修改同一棵树，最后统一序列化
+        self.passes: List[Callable[['BeautifulSoup'], None]] = [
+            self._enhance_code_blocks,
+            self._process_images,
+            self._apply_inline_styles,
+        ]
+
+    def register_pass(self, dom_pass: Callable[['BeautifulSoup'], None], index: Optional[int] = None) -> None:
+        """
+        注册自定义DOM pass
+
+        Args:
+            dom_pass: 接收BeautifulSoup对象并原地修改的函数
+            index: 插入位置（默认追加到末尾；需要被内联样式覆盖的pass应插在样式内联之前）
+        """
+        if index is None:
+            self.passes.append(dom_pass)
+        else:
+            self.passes.insert(index, dom_pass)
 
     def _load_theme_css(self) -> str:
         """加载主题CSS"""
-        theme_map = {
-            'tech': 'tech-theme.css',
-            'minimal': 'minimal-theme.css',
-            'business': 'business-theme.css'
-        }
+        theme_map = available_themes()
 
         if self.theme not in theme_map:
             raise ValueError(f"Unknown theme: {self.theme}. Available: {', '.join(theme_map.keys())}")
 
-        css_file = Path(__file__).parent.parent / 'templates' / theme_map[self.theme]
+        css_file = theme_map[self.theme]
 
         if not css_file.exists():
             raise FileNotFoundError(f"Theme CSS file not found: {css_file}")
@@ -47,9 +116,70 @@ class WeChatHTMLConverter:
         with open(css_file, 'r', encoding='utf-8') as f:
             return f.read()
 
-    def _parse_css_to_dict(self) -> Dict[str, Dict[str, str]]:
-        """解析CSS为字典格式，用于内联样式"""
-        css_rules = {}
+    @property
+    def compiled_theme(self) -> Dict[str, Any]:
+        """
+        编译后的主题（规则表 + :root变量），依次查找内存、磁盘缓存，都未命中时才调用cssutils编译
+
+        磁盘缓存以 CSS内容哈希 + CONVERTER_VERSION 为键，修改主题文件或升级转换器后自动失效
+        """
+        if self._compiled_theme is None:
+            self._compiled_theme = self._load_compiled_theme()
+            if self._compiled_theme is None:
+                self._compiled_theme = self._compile_theme()
+                self._save_compiled_theme(self._compiled_theme)
+        return self._compiled_theme
+
+    def _compiled_theme_path(self) -> Path:
+        """主题缓存文件路径"""
+        return Path(self.THEME_CACHE_DIR) / f'{self.theme}-{self.theme_hash[:16]}-v{CONVERTER_VERSION}.json'
+
+    def _load_compiled_theme(self) -> Optional[Dict[str, Any]]:
+        """读取磁盘上的主题缓存，缓存缺失、损坏或不匹配时返回None"""
+        try:
+            with open(self._compiled_theme_path(), 'r', encoding='utf-8') as f:
+                compiled = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if compiled.get('css_hash') != self.theme_hash or compiled.get('version') != CONVERTER_VERSION:
+            return None
+        return compiled
+
+    def _save_compiled_theme(self, compiled: Dict[str, Any]) -> None:
+        """写入主题缓存（先写临时文件再原子替换，避免并发写入时读到半个文件）"""
+        cache_path = self._compiled_theme_path()
+        tmp_path = cache_path.with_name(f'{cache_path.name}.{os.getpid()}.tmp')
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(compiled, f, ensure_ascii=False)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            # 缓存只是加速手段，写入失败（如只读目录）时不影响转换
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+
+    def _compile_theme(self) -> Dict[str, Any]:
+        """编译主题CSS为可直接使用的规则表"""
+        css_vars_match = re.search(r':root\s*\{([^}]+)\}', self.theme_css)
+        # 代码高亮配色：主题 :root 中的 --code-highlight-style（Pygments样式名）
+        code_style_match = re.search(r'--code-highlight-style:\s*([\w-]+)', self.theme_css)
+
+        return {
+            'version': CONVERTER_VERSION,
+            'theme': self.theme,
+            'css_hash': self.theme_hash,
+            'rules': self._parse_css_rules(),
+            'root_vars': css_vars_match.group(1) if css_vars_match else '',
+            'code_style': code_style_match.group(1) if code_style_match else 'default',
+        }
+
+    def _parse_css_rules(self) -> List[Tuple[str, Dict[str, str]]]:
+        """解析CSS为按源顺序排列的 (选择器, 样式) 列表，用于内联样式"""
+        css_rules = []
 
         # 解析CSS变量
         css_vars = {}
@@ -59,12 +189,16 @@ class WeChatHTMLConverter:
             var_value = match.group(2).strip()
             css_vars[var_name] = var_value
 
-        # 使用cssutils解析CSS规则
+        # 使用cssutils解析CSS规则（仅在主题缓存未命中时导入）
+        import cssutils
+        import logging
+
+        # 禁用cssutils的警告日志
+        cssutils.log.setLevel(logging.CRITICAL)
         sheet = cssutils.parseString(self.theme_css)
 
         for rule in sheet:
             if rule.type == rule.STYLE_RULE:
-                selector = rule.selectorText
                 styles = {}
 
                 for prop in rule.style:
@@ -74,57 +208,65 @@ class WeChatHTMLConverter:
                         value = value.replace(f'var({var_name})', var_value)
                     styles[prop.name] = value
 
-                # 处理多个选择器
-                for sel in selector.split(','):
-                    sel = sel.strip()
-                    if sel not in css_rules:
-                        css_rules[sel] = {}
-                    css_rules[sel].update(styles)
+                # 处理多个选择器（保留源顺序，层叠时同特异性的后出现者优先）
+                for sel in rule.selectorList:
+                    css_rules.append((sel.selectorText, styles))
 
         return css_rules
 
-    def _apply_inline_styles(self, html: str, css_rules: Dict[str, Dict[str, str]]) -> str:
-        """将CSS样式内联到HTML标签中"""
-        soup = BeautifulSoup(html, 'html.parser')
-
-        # 处理简单选择器（标签、类、ID）
-        for selector, styles in css_rules.items():
-            # 跳过伪类、伪元素、媒体查询等复杂选择器
-            if any(x in selector for x in [':', '@', '>', '+', '~', '[', '*']):
-                continue
-
-            try:
-                elements = soup.select(selector)
-                for elem in elements:
-                    # 合并现有style属性
-                    existing_style = elem.get('style', '')
-                    style_dict = {}
-
-                    # 解析现有style
-                    if existing_style:
-                        for item in existing_style.split(';'):
-                            if ':' in item:
-                                key, value = item.split(':', 1)
-                                style_dict[key.strip()] = value.strip()
-
-                    # 添加新样式（不覆盖现有样式）
-                    for prop, value in styles.items():
-                        if prop not in style_dict:
-                            style_dict[prop] = value
-
-                    # 生成新的style字符串
-                    new_style = '; '.join(f'{k}: {v}' for k, v in style_dict.items())
-                    elem['style'] = new_style
-            except Exception as e:
-                # 忽略无法处理的选择器
-                continue
-
-        return str(soup)
-
-    def _enhance_code_blocks(self, html: str) -> str:
+    @property
+    def highlighter(self) -> 'CodeHighlighter':
+        """使用主题代码配色的高亮器（每个转换器实例只构建一次）"""
+        if self._highlighter is None:
+            from code_highlighter import CodeHighlighter
+            self._highlighter = CodeHighlighter(cache=self.highlight_cache, style=self.compiled_theme['code_style'])
+        return self._highlighter
+
+    @property
+    def inliner(self) -> 'CSSInliner':
+        """按主题规则表建立索引的样式内联器（每个转换器实例只构建一次）"""
+        if self._inliner is None:
+            from css_inliner import CSSInliner
+            self._inliner = CSSInliner(self.compiled_theme['rules'])
+        return self._inliner
+
+    def _apply_inline_styles(self, soup: 'BeautifulSoup', css_rules: Optional[List[Tuple[str, Dict[str, str]]]] = None) -> None:
+        """将CSS样式内联到HTML标签中（默认使用编译后的主题规则表）"""
+        if css_rules is None:
+            inliner = self.inliner
+        else:
+            from css_inliner import CSSInliner
+            inliner = CSSInliner(css_rules)
+        inliner.apply(soup)
+
+    def _highlight_code_blocks(self, html: str) -> str:
+        """
+        代码高亮（按代码内容哈希缓存，未标注语言时用快速特征识别代替guess_lexer）
+
+        在BeautifulSoup解析之前按字符串替换Markdown输出的代码块，高亮结果随整篇文档只解析一次
+        """
+        return CODE_BLOCK_PATTERN.sub(self._highlight_match, html)
+
+    def _highlight_match(self, match: 're.Match') -> str:
+        """高亮 CODE_BLOCK_PATTERN 匹配到的一个代码块"""
+        code = match.group('code')
+        # 转义后的代码不含 '<'，包含时说明是文章中直接嵌入的HTML，保持原样
+        if '<' in code:
+            return match.group(0)
+        return self.highlighter.highlight(html_lib.unescape(code), match.group('lang')).rstrip('\n')
+
+    def _code_fanout_safe(self) -> bool:
+        """
+        多主题转换时能否把代码块内容留到序列化之后再填入（见 convert_themes）
+
+        要求只使用内置DOM pass，且没有可能命中代码块内 <span> 的规则（标签为span或不限标签的选择器）
+        """
+        return (self.passes == [self._enhance_code_blocks, self._process_images, self._apply_inline_styles]
+                and 'span' not in self.inliner.by_tag
+                and not self.inliner.universal)
+
+    def _enhance_code_blocks(self, soup: 'BeautifulSoup') -> None:
         """增强代码块显示效果"""
-        soup = BeautifulSoup(html, 'html.parser')
-
         # 处理代码块
         for pre in soup.find_all('pre'):
             code = pre.find('code')
@@ -141,12 +283,8 @@ class WeChatHTMLConverter:
                 if language:
                     pre['data-lang'] = language
 
-        return str(soup)
-
-    def _process_images(self, html: str) -> str:
+    def _process_images(self, soup: 'BeautifulSoup') -> None:
         """处理图片标签，确保适合微信显示"""
-        soup = BeautifulSoup(html, 'html.parser')
-
         for img in soup.find_all('img'):
             # 确保图片有必要的样式
             existing_style = img.get('style', '')
@@ -154,21 +292,33 @@ class WeChatHTMLConverter:
                 style_additions = 'max-width: 100%; height: auto; display: block; margin: 24px auto;'
                 img['style'] = f'{existing_style}; {style_additions}' if existing_style else style_additions
 
-        return str(soup)
+    def convert(self, markdown_text: str, timings: Optional[Dict[str, float]] = None) -> str:
+        """
+        转换Markdown为HTML
 
-    def convert(self, markdown_text: str) -> str:
-        """转换Markdown为HTML"""
-        # ⚠️ 移除 H1 标题（微信公众号有独立的标题输入框）
-        # 删除以 "# " 开头的行（注意：## 和更多 # 的不删除）
-        lines = markdown_text.split('\n')
-        filtered_lines = []
-        for line in lines:
-            # 只删除单个 # 开头的行（H1 标题）
-            if line.strip().startswith('# ') and not line.strip().startswith('## '):
-                continue  # 跳过 H1 标题行
-            filtered_lines.append(line)
+        Args:
+            timings: 传入字典时记录各阶段耗时（秒）：strip_h1、markdown、highlight、parse、
+                     每个DOM pass（按函数名）、serialize、wrap
+        """
+        from bs4 import BeautifulSoup
+
+        timer = StageTimer(timings)
+        html_content = self._render_markdown(markdown_text, timer)
+
+        # 代码高亮
+        html_content = self._highlight_code_blocks(html_content)
+        timer.mark('highlight')
+
+        # 只解析一次，依次执行DOM pass（增强代码块 → 处理图片 → 内联样式），最后统一序列化
+        soup = BeautifulSoup(html_content, 'html.parser')
+        timer.mark('parse')
 
-        markdown_text = '\n'.join(filtered_lines)
+        return self._render_document(soup, timer)
+
+    def _render_markdown(self, markdown_text: str, timer: StageTimer) -> str:
+        """移除H1并将Markdown转换为HTML片段（与主题无关）"""
+        markdown_text = self._strip_h1(markdown_text)
+        timer.mark('strip_h1')
 
         # 配置Markdown扩展
         extensions = [
@@ -176,41 +326,51 @@ class WeChatHTMLConverter:
             'markdown.extensions.tables',
             'markdown.extensions.nl2br',
             'markdown.extensions.sane_lists',
-            'markdown.extensions.codehilite',
         ]
 
-        extension_configs = {
-            'codehilite': {
-                'linenums': False,
-                'guess_lang': True,
-                'noclasses': True,
-            }
-        }
+        import markdown
 
         # 转换Markdown为HTML
-        md = markdown.Markdown(extensions=extensions, extension_configs=extension_configs)
+        md = markdown.Markdown(extensions=extensions)
         html_content = md.convert(markdown_text)
+        timer.mark('markdown')
+        return html_content
 
-        # 增强代码块
-        html_content = self._enhance_code_blocks(html_content)
+    @staticmethod
+    def _strip_h1(markdown_text: str) -> str:
+        """移除H1标题行（结果再次调用不会有变化）"""
+        # ⚠️ 移除 H1 标题（微信公众号有独立的标题输入框）
+        # 删除以 "# " 开头的行（注意：## 和更多 # 的不删除）
+        lines = markdown_text.split('\n')
+        filtered_lines = []
+        for line in lines:
+            # 只删除单个 # 开头的行（H1 标题）
+            if line.strip().startswith('# ') and not line.strip().startswith('## '):
+                continue  # 跳过 H1 标题行
+            filtered_lines.append(line)
 
-        # 处理图片
-        html_content = self._process_images(html_content)
+        return '\n'.join(filtered_lines)
 
-        # 解析CSS并内联样式
-        css_rules = self._parse_css_to_dict()
-        html_content = self._apply_inline_styles(html_content, css_rules)
+    def _render_document(self, soup: 'BeautifulSoup', timer: StageTimer, wrap: bool = True) -> str:
+        """在解析好的文档树上执行DOM pass，序列化并包装为完整HTML文档（wrap为False时只返回正文）"""
+        for dom_pass in self.passes:
+            dom_pass(soup)
+            timer.mark(getattr(dom_pass, '__name__', 'pass').lstrip('_'))
+        html_content = str(soup)
+        timer.mark('serialize')
+        if not wrap:
+            return html_content
 
         # 包装为完整HTML文档
         full_html = self._wrap_html(html_content)
+        timer.mark('wrap')
 
         return full_html
 
     def _wrap_html(self, body_content: str) -> str:
         """包装为完整的HTML文档"""
-        # 提取CSS变量以在head中定义
-        css_vars_match = re.search(r':root\s*\{([^}]+)\}', self.theme_css)
-        css_vars = css_vars_match.group(1) if css_vars_match else ''
+        # CSS变量在head中定义（编译主题时已提取）
+        css_vars = self.compiled_theme['root_vars']
 
         html_template = f'''<!DOCTYPE html>
 <html lang="zh-CN">
@@ -244,34 +404,184 @@ class WeChatHTMLConverter:
 
         return html_template
 
-    def convert_file(self, input_file: str, output_file: Optional[str] = None) -> str:
-        """转换Markdown文件为HTML文件"""
-        input_path = Path(input_file)
-
-        if not input_path.exists():
-            raise FileNotFoundError(f"Input file not found: {input_file}")
-
-        # 读取Markdown文件
-        with open(input_path, 'r', encoding='utf-8') as f:
-            markdown_text = f.read()
+    def convert_file(self, input_file: str, output_file: Optional[str] = None,
+                     timings: Optional[Dict[str, float]] = None) -> str:
+        """转换Markdown文件为HTML文件（timings 同 convert，另记录 read、write）"""
+        timer = StageTimer(timings)
+        markdown_text = read_markdown(input_file)
+        timer.mark('read')
 
         # 转换为HTML
-        html_content = self.convert(markdown_text)
-
-        # 确定输出文件路径
-        if output_file is None:
-            output_file = input_path.with_suffix('.html')
-
-        output_path = Path(output_file)
-
-        # 确保输出目录存在
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-
-        # 写入HTML文件
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+        html_content = self.convert(markdown_text, timings)
+        timer = StageTimer(timings)
+
+        output_path = write_html(html_content, input_file, output_file)
+        timer.mark('write')
+        return output_path
+
+
+def convert_themes(markdown_text: str, converters: List[WeChatHTMLConverter],
+                   timings: Optional[Dict[str, float]] = None, wrap: bool = True) -> Dict[str, str]:
+    """
+    一篇文章同时转换为多个主题，返回 主题名 → HTML，输出与逐个主题调用 convert() 完全一致
+
+    移除H1和Markdown转换整篇只做一次。代码高亮后的HTML占文档解析和序列化的大头，而各主题的
+    代码配色不同，因此先用占位符代替代码块内容，整篇只解析一次；每个主题在文档树副本上执行
+    DOM pass（内联样式只作用于代码块外层的 div/pre/code）并序列化，把该主题配色的代码块内容
+    填回占位符，再恢复文档树的style属性供下一个主题复用。有主题使用自定义DOM pass或可能命中代码块内 <span> 的规则时，
+    改为按代码配色分组，同配色的主题共用一次高亮和解析。
+
+    Args:
+        timings: 同 convert()，各主题的同名阶段累加；另记录 fill_code（填回代码块）、
+                 restore（恢复文档树供下一主题使用）、copy（分组路径下复制文档树）
+        wrap: 为False时返回正文HTML片段，不包装为完整文档（用于分块转换后再拼接）
+    """
+    import copy
+    from bs4 import BeautifulSoup
+
+    if not converters:
+        return {}
+
+    timer = StageTimer(timings)
+    html_content = converters[0]._render_markdown(markdown_text, timer)
+
+    # 按代码配色分组（保持传入顺序）
+    groups: Dict[str, List[WeChatHTMLConverter]] = {}
+    for converter in converters:
+        groups.setdefault(converter.compiled_theme['code_style'], []).append(converter)
+
+    results = None
+    if all(converter._code_fanout_safe() for converter in converters):
+        results = _convert_themes_with_placeholders(html_content, groups, timer, wrap)
+
+    if results is None:
+        results = {}
+        for group in groups.values():
+            highlighted = group[0]._highlight_code_blocks(html_content)
+            timer.mark('highlight')
+            soup = BeautifulSoup(highlighted, 'html.parser')
+            timer.mark('parse')
+
+            for i, converter in enumerate(group):
+                # 最后一个主题直接使用原文档树，其余在副本上修改
+                tree = soup if i == len(group) - 1 else copy.copy(soup)
+                timer.mark('copy')
+                results[converter.theme] = converter._render_document(tree, timer, wrap)
+
+    return {converter.theme: results[converter.theme] for converter in converters}
+
+
+def _convert_themes_with_placeholders(html_content: str, groups: Dict[str, List[WeChatHTMLConverter]],
+                                      timer: StageTimer, wrap: bool = True) -> Optional[Dict[str, str]]:
+    """convert_themes 的单次解析路径；代码块外层结构因配色而异时返回None，由调用方改用分组路径"""
+    import uuid
+    from bs4 import BeautifulSoup
+
+    # 文章中不可能出现的占位符前缀
+    token = f'wxcode{uuid.uuid4().hex}'
+    # 配色 → 各代码块内容
+    blocks: Dict[str, List[str]] = {style: [] for style in groups}
+    consistent = True
+
+    def replace_block(match):
+        nonlocal consistent
+        wrapper = None
+        for style, group in groups.items():
+            highlighted = group[0]._highlight_match(match)
+            if highlighted is match.group(0):
+                return highlighted  # 内嵌HTML，不高亮，原样保留
+
+            # 拆为 外层开头（至 <code ...>）、内容、外层结尾（自 </code>）
+            open_end = highlighted.find('>', highlighted.find('<code')) + 1
+            close_start = highlighted.rfind('</code>')
+            outer = (highlighted[:open_end], highlighted[close_start:])
+            if wrapper is not None and outer != wrapper:
+                consistent = False
+            wrapper = outer
+            # 与BeautifulSoup序列化文本节点的转义保持一致（它不转义引号）
+            blocks[style].append(highlighted[open_end:close_start].replace('&quot;', '"'))
+        return f'{wrapper[0]}{token}-{len(blocks[style]) - 1}-{wrapper[1]}'
+
+    with_placeholders = CODE_BLOCK_PATTERN.sub(replace_block, html_content)
+    timer.mark('highlight')
+    if not consistent:
+        return None
+
+    soup = BeautifulSoup(with_placeholders, 'html.parser')
+    timer.mark('parse')
+
+    # 内置DOM pass中只有style属性随主题变化（data-lang每次写入相同的值），
+    # 每个主题渲染后把style恢复原样即可复用同一棵树，比复制文档树快得多
+    original_styles = [(tag, tag.get('style')) for tag in soup.find_all(True)]
+
+    placeholder = re.compile(re.escape(token) + r'-(\d+)-')
+    results = {}
+    for style, group in groups.items():
+        for converter in group:
+            rendered = converter._render_document(soup, timer, wrap)
+            results[converter.theme] = placeholder.sub(lambda m: blocks[style][int(m.group(1))], rendered)
+            timer.mark('fill_code')
+
+            for tag, original in original_styles:
+                if original is None:
+                    tag.attrs.pop('style', None)
+                else:
+                    tag['style'] = original
+            timer.mark('restore')
+    return results
+
+
+def read_markdown(input_file: str) -> str:
+    """读取Markdown文件"""
+    input_path = Path(input_file)
+
+    if not input_path.exists():
+        raise FileNotFoundError(f"Input file not found: {input_file}")
+
+    with open(input_path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def write_html(html_content: str, input_file: str, output_file: Optional[str] = None) -> str:
+    """写入HTML文件（默认与输入文件同名.html），返回输出路径"""
+    # 确定输出文件路径
+    if output_file is None:
+        output_file = Path(input_file).with_suffix('.html')
+
+    output_path = Path(output_file)
+
+    # 确保输出目录存在
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # 写入HTML文件
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(html_content)
+
+    return str(output_path)
+
+
+def convert_file_via_daemon(input_file: str, output_file: Optional[str] = None,
+                            theme: str = 'tech', highlight_cache: bool = False) -> Optional[str]:
+    """
+    通过常驻转换服务（conversion_daemon.py）转换文件
+
+    Returns:
+        输出文件路径；守护进程未运行或转换失败时返回 None，调用方应回退到进程内转换
+    """
+    # 客户端只依赖标准库，走这条路径时不会导入任何第三方依赖
+    from conversion_daemon import request_conversion, DaemonError
+
+    markdown_text = read_markdown(input_file)
+    try:
+        result = request_conversion(markdown_text, theme, CONVERTER_VERSION, highlight_cache=highlight_cache)
+    except DaemonError as e:
+        print(f'⚠️  守护进程转换失败，改为进程内转换: {e}', file=sys.stderr)
+        return None
+    if result is None:
+        return None
 
-        return str(output_path)
+    html_content, _meta = result
+    return write_html(html_content, input_file, output_file)
 
 
 def main():
@@ -297,25 +607,60 @@ def main():
   tech      - 科技风主题（蓝紫渐变，现代科技感）
   minimal   - 简约风主题（黑白灰，极简设计）
   business  - 商务风主题（深蓝金色，专业稳重）
+  自定义    - 放在templates目录下的 xxx-theme.css，使用 --theme xxx
+
+主题缓存:
+  每个主题编译后缓存在 ~/.wechat-article-formatter/cache/themes/，
+  按CSS内容哈希失效，修改主题文件后自动重新编译
+
+超长文章（数万字的合集）:
+  --parallel 在标题处分块，多进程并行转换后按顺序拼接，输出与串行转换逐字节一致
+
+常驻转换服务:
+  python conversion_daemon.py start 启动后，本脚本自动通过它转换（单篇毫秒级），
+  未运行时回退到进程内转换；--no-daemon 强制进程内转换
         '''
     )
 
     parser.add_argument('-i', '--input', required=True, help='输入的Markdown文件路径')
     parser.add_argument('-o', '--output', help='输出的HTML文件路径（默认：与输入文件同名.html）')
     parser.add_argument('-t', '--theme', default='tech',
-                        choices=['tech', 'minimal', 'business'],
-                        help='选择主题样式（默认：tech）')
+                        choices=list(available_themes()),
+                        help='选择主题样式（默认：tech，templates目录下的 xxx-theme.css 会自动识别为主题 xxx）')
     parser.add_argument('-p', '--preview', action='store_true',
                         help='转换后在浏览器中打开预览')
+    parser.add_argument('--highlight-cache', action='store_true',
+                        help=f'将代码高亮结果持久化到磁盘缓存（{HIGHLIGHT_CACHE_DIR}），重复转换时跳过Pygments')
+
+    parser.add_argument('--no-daemon', action='store_true',
+                        help='不使用常驻转换服务，始终在当前进程内转换')
+    parser.add_argument('--parallel', type=int, nargs='?', const=0, metavar='N',
+                        help='超长文章分块并行转换（N个进程，默认CPU核心数），输出与串行一致；短文章自动串行')
 
     args = parser.parse_args()
 
     try:
-        # 创建转换器
-        converter = WeChatHTMLConverter(theme=args.theme)
-
-        # 转换文件
-        output_path = converter.convert_file(args.input, args.output)
+        # 常驻转换服务在运行时直接交给它转换，省去导入和主题编译
+        output_path = None
+        if args.parallel is not None:
+            from chunked_convert import ChunkedConverter
+
+            with ChunkedConverter(theme=args.theme, workers=args.parallel or None) as chunked:
+                html_content = chunked.convert(read_markdown(args.input))
+            output_path = write_html(html_content, args.input, args.output)
+        elif not args.no_daemon:
+            output_path = convert_file_via_daemon(args.input, args.output, args.theme, args.highlight_cache)
+
+        if output_path is None:
+            # 创建转换器（高亮缓存会导入Pygments，只在指定 --highlight-cache 时创建）
+            highlight_cache = None
+            if args.highlight_cache:
+                from code_highlighter import HighlightCache
+                highlight_cache = HighlightCache(cache_dir=HIGHLIGHT_CACHE_DIR)
+            converter = WeChatHTMLConverter(theme=args.theme, highlight_cache=highlight_cache)
+
+            # 转换文件
+            output_path = converter.convert_file(args.input, args.output)
 
         print(f'✅ 转换成功！')
         print(f'📄 输入文件: {args.input}')
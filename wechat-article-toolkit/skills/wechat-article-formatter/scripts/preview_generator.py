@@ -6,72 +6,565 @@ Live Preview Generator for WeChat Articles
 """
 
 import argparse
+import fnmatch
+import gzip
+import hashlib
+import html as html_lib
 import sys
 import time
+from collections import OrderedDict
+from functools import partial
 from pathlib import Path
+from typing import Optional, Dict, List, Tuple
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-from markdown_to_html import WeChatHTMLConverter
+from markdown_to_html import available_themes, read_markdown, write_html
+from incremental_render import IncrementalRenderer
+from batch_convert import iter_markdown_files, MARKDOWN_SUFFIXES
 import webbrowser
 import threading
-from http.server import HTTPServer, SimpleHTTPRequestHandler
-import os
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from urllib.parse import quote, unquote, parse_qs
+
+# 保存事件的合并窗口（秒）：编辑器一次保存常触发多个事件，窗口内没有新事件才开始转换
+DEBOUNCE_SECONDS = 0.15
+
+# 浏览器订阅更新推送（Server-Sent Events）的路径
+LIVE_RELOAD_PATH = '/__live-reload'
+
+# 没有更新时定期发送心跳，及时发现已关闭的页面
+HEARTBEAT_SECONDS = 15
+
+# 工作区模式默认缓存的已渲染文章数
+WORKSPACE_CACHE_SIZE = 32
+
+# 工作区模式不进入的目录和不列出的文件
+WORKSPACE_EXCLUDE = ('.*', 'node_modules', '__pycache__')
+
+# 注入预览页面的脚本：订阅本页面的更新，收到推送后重新获取页面，只替换 body，不整页刷新（保留滚动位置）
+LIVE_RELOAD_SCRIPT = f'''<script>
+(function () {{
+    var source = new EventSource('{LIVE_RELOAD_PATH}?page=' + encodeURIComponent(location.pathname));
+    source.addEventListener('reload', function () {{
+        fetch(location.href, {{cache: 'no-store'}})
+            .then(function (response) {{ return response.text(); }})
+            .then(function (html) {{
+                var doc = new DOMParser().parseFromString(html, 'text/html');
+                document.body.innerHTML = doc.body.innerHTML;
+            }});
+    }});
+}})();
+</script>
+'''
+
+
+# 小于此大小的页面不压缩
+GZIP_MIN_BYTES = 1024
+
+# 预览页面之外只提供文章引用的图片、音视频等静态资源，其他文件（源文件、配置、.env等）一律404
+STATIC_SUFFIXES = ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.svg', '.bmp', '.ico', '.avif',
+                   '.mp4', '.webm', '.mp3', '.m4a', '.ogg')
+
+
+def is_static_asset(path: str, exclude: Tuple[str, ...] = ()) -> bool:
+    """
+    URL路径是否为可提供的静态资源：扩展名在 STATIC_SUFFIXES 中，
+    且任何一级都不以 . 开头、不匹配 exclude 中的模式（工作区模式传入 WORKSPACE_EXCLUDE）
+    """
+    parts = [part for part in unquote(path.split('?', 1)[0].split('#', 1)[0]).split('/') if part]
+    if not parts or any(part.startswith('.') for part in parts):
+        return False
+    if any(fnmatch.fnmatch(part, pattern) for part in parts for pattern in exclude):
+        return False
+    return Path(parts[-1]).suffix.lower() in STATIC_SUFFIXES
+
+
+class PreviewPage:
+    """
+    一个版本的预览页面：正文、强ETag和gzip压缩结果在转换线程中一次算好，
+    各请求线程只读取，不再重复计算
+    """
+
+    def __init__(self, html_content: str, live_reload: bool = False):
+        if live_reload:
+            html_content = html_content.replace('</head>', f'{LIVE_RELOAD_SCRIPT}</head>', 1)
+        self.body = html_content.encode('utf-8')
+        digest = hashlib.sha256(self.body).hexdigest()[:32]
+        self.etag = f'"{digest}"'
+        # 压缩后是不同的表示，强ETag必须不同
+        self.gzip_body = gzip.compress(self.body, compresslevel=6) if len(self.body) >= GZIP_MIN_BYTES else None
+        self.gzip_etag = f'"{digest}-gzip"'
+
+
+class LiveReloadHub:
+    """
+    预览版本号广播：页面更新后 publish()，各SSE连接在 wait() 中等待所订阅页面的版本变化
+
+    页面以URL路径区分；publish() 不指定页面时所有页面都视为更新
+    """
+
+    def __init__(self):
+        self._version = 0
+        self._versions: Dict[Optional[str], int] = {}
+        self._condition = threading.Condition()
+
+    def publish(self, page: Optional[str] = None) -> None:
+        with self._condition:
+            self._version += 1
+            self._versions[page] = self._version
+            self._condition.notify_all()
+
+    def version(self, page: Optional[str] = None) -> int:
+        """页面的当前版本号"""
+        with self._condition:
+            return max(self._versions.get(page, 0), self._versions.get(None, 0))
+
+    def wait(self, page: Optional[str], version: int, timeout: float) -> int:
+        """等待页面版本号不同于 version（最多 timeout 秒），返回当前版本号"""
+        with self._condition:
+            self._condition.wait_for(lambda: self.version(page) != version, timeout)
+            return self.version(page)
 
 
 class MarkdownChangeHandler(FileSystemEventHandler):
-    """监听Markdown文件变化的处理器"""
+    """
+    监听Markdown文件变化的处理器
 
-    def __init__(self, input_file: str, output_file: str, theme: str, auto_refresh: bool = True):
+    watchdog 回调只记录事件，转换在后台线程中进行：事件之后 debounce 秒内没有新事件才开始转换；
+    转换期间又有新事件时丢弃本次结果（不更新页面、不推送），立即按最新内容重新转换
+
+    转换结果保存在内存中（self.page）由预览服务器直接返回；指定 output_file 时另外写入文件
+
+    对比模式（指定 themes）：每次保存同时渲染所有主题（Markdown转换和代码高亮各主题共用），
+    self.page 为并排显示各主题的对比页，各主题页面在 self.pages 中（/<文章名>.<主题>.html）
+    """
+
+    def __init__(self, input_file: str, output_file: Optional[str], theme: str, auto_refresh: bool = True,
+                 hub: Optional[LiveReloadHub] = None, debounce: float = DEBOUNCE_SECONDS,
+                 themes: Optional[List[str]] = None):
         self.input_file = Path(input_file).absolute()
-        self.output_file = Path(output_file).absolute()
+        self.output_file = Path(output_file).absolute() if output_file else None
         self.theme = theme
+        self.themes = themes
         self.auto_refresh = auto_refresh
-        self.converter = WeChatHTMLConverter(theme=theme)
+        self.hub = hub
+        self.debounce = debounce
+        # 按顶层块缓存渲染结果，保存后只重新渲染改动过的块
+        self.renderer = IncrementalRenderer(theme=theme, themes=themes)
         self.last_modified = 0
-
-        # 初次转换
-        self._convert()
-
-    def _convert(self):
-        """执行转换"""
+        self.page: Optional[PreviewPage] = None
+        self.pages: Dict[str, PreviewPage] = {}
+        self.directory = self.input_file.parent
+
+        # 事件计数与最近一次事件的时间，由后台线程读取
+        self._generation = 0
+        self._last_event = 0.0
+        self._condition = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+
+        # 初次转换（同步完成，保证打开浏览器时预览文件已存在）
+        self._convert(self._generation)
+
+    def start(self) -> None:
+        """启动后台转换线程"""
+        self._worker = threading.Thread(target=self._run, name='preview-converter', daemon=True)
+        self._worker.start()
+
+    def _schedule(self) -> None:
+        """记录一次保存事件并唤醒后台线程"""
+        with self._condition:
+            self._generation += 1
+            self._last_event = time.monotonic()
+            self._condition.notify()
+
+    def _run(self) -> None:
+        """后台线程：等待事件平息后转换"""
+        converted = 0
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._generation != converted)
+                # 合并窗口：直到最近一次事件之后 debounce 秒内没有新事件
+                while True:
+                    remaining = self._last_event + self.debounce - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                generation = self._generation
+            self._convert(generation)
+            converted = generation
+
+    def _is_stale(self, generation: int) -> bool:
+        with self._condition:
+            return generation != self._generation
+
+    def _convert(self, generation: int):
+        """执行转换（generation 为开始转换时的事件计数，转换期间有新事件则丢弃结果）"""
         try:
             # 检查文件修改时间，避免重复转换
             current_modified = self.input_file.stat().st_mtime
             if current_modified == self.last_modified:
                 return
 
+            # 增量转换文件
+            start = time.perf_counter()
+            markdown_text = read_markdown(str(self.input_file))
+            if self.themes:
+                results = self.renderer.render_themes(markdown_text)
+            else:
+                results = {self.theme: self.renderer.render(markdown_text)}
+            if self._is_stale(generation):
+                return
+            self._publish_pages(results)
+            elapsed_ms = (time.perf_counter() - start) * 1000
             self.last_modified = current_modified
 
-            # 转换文件
-            self.converter.convert_file(str(self.input_file), str(self.output_file))
+            if self.auto_refresh and self.hub is not None:
+                self.hub.publish()
 
             timestamp = time.strftime('%H:%M:%S')
-            print(f'[{timestamp}] ✅ 已更新预览: {self.output_file.name}')
+            themes = f'{len(self.themes)} 个主题，' if self.themes else ''
+            print(f'[{timestamp}] ✅ 已更新预览: {self.input_file.name} '
+                  f'（{themes}重新渲染 {self.renderer.rendered}/{self.renderer.total} 块，{elapsed_ms:.0f}ms）')
 
         except Exception as e:
             timestamp = time.strftime('%H:%M:%S')
             print(f'[{timestamp}] ❌ 转换失败: {e}')
 
+    def _publish_pages(self, results: Dict[str, str]) -> None:
+        """更新内存中的预览页面（指定 output_file 时另外写入文件）"""
+        live_reload = self.hub is not None
+        if not self.themes:
+            html_content = results[self.theme]
+            self.page = PreviewPage(html_content, live_reload=live_reload)
+            if self.output_file is not None:
+                write_html(html_content, str(self.input_file), str(self.output_file))
+            return
+
+        self.pages = {theme: PreviewPage(html_content, live_reload=live_reload)
+                      for theme, html_content in results.items()}
+        if self.page is None:
+            # 对比页只是各主题页面的框架，内容不随文章变化
+            self.page = PreviewPage(self._render_compare_page())
+        if self.output_file is not None:
+            for theme, html_content in results.items():
+                output_file = self.output_file.with_name(f'{self.input_file.stem}.{theme}.html')
+                write_html(html_content, str(self.input_file), str(output_file))
+
+    def _render_compare_page(self) -> str:
+        """并排显示各主题的对比页（每个主题一个iframe，各自订阅更新）"""
+        stem = html_lib.escape(self.input_file.stem)
+        panes = '\n'.join(
+            f'''    <section>
+        <h2>🎨 {theme}</h2>
+        <iframe src="/{quote(self.input_file.stem)}.{theme}.html" title="{theme}"></iframe>
+    </section>''' for theme in self.themes)
+        return f'''<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <title>主题对比 - {stem}</title>
+    <style>
+        body {{ margin: 0; display: flex; gap: 12px; padding: 12px; background: #f0f0f0; overflow-x: auto;
+               font-family: -apple-system, "PingFang SC", "Microsoft YaHei", sans-serif; }}
+        section {{ flex: 0 0 auto; }}
+        h2 {{ font-size: 14px; margin: 0 0 8px; color: #666; }}
+        iframe {{ width: 414px; height: calc(100vh - 60px); border: 1px solid #ddd; background: #fff; }}
+    </style>
+</head>
+<body>
+{panes}
+</body>
+</html>'''
+
+    def page_for(self, path: str) -> Optional[PreviewPage]:
+        """
+        URL路径对应的预览页面（/ 和 /<文章名>.html；对比模式另有 /<文章名>.<主题>.html）；
+        其他路径返回 None
+        """
+        stem = self.input_file.stem
+        if path in ('/', f'/{stem}.html'):
+            return self.page
+        if self.themes and path.startswith(f'/{stem}.') and path.endswith('.html'):
+            return self.pages.get(path[len(stem) + 2:-len('.html')])
+        return None
+
     def on_modified(self, event):
         """文件修改时触发"""
         if event.src_path == str(self.input_file):
-            self._convert()
+            self._schedule()
+
+    def on_created(self, event):
+        """部分编辑器保存时先删除再新建文件"""
+        self.on_modified(event)
+
+    def on_moved(self, event):
+        """部分编辑器先写临时文件再重命名覆盖原文件"""
+        if event.dest_path == str(self.input_file):
+            self._schedule()
+
+
+class WorkspaceHandler(FileSystemEventHandler):
+    """
+    工作区模式：监听整个目录，所有文章共用一个预览服务器
+
+    - / 返回文章索引页（每次请求时遍历目录，启动时不做任何转换）
+    - /<相对路径>.html 在第一次请求时才转换对应的文章，结果放入容量为 cache_size 的LRU缓存，
+      内存占用只与缓存容量有关，与文章总数无关
+    - 文章修改后只使该文章的缓存失效（debounce 秒内的多个事件合并为一次推送），
+      下次请求时重新转换
+    """
+
+    def __init__(self, directory: str, theme: str, hub: Optional[LiveReloadHub] = None,
+                 cache_size: int = WORKSPACE_CACHE_SIZE, debounce: float = DEBOUNCE_SECONDS):
+        self.directory = Path(directory).absolute()
+        self.theme = theme
+        self.hub = hub
+        self.cache_size = cache_size
+        self.debounce = debounce
+        # 所有文章共用一个增量渲染器（转换串行进行）；刚改动的文章的块缓存在其中，重新转换只处理改动的块
+        self.renderer = IncrementalRenderer(theme=theme)
+        self._render_lock = threading.Lock()
+
+        # URL路径 → 预览页面（最近使用的在末尾）
+        self._cache: 'OrderedDict[str, PreviewPage]' = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # URL路径 → 等待推送的定时器（合并同一文章的连续事件）
+        self._timers: Dict[str, threading.Timer] = {}
+        # URL路径 → 失效次数（转换期间文章又被修改时，不缓存转换结果）
+        self._invalidations: Dict[str, int] = {}
+
+    def start(self) -> None:
+        """工作区模式的转换在请求线程中按需进行，没有后台线程"""
+
+    def url_for(self, markdown_file: Path) -> str:
+        """文章的预览URL路径"""
+        return '/' + markdown_file.relative_to(self.directory).with_suffix('.html').as_posix()
+
+    def _source_for(self, path: str) -> Optional[Path]:
+        """URL路径对应的Markdown文件（不在工作区内或不存在时返回 None）"""
+        if not path.endswith('.html'):
+            return None
+        relative = path.lstrip('/')
+        if any(fnmatch.fnmatch(part, pattern) for part in relative.split('/') for pattern in WORKSPACE_EXCLUDE):
+            return None
+        stem = (self.directory / relative).with_suffix('')
+        for suffix in MARKDOWN_SUFFIXES:
+            candidate = stem.with_suffix(suffix).resolve()
+            if candidate.is_file() and self.directory.resolve() in candidate.parents:
+                return candidate
+        return None
+
+    def page_for(self, path: str) -> Optional[PreviewPage]:
+        """URL路径对应的预览页面：/ 为索引页，文章页优先从缓存返回"""
+        if path == '/':
+            return PreviewPage(self._render_index(), live_reload=self.hub is not None)
+
+        with self._cache_lock:
+            page = self._cache.get(path)
+            if page is not None:
+                self._cache.move_to_end(path)
+                return page
+
+        source = self._source_for(path)
+        if source is None:
+            return None
+
+        with self._render_lock:
+            # 等待期间其他请求可能已转换完成
+            with self._cache_lock:
+                page = self._cache.get(path)
+                invalidations = self._invalidations.get(path, 0)
+            if page is not None:
+                return page
+            start = time.perf_counter()
+            html_content = self.renderer.render(read_markdown(str(source)))
+            elapsed_ms = (time.perf_counter() - start) * 1000
+        page = PreviewPage(html_content, live_reload=self.hub is not None)
+
+        with self._cache_lock:
+            if self._invalidations.get(path, 0) == invalidations:
+                self._cache[path] = page
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        timestamp = time.strftime('%H:%M:%S')
+        print(f'[{timestamp}] ✅ 已渲染: {path.lstrip("/")} '
+              f'（重新渲染 {self.renderer.rendered}/{self.renderer.total} 块，{elapsed_ms:.0f}ms）')
+        return page
+
+    def _render_index(self) -> str:
+        """文章索引页"""
+        items = []
+        for markdown_file in iter_markdown_files(str(self.directory), recursive=True, exclude=WORKSPACE_EXCLUDE):
+            url = self.url_for(markdown_file)
+            modified = time.strftime('%Y-%m-%d %H:%M', time.localtime(markdown_file.stat().st_mtime))
+            cached = ' ⚡' if url in self._cache else ''
+            items.append(f'<li><a href="{html_lib.escape(url)}">{html_lib.escape(url[1:-5])}</a> '
+                         f'<small>{modified}{cached}</small></li>')
+
+        return f'''<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <title>预览工作区 - {html_lib.escape(self.directory.name)}</title>
+    <style>
+        body {{ font-family: -apple-system, "PingFang SC", "Microsoft YaHei", sans-serif; max-width: 720px; margin: 0 auto; padding: 20px; }}
+        li {{ line-height: 2; }}
+        small {{ color: #999; margin-left: 8px; }}
+    </style>
+</head>
+<body>
+    <h1>📁 {html_lib.escape(str(self.directory))}</h1>
+    <p>{len(items)} 篇文章 · 主题 {self.theme}</p>
+    <ul>
+{chr(10).join(items)}
+    </ul>
+</body>
+</html>'''
+
+    def _invalidate(self, src_path: str) -> None:
+        """文章修改、新建或删除：使其缓存失效，合并窗口结束后推送更新"""
+        source = Path(src_path)
+        if source.suffix.lower() not in MARKDOWN_SUFFIXES:
+            return
+        try:
+            url = self.url_for(source)
+        except ValueError:
+            return
+
+        with self._cache_lock:
+            self._cache.pop(url, None)
+            self._invalidations[url] = self._invalidations.get(url, 0) + 1
+            timer = self._timers.pop(url, None)
+            if timer is not None:
+                timer.cancel()
+            if self.hub is not None:
+                timer = threading.Timer(self.debounce, self._publish, args=(url,))
+                timer.daemon = True
+                self._timers[url] = timer
+                timer.start()
+
+    def _publish(self, url: str) -> None:
+        with self._cache_lock:
+            self._timers.pop(url, None)
+        self.hub.publish(url)
+        # 索引页的修改时间和文章列表也随之变化
+        self.hub.publish('/')
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._invalidate(event.src_path)
+
+    def on_created(self, event):
+        self.on_modified(event)
+
+    def on_deleted(self, event):
+        self.on_modified(event)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self._invalidate(event.src_path)
+            self._invalidate(event.dest_path)
 
 
 class QuietHTTPRequestHandler(SimpleHTTPRequestHandler):
-    """静默的HTTP请求处理器（不打印访问日志）"""
+    """
+    预览请求处理器（不打印访问日志）
+
+    - 预览页面（preview.page_for 返回的页面）：从内存返回，支持 If-None-Match（304）和gzip
+    - LIVE_RELOAD_PATH?page=<页面路径>：SSE推送（启用推送时）
+    - 其他路径：文章所在目录中的静态资源（本地图片等，见 is_static_asset），通过 directory 参数定位，
+      不改变进程工作目录；其他文件和目录列表返回404
+
+    preview 为 MarkdownChangeHandler（单篇文章）或 WorkspaceHandler（整个目录）
+    """
+
+    def __init__(self, *args, preview, hub: Optional[LiveReloadHub] = None, **kwargs):
+        self.preview = preview
+        self.hub = hub
+        super().__init__(*args, directory=str(preview.directory), **kwargs)
+
+    def do_GET(self):
+        path, _, query = self.path.partition('?')
+        path = unquote(path)
+        if self.hub is not None and path == LIVE_RELOAD_PATH:
+            page = parse_qs(query).get('page', ['/'])[0]
+            self._serve_events(unquote(page))
+            return
+
+        try:
+            page = self.preview.page_for(path)
+        except Exception as e:
+            self.send_error(500, f'Conversion failed: {e}')
+            return
+        if page is not None:
+            self._serve_page(page)
+        else:
+            super().do_GET()
+
+    def send_head(self):
+        """静态文件（GET和HEAD）：只提供静态资源，其他路径返回404"""
+        exclude = WORKSPACE_EXCLUDE if isinstance(self.preview, WorkspaceHandler) else ()
+        if not is_static_asset(self.path, exclude):
+            self.send_error(404, 'File not found')
+            return None
+        return super().send_head()
+
+    def _serve_page(self, page: PreviewPage):
+        """返回内存中的预览页面"""
+
+        use_gzip = page.gzip_body is not None and 'gzip' in self.headers.get('Accept-Encoding', '')
+        etag = page.gzip_etag if use_gzip else page.etag
+        if etag in {tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')}:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        body = page.gzip_body if use_gzip else page.body
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        if use_gzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _serve_events(self, page: str):
+        """SSE长连接：page 页面更新时推送 reload 事件，空闲时发送心跳"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+        version = self.hub.version(page)
+        try:
+            while True:
+                current = self.hub.wait(page, version, HEARTBEAT_SECONDS)
+                if current != version:
+                    version = current
+                    self.wfile.write(f'event: reload\ndata: {version}\n\n'.encode('utf-8'))
+                else:
+                    self.wfile.write(b': heartbeat\n\n')
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # 浏览器关闭了页面
+            pass
 
     def log_message(self, format, *args):
         """覆盖日志方法，静默处理"""
         pass
 
 
-def start_http_server(directory: Path, port: int = 8000):
-    """启动HTTP服务器"""
-    os.chdir(directory)
-    server = HTTPServer(('localhost', port), QuietHTTPRequestHandler)
-    print(f'🌐 本地服务器已启动: http://localhost:{port}')
-    server.serve_forever()
+def create_http_server(preview, port: int = 8000,
+                       hub: Optional[LiveReloadHub] = None) -> ThreadingHTTPServer:
+    """创建HTTP服务器（多线程：SSE长连接和多个页面、设备的请求互不阻塞）"""
+    server = ThreadingHTTPServer(('localhost', port), partial(QuietHTTPRequestHandler, preview=preview, hub=hub))
+    server.daemon_threads = True
+    return server
 
 
 def main():
@@ -87,31 +580,50 @@ def main():
   # 指定主题
   python preview_generator.py --input article.md --theme minimal
 
-  # 指定输出目录和端口
-  python preview_generator.py --input article.md --output preview/ --port 8080
+  # 主题对比：所有主题并排显示，保存后同时刷新
+  python preview_generator.py --input article.md --compare
+
+  # 只对比指定主题
+  python preview_generator.py --input article.md --compare tech minimal
+
+  # 工作区模式：预览整个目录的草稿（打开索引页，点击文章时才转换）
+  python preview_generator.py --input drafts/
+
+  # 指定端口，并把预览HTML另存到目录
+  python preview_generator.py --input article.md --port 8080 --output preview/
 
 工作原理:
-  1. 首次运行时转换Markdown为HTML
+  1. 首次运行时转换Markdown为HTML，保存在内存中由本地服务器直接返回
+     （文章中的本地图片按相对路径从文章所在目录读取）
   2. 在浏览器中打开预览
   3. 启动文件监听，当Markdown文件修改时自动重新转换
-  4. 刷新浏览器即可看到最新效果
+     （按标题切分的块缓存渲染结果，只重新渲染改动过的块；修改主题CSS后整篇重新渲染）
+  4. 转换完成后推送到已打开的预览页面，页面只替换正文，无需手动刷新
 
 使用技巧:
-  - 使用支持自动刷新的浏览器扩展（如Live Server）
-  - 或手动刷新浏览器查看最新效果
+  - 编辑器连续保存多次只转换一次（--debounce 调整合并窗口）
+  - 使用 --no-live-reload 关闭推送，手动刷新浏览器
   - 按Ctrl+C停止预览服务
         '''
     )
 
-    parser.add_argument('-i', '--input', required=True, help='输入的Markdown文件路径')
-    parser.add_argument('-o', '--output', help='输出目录（默认：./preview/）')
+    parser.add_argument('-i', '--input', required=True, help='输入的Markdown文件路径，或草稿目录（工作区模式）')
+    parser.add_argument('-o', '--output', help='另把预览HTML写入此目录（默认：只在内存中；仅单篇模式）')
     parser.add_argument('-t', '--theme', default='tech',
-                        choices=['tech', 'minimal', 'business'],
+                        choices=list(available_themes()),
                         help='选择主题样式（默认：tech）')
     parser.add_argument('-p', '--port', type=int, default=8000,
                         help='HTTP服务器端口（默认：8000）')
     parser.add_argument('--no-browser', action='store_true',
                         help='不自动打开浏览器')
+    parser.add_argument('--no-live-reload', action='store_true',
+                        help='不向浏览器推送更新（需手动刷新）')
+    parser.add_argument('--debounce', type=int, default=int(DEBOUNCE_SECONDS * 1000), metavar='MS',
+                        help=f'保存事件合并窗口，毫秒（默认：{int(DEBOUNCE_SECONDS * 1000)}）')
+    parser.add_argument('--compare', nargs='*', metavar='THEME', choices=list(available_themes()),
+                        help='并排对比多个主题（不指定时对比全部主题；仅单篇模式）')
+    parser.add_argument('--cache-size', type=int, default=WORKSPACE_CACHE_SIZE, metavar='N',
+                        help=f'工作区模式最多缓存的已渲染文章数（默认：{WORKSPACE_CACHE_SIZE}）')
 
     args = parser.parse_args()
 
@@ -121,48 +633,70 @@ def main():
         if not input_path.exists():
             raise FileNotFoundError(f'输入文件不存在: {args.input}')
 
-        output_dir = Path(args.output) if args.output else Path('./preview')
-        output_dir.mkdir(parents=True, exist_ok=True)
-
-        output_file = output_dir / f'{input_path.stem}.html'
+        workspace = input_path.is_dir()
+        if workspace and args.compare is not None:
+            parser.error('--compare 只能用于单篇文章')
+        compare = (args.compare or list(available_themes())) if args.compare is not None else None
+        output_file = Path(args.output) / f'{input_path.stem}.html' if args.output and not workspace else None
 
         print('🚀 启动实时预览服务...')
-        print(f'📄 监听文件: {input_path}')
-        print(f'📁 输出目录: {output_dir}')
-        print(f'🎨 使用主题: {args.theme}')
+        if workspace:
+            print(f'📁 工作区: {input_path}（最多缓存 {args.cache_size} 篇）')
+        else:
+            print(f'📄 监听文件: {input_path}')
+        if output_file:
+            print(f'📁 输出目录: {args.output}')
+        print(f'🎨 使用主题: {", ".join(compare) if compare else args.theme}')
         print()
 
-        # 创建文件监听处理器
-        event_handler = MarkdownChangeHandler(
-            input_file=str(input_path),
-            output_file=str(output_file),
-            theme=args.theme
-        )
+        # 预览更新推送（--no-live-reload 时不注入脚本，也不提供推送）
+        hub = None if args.no_live_reload else LiveReloadHub()
+
+        # 创建文件监听处理器（单篇模式转换在后台线程进行，工作区模式在请求时按需转换）
+        if workspace:
+            event_handler = WorkspaceHandler(
+                directory=str(input_path),
+                theme=args.theme,
+                hub=hub,
+                cache_size=args.cache_size,
+                debounce=args.debounce / 1000
+            )
+        else:
+            event_handler = MarkdownChangeHandler(
+                input_file=str(input_path),
+                output_file=str(output_file) if output_file else None,
+                theme=args.theme,
+                auto_refresh=not args.no_live_reload,
+                hub=hub,
+                debounce=args.debounce / 1000,
+                themes=compare
+            )
+        event_handler.start()
 
         # 启动HTTP服务器（在后台线程）
-        server_thread = threading.Thread(
-            target=start_http_server,
-            args=(output_dir, args.port),
-            daemon=True
-        )
+        server = create_http_server(event_handler, args.port, hub)
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
         server_thread.start()
+        print(f'🌐 本地服务器已启动: http://localhost:{args.port}')
 
         # 在浏览器中打开预览
         if not args.no_browser:
-            time.sleep(0.5)  # 等待服务器启动
-            preview_url = f'http://localhost:{args.port}/{output_file.name}'
+            preview_url = f'http://localhost:{args.port}/' + ('' if workspace else f'{input_path.stem}.html')
             webbrowser.open(preview_url)
             print(f'🌐 已在浏览器中打开预览: {preview_url}')
 
         print()
         print('👀 正在监听文件变化...')
-        print('💡 提示：修改Markdown文件后，刷新浏览器即可看到最新效果')
+        if args.no_live_reload:
+            print('💡 提示：修改Markdown文件后，刷新浏览器即可看到最新效果')
+        else:
+            print('💡 提示：修改Markdown文件后，预览页面会自动更新')
         print('⏹️  按Ctrl+C停止服务')
         print()
 
         # 启动文件监听
         observer = Observer()
-        observer.schedule(event_handler, path=str(input_path.parent), recursive=False)
+        observer.schedule(event_handler, path=str(event_handler.directory), recursive=workspace)
         observer.start()
 
         try:
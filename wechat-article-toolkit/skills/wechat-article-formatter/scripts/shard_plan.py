@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shard Planning for Batch Conversion
+多机分片批量转换：分片分配、分片结果清单与合并
+
+所有分片各自遍历完整的输入目录，用同样的规则决定每个文件归哪个分片，无需协调：
+  - 有历史耗时的文件：按耗时从大到小依次分给当前总耗时最小的分片（LPT贪心），
+    避免大教程集中到同一分片拖慢整体
+  - 没有历史耗时的文件（新文章）：按相对路径的哈希取模
+
+历史耗时来自上一次的合并结果（或任一分片结果清单），用 --balance-from 指定；
+各分片必须使用同一份历史文件，分配结果才一致。
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+# 分片结果清单格式版本
+SHARD_MANIFEST_VERSION = 1
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """
+    解析分片参数 "i/N"（i 从1开始）
+
+    Raises:
+        ValueError: 格式错误或 i 不在 1..N 范围内
+    """
+    try:
+        index, count = (int(part) for part in spec.split('/'))
+    except ValueError:
+        raise ValueError(f'分片参数格式应为 i/N（如 1/4）: {spec}')
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f'分片序号超出范围: {spec}（应为 1..N）')
+    return index, count
+
+
+def _hash_shard(key: str, count: int) -> int:
+    """按相对路径哈希分配分片（不使用内置hash，其值每个进程随机）"""
+    digest = hashlib.sha1(key.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % count + 1
+
+
+def load_timings(path: str) -> Dict[str, float]:
+    """从合并结果或分片结果清单中读取 文件 → 转换耗时（秒）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    return {
+        key: record['elapsed']
+        for key, record in manifest.get('files', {}).items()
+        if record.get('elapsed')
+    }
+
+
+class ShardPlan:
+    """分片分配方案"""
+
+    def __init__(self, index: int, count: int, timings: Optional[Dict[str, float]] = None):
+        self.index = index
+        self.count = count
+        self.timings = timings or {}
+        self.assignment = self._balance(self.timings)
+
+    def _balance(self, timings: Dict[str, float]) -> Dict[str, int]:
+        """LPT贪心：耗时从大到小依次分给当前负载最小的分片；耗时相同按路径排序，保证各分片结果一致"""
+        loads = [0.0] * self.count
+        assignment = {}
+        for key, elapsed in sorted(timings.items(), key=lambda item: (-item[1], item[0])):
+            shard = min(range(self.count), key=lambda i: (loads[i], i))
+            loads[shard] += elapsed
+            assignment[key] = shard + 1
+        return assignment
+
+    def shard_of(self, key: str) -> int:
+        """文件（相对输入目录的路径）所属分片，从1开始"""
+        shard = self.assignment.get(key)
+        return shard if shard is not None else _hash_shard(key, self.count)
+
+    def owns(self, key: str) -> bool:
+        """文件是否属于本分片"""
+        return self.shard_of(key) == self.index
+
+    def expected_load(self) -> float:
+        """按历史耗时估算的本分片总耗时（秒，不含新文章）"""
+        return sum(self.timings[key] for key, shard in self.assignment.items() if shard == self.index)
+
+
+def write_shard_manifest(path: Path, index: int, count: int, theme: str,
+                         files: Dict[str, Dict[str, Any]], wall_time: float) -> None:
+    """写入分片结果清单（先写临时文件再原子替换）"""
+    manifest = {
+        'version': SHARD_MANIFEST_VERSION,
+        'shard': index,
+        'shard_count': count,
+        'theme': theme,
+        'wall_time': round(wall_time, 3),
+        'files': dict(sorted(files.items())),
+    }
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def merge_shard_manifests(paths: List[str]) -> Dict[str, Any]:
+    """
+    合并各分片结果清单
+
+    Returns:
+        与分片结果清单同结构的合并结果（可直接作为下次的 --balance-from），另含：
+        shards（各分片统计）、missing_shards（缺失的分片序号）、duplicates（被多个分片转换的文件）
+
+    Raises:
+        ValueError: 分片数或主题不一致
+    """
+    manifests = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifests.append(json.load(f))
+    if not manifests:
+        raise ValueError('没有可合并的分片结果清单')
+
+    counts = {m['shard_count'] for m in manifests}
+    themes = {m['theme'] for m in manifests}
+    if len(counts) != 1:
+        raise ValueError(f'分片数不一致: {sorted(counts)}')
+    if len(themes) != 1:
+        raise ValueError(f'主题不一致: {sorted(themes)}')
+    count = counts.pop()
+
+    files: Dict[str, Dict[str, Any]] = {}
+    duplicates = []
+    shards = []
+    for manifest in sorted(manifests, key=lambda m: m['shard']):
+        for key, record in manifest['files'].items():
+            if key in files:
+                duplicates.append(key)
+            files[key] = {**record, 'shard': manifest['shard']}
+
+        records = manifest['files'].values()
+        shards.append({
+            'shard': manifest['shard'],
+            'files': len(manifest['files']),
+            'converted': sum(1 for r in records if r['status'] == 'success'),
+            'skipped': sum(1 for r in records if r['status'] == 'skipped'),
+            'failed': sum(1 for r in records if r['status'] == 'failed'),
+            'busy_time': round(sum(r.get('elapsed') or 0 for r in records if r['status'] == 'success'), 3),
+            'wall_time': manifest['wall_time'],
+        })
+
+    present = {s['shard'] for s in shards}
+    return {
+        'version': SHARD_MANIFEST_VERSION,
+        'shard_count': count,
+        'theme': themes.pop(),
+        'wall_time': max(s['wall_time'] for s in shards),
+        'shards': shards,
+        'missing_shards': [i for i in range(1, count + 1) if i not in present],
+        'duplicates': sorted(set(duplicates)),
+        'files': dict(sorted(files.items())),
+    }
+
+
+def print_merge_summary(merged: Dict[str, Any], slowest: int = 5) -> None:
+    """打印合并摘要：各分片统计、失败文件、最慢文件、分片均衡度"""
+    files = merged['files']
+    print('📊 分片合并摘要')
+    print('─' * 60)
+    print(f'分片数: {merged["shard_count"]}  主题: {merged["theme"]}')
+    for shard in merged['shards']:
+        print(f'  [{shard["shard"]}/{merged["shard_count"]}] {shard["files"]} 个文件  '
+              f'转换 {shard["converted"]}  跳过 {shard["skipped"]}  失败 {shard["failed"]}  '
+              f'转换耗时 {shard["busy_time"]:.2f}s  总耗时 {shard["wall_time"]:.2f}s')
+
+    if merged['missing_shards']:
+        print(f'⚠️  缺少分片: {", ".join(map(str, merged["missing_shards"]))}')
+    if merged['duplicates']:
+        print(f'⚠️  {len(merged["duplicates"])} 个文件被多个分片转换（各分片的 --balance-from 不一致？）')
+
+    wall_times = [s['wall_time'] for s in merged['shards']]
+    if len(wall_times) > 1 and sum(wall_times) > 0:
+        mean = sum(wall_times) / len(wall_times)
+        print(f'⚖️  均衡度: 最慢分片 / 平均 = {max(wall_times) / mean:.2f}')
+
+    failed = [(key, r) for key, r in files.items() if r['status'] == 'failed']
+    if failed:
+        print()
+        print('失败文件列表:')
+        for key, record in failed:
+            print(f'  • [{record["shard"]}] {key}: {record.get("error")}')
+
+    timed = sorted(((r['elapsed'], key) for key, r in files.items()
+                    if r['status'] == 'success' and r.get('elapsed')), reverse=True)
+    if timed:
+        print()
+        print('最慢的文件:')
+        for elapsed, key in timed[:slowest]:
+            print(f'  • {key}: {elapsed:.2f}s')
+
+    print('─' * 60)
+    converted = sum(1 for r in files.values() if r['status'] == 'success')
+    skipped = sum(1 for r in files.values() if r['status'] == 'skipped')
+    print(f'总文件数: {len(files)}  ✅ 转换: {converted}  ⏭️  跳过: {skipped}  ❌ 失败: {len(failed)}')
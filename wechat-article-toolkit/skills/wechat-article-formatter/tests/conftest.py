@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+"""测试公共配置：脚本之间按同目录模块导入，测试时把 scripts/ 加入导入路径"""
+
+import sys
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / 'scripts'
+
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""分块转换和增量渲染共用的测试语料：仓库中的Markdown文件，以及引用式链接定义、围栏代码块的边界情况"""
+
+from pathlib import Path
+from typing import List
+
+REPO_ROOT = Path(__file__).resolve().parents[4]
+
+
+def repo_markdown_files() -> List[Path]:
+    """仓库中的所有Markdown文件（跳过隐藏目录）"""
+    return sorted(path for path in REPO_ROOT.rglob('*.md')
+                  if not any(part.startswith('.') for part in path.relative_to(REPO_ROOT).parts))
+
+
+# 在一节中定义、在另一节中使用的引用式链接
+REFERENCE_CASES = {
+    'top-level': '## A\n\n[x]: http://example.com/top\n\n## B\n\nsee [link][x]\n',
+    'top-level-indented': '## A\n\n- item\n\n  [x]: http://example.com/indent\n\n## B\n\nsee [link][x]\n',
+    'blockquote': '## A\n\n> quote\n> [x]: http://example.com/quote\n\n## B\n\nsee [link][x]\n',
+    'blockquote-only': '## A\n\n> [x]: http://example.com/quote\n\n## B\n\nsee [link][x]\n',
+    'list-item': '## A\n\n- [x]: http://example.com/item\n\n## B\n\nsee [link][x]\n',
+    'list-continuation': '## A\n\n- item\n\n    [x]: http://example.com/cont\n\n## B\n\nsee [link][x]\n',
+    'ordered-list': '## A\n\n1. item\n\n    [x]: http://example.com/ol\n\n## B\n\nsee [link][x]\n',
+    'title-next-line': '## A\n\n[x]: http://example.com/title\n    "Title"\n\n## B\n\nsee [link][x]\n',
+    'url-next-line': '## A\n\n[x]:\n  http://example.com/url\n\n## B\n\nsee [link][x]\n',
+}
+
+# 围栏代码块的识别必须与 fenced_code 扩展一致（信息串不合语法的 ``` 行不开启代码块）
+FENCE_CASES = {
+    'fence-info-string': '## A\n\n```js title=app.js\nx\n```\n\n## H\n\n```\ncode\n```\n\ntext\n',
+    'fence-attrs': ('## A\n\n``` { .python #id }\nx\n```\n\n## H\n\n```python hl_lines="1"\ncode\n```\n\n'
+                    'text\n'),
+    'fence-bad-attrs': '## A\n\n```{ .python\nx\n```\n\n## H\n\ntext\n',
+    'fence-unclosed': '## A\n\n```python\nx\n\n## H\n\ntext\n',
+    'fence-longer-close': '## A\n\n```\nx\n````\n\n## H\n\ntext\n```\n',
+    'fence-tab': '## A\n\n```\tpython\nx\n```\n\n## H\n\ntext\n',
+}
+
+# 所有边界情况
+EDGE_CASES = {**REFERENCE_CASES, **FENCE_CASES}
+
+# 必须整篇转换的情况（分块无法复制这些定义，或围栏状行不构成代码块）
+UNSPLITTABLE_CASES = {'blockquote', 'blockquote-only', 'list-item', 'list-continuation', 'ordered-list',
+                      'title-next-line', 'url-next-line',
+                      'fence-info-string', 'fence-bad-attrs', 'fence-unclosed'}
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""分块并行转换的输出必须与 WeChatHTMLConverter.convert() 逐字节一致"""
+
+import pytest
+
+from chunked_convert import ChunkedConverter, split_sections
+from markdown_to_html import available_themes
+from corpus import repo_markdown_files, REFERENCE_CASES, FENCE_CASES, EDGE_CASES, UNSPLITTABLE_CASES
+
+THEMES = sorted(available_themes())
+
+
+@pytest.fixture(scope='module', params=THEMES)
+def chunked(request):
+    # min_chars=0：语料中的短文也强制分块
+    with ChunkedConverter(theme=request.param, workers=2, min_chars=0) as converter:
+        yield converter
+
+
+def test_repo_corpus_matches_serial(chunked):
+    split = 0
+    for path in repo_markdown_files():
+        markdown_text = path.read_text(encoding='utf-8')
+        split += chunked.split(markdown_text) is not None
+        assert chunked.convert(markdown_text) == chunked.converter.convert(markdown_text), path
+    # 确认大部分文件确实走了分块路径
+    assert split >= len(repo_markdown_files()) // 2
+
+
+@pytest.mark.parametrize('name', sorted(EDGE_CASES))
+def test_edge_cases_match_serial(chunked, name):
+    markdown_text = EDGE_CASES[name]
+    assert chunked.convert(markdown_text) == chunked.converter.convert(markdown_text)
+
+
+@pytest.mark.parametrize('name', sorted(REFERENCE_CASES))
+def test_contained_reference_definitions_are_not_split(name):
+    sections = split_sections(REFERENCE_CASES[name])
+    if name in UNSPLITTABLE_CASES:
+        assert sections is None
+    else:
+        assert sections is not None and len(sections) == 2
+
+
+@pytest.mark.parametrize('name', sorted(FENCE_CASES))
+def test_fence_like_lines_outside_code_blocks_are_not_split(name):
+    sections = split_sections(FENCE_CASES[name])
+    if name in UNSPLITTABLE_CASES:
+        assert sections is None
+    else:
+        assert sections is not None
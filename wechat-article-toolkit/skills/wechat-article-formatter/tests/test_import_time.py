@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+导入耗时预算（见 references/conversion-guide.md "启动耗时"）
+
+import markdown_to_html 只加载标准库；第三方依赖在首次使用时才导入
+"""
+
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / 'scripts'
+
+# import markdown_to_html 的累计耗时上限（微秒）；实测约15ms，留出慢机器的余量
+IMPORT_BUDGET_US = 100_000
+
+THIRD_PARTY_MODULES = ('markdown', 'bs4', 'pygments', 'cssutils')
+
+
+def _run(code: str, *args: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *args, '-c', code], cwd=SCRIPTS_DIR,
+                          capture_output=True, text=True, check=True)
+
+
+def _imported_modules(importtime_log: str) -> dict:
+    """解析 -X importtime 输出：模块名 → 累计耗时（微秒）"""
+    modules = {}
+    for match in re.finditer(r'^import time:\s+\d+ \|\s+(\d+) \|\s+(\S+)$', importtime_log, re.M):
+        modules[match.group(2)] = int(match.group(1))
+    return modules
+
+
+def test_import_loads_only_stdlib():
+    modules = _imported_modules(_run('import markdown_to_html', '-X', 'importtime').stderr)
+    loaded = [name for name in modules if name.split('.')[0] in THIRD_PARTY_MODULES]
+    assert not loaded, f'import markdown_to_html 导入了第三方依赖: {loaded}'
+
+
+def test_import_time_within_budget():
+    # 取多次中的最小值，排除磁盘缓存和调度抖动
+    cumulative = min(_imported_modules(_run('import markdown_to_html', '-X', 'importtime').stderr)
+                     ['markdown_to_html'] for _ in range(3))
+    assert cumulative <= IMPORT_BUDGET_US, f'import markdown_to_html 耗时 {cumulative}us，超出预算 {IMPORT_BUDGET_US}us'
+
+
+def test_cli_without_code_blocks_skips_highlighter(tmp_path):
+    # markdown 的 fenced_code 扩展本身会导入 pygments 包，这里检查的是高亮器和高亮缓存
+    article = tmp_path / 'a.md'
+    article.write_text('# 标题\n\n正文 **加粗**\n', encoding='utf-8')
+    code = (
+        'import sys, markdown_to_html\n'
+        f'sys.argv = ["markdown_to_html.py", "-i", {str(article)!r}, "--no-daemon"]\n'
+        'markdown_to_html.main()\n'
+        'print("HIGHLIGHTER", "code_highlighter" in sys.modules)\n'
+    )
+    assert 'HIGHLIGHTER False' in _run(code).stdout
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""增量渲染的输出必须与 WeChatHTMLConverter.convert() 逐字节一致（包括缓存跨多次渲染复用时）"""
+
+import pytest
+
+from incremental_render import IncrementalRenderer
+from markdown_to_html import WeChatHTMLConverter, available_themes
+from corpus import repo_markdown_files, REFERENCE_CASES, EDGE_CASES, UNSPLITTABLE_CASES
+
+THEMES = sorted(available_themes())
+
+
+@pytest.fixture(scope='module')
+def converters():
+    return {theme: WeChatHTMLConverter(theme=theme) for theme in THEMES}
+
+
+@pytest.mark.parametrize('theme', THEMES)
+def test_repo_corpus_matches_full_render(converters, theme):
+    # 同一个渲染器依次渲染所有文件，上一篇的缓存不能影响下一篇
+    renderer = IncrementalRenderer(theme)
+    for path in repo_markdown_files():
+        markdown_text = path.read_text(encoding='utf-8')
+        assert renderer.render(markdown_text) == converters[theme].convert(markdown_text), path
+
+
+def test_repo_corpus_matches_full_render_all_themes(converters):
+    renderer = IncrementalRenderer(themes=THEMES)
+    for path in repo_markdown_files():
+        markdown_text = path.read_text(encoding='utf-8')
+        results = renderer.render_themes(markdown_text)
+        for theme in THEMES:
+            assert results[theme] == converters[theme].convert(markdown_text), (path, theme)
+
+
+@pytest.mark.parametrize('name', sorted(EDGE_CASES))
+def test_edge_cases_match_full_render(converters, name):
+    markdown_text = EDGE_CASES[name]
+    for theme in THEMES:
+        assert IncrementalRenderer(theme).render(markdown_text) == converters[theme].convert(markdown_text)
+    results = IncrementalRenderer(themes=THEMES).render_themes(markdown_text)
+    for theme in THEMES:
+        assert results[theme] == converters[theme].convert(markdown_text)
+
+
+def test_edits_switching_between_split_and_full_render(converters):
+    # 模拟编辑过程：在可切分与必须整篇渲染之间来回切换
+    renderer = IncrementalRenderer('tech')
+    sequence = ['top-level', 'blockquote', 'top-level', 'list-continuation', 'top-level-indented',
+                'fence-info-string', 'fence-attrs', 'fence-unclosed', 'top-level']
+    for name in sequence:
+        markdown_text = EDGE_CASES[name]
+        assert renderer.render(markdown_text) == converters['tech'].convert(markdown_text), name
+        if name in UNSPLITTABLE_CASES:
+            assert renderer.rendered == renderer.total == 1
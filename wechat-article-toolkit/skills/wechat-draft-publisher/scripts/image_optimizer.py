@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+上传前的图片优化
+缩放到最大显示宽度并重新压缩，在质量不低于阈值的前提下尽量压到目标大小以内
+
+  - JPEG：按质量二分查找，取不超过目标大小的最高质量
+  - PNG：先无损优化；仍超出目标时转为256色调色板（截图效果几乎不变），
+         不透明的图片再不行就转为JPEG
+  - WebP（正文图片接口不接受）：有透明通道转PNG，否则转JPEG
+  - 最低质量仍超出目标时继续缩小尺寸；优化后不比原图小时直接使用原图
+  - GIF 等其他格式不处理
+
+优化结果按 原图内容哈希 + 优化参数 缓存在 ~/.wechat-publisher/optimized/，同一张图片只优化一次
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+# 优化算法版本（修改算法后递增，使旧的缓存结果失效）
+OPTIMIZER_VERSION = 1
+
+OPTIMIZE_CACHE_DIR = os.path.expanduser("~/.wechat-publisher/optimized")
+
+# 默认最大宽度（公众号正文显示宽度约677px，按2倍屏取1080）
+DEFAULT_MAX_WIDTH = 1080
+
+# 默认目标大小与最低JPEG质量
+DEFAULT_TARGET_BYTES = 500 * 1024
+DEFAULT_MIN_QUALITY = 60
+MAX_QUALITY = 90
+
+# 最低质量仍超出目标时每次缩小的比例与最多次数
+DOWNSCALE_FACTOR = 0.8
+MAX_DOWNSCALES = 3
+
+OPTIMIZABLE_FORMATS = ('JPEG', 'PNG', 'WEBP')
+
+
+def _encode(image: 'Image.Image', fmt: str, quality: Optional[int] = None) -> bytes:
+    buffer = io.BytesIO()
+    if fmt == 'JPEG':
+        image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    else:
+        image.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def _encode_jpeg_within(image: 'Image.Image', target_bytes: int, min_quality: int) -> bytes:
+    """二分查找不超过目标大小的最高JPEG质量；最低质量也超出时返回最低质量的结果"""
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    best = _encode(image, 'JPEG', min_quality)
+    if len(best) > target_bytes:
+        return best
+    low, high = min_quality + 1, MAX_QUALITY
+    while low <= high:
+        quality = (low + high) // 2
+        data = _encode(image, 'JPEG', quality)
+        if len(data) <= target_bytes:
+            best, low = data, quality + 1
+        else:
+            high = quality - 1
+    return best
+
+
+def _has_alpha(image: 'Image.Image') -> bool:
+    """是否有实际用到的透明像素"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        alpha = image.convert('RGBA').getchannel('A')
+        return alpha.getextrema()[0] < 255
+    return False
+
+
+def _compress(image: 'Image.Image', source_format: str, target_bytes: int, min_quality: int):
+    """按格式压缩一次，返回 (内容, 输出格式)"""
+    if source_format == 'JPEG':
+        return _encode_jpeg_within(image, target_bytes, min_quality), 'JPEG'
+
+    alpha = _has_alpha(image)
+    if source_format == 'WEBP' and not alpha:
+        return _encode_jpeg_within(image, target_bytes, min_quality), 'JPEG'
+
+    data = _encode(image, 'PNG')
+    if len(data) <= target_bytes:
+        return data, 'PNG'
+    palette = image.convert('RGBA' if alpha else 'RGB').quantize(
+        colors=256, method=Image.Quantize.FASTOCTREE if alpha else Image.Quantize.MEDIANCUT)
+    quantized = _encode(palette, 'PNG')
+    if len(quantized) <= target_bytes or alpha:
+        return min((data, quantized), key=len), 'PNG'
+    return _encode_jpeg_within(image, target_bytes, min_quality), 'JPEG'
+
+
+def optimize_image(image_path: str, max_width: int = DEFAULT_MAX_WIDTH, target_bytes: int = DEFAULT_TARGET_BYTES,
+                   min_quality: int = DEFAULT_MIN_QUALITY, cache_dir: str = OPTIMIZE_CACHE_DIR) -> Dict[str, Any]:
+    """
+    优化一张图片（可在工作进程中调用）
+
+    优化是可选的：任何失败都不抛出异常，记录在 'error' 中并返回原图；缓存目录不可写时
+    优化结果写入临时目录，不缓存
+
+    Returns:
+        {'source', 'output'（待上传的文件，未优化时即原图）, 'original_bytes', 'optimized_bytes',
+         'cached', 'error'}
+    """
+    result = {'source': image_path, 'output': image_path, 'original_bytes': 0,
+              'optimized_bytes': 0, 'cached': False, 'error': None}
+    try:
+        with open(image_path, 'rb') as f:
+            original = f.read()
+    except OSError as e:
+        result['error'] = str(e)
+        return result
+    result.update(original_bytes=len(original), optimized_bytes=len(original))
+
+    params = f'{OPTIMIZER_VERSION}:{max_width}:{target_bytes}:{min_quality}'
+    key = hashlib.sha256(original + params.encode('utf-8')).hexdigest()
+    for suffix in ('.jpg', '.png', '.orig'):
+        cached = Path(cache_dir) / f'{key}{suffix}'
+        if cached.exists():
+            if suffix != '.orig':
+                result.update(output=str(cached), optimized_bytes=cached.stat().st_size)
+            result['cached'] = True
+            return result
+
+    try:
+        image = Image.open(io.BytesIO(original))
+        source_format = image.format
+        if source_format not in OPTIMIZABLE_FORMATS:
+            return result
+        image = ImageOps.exif_transpose(image)
+
+        width = min(image.width, max_width)
+        for _ in range(MAX_DOWNSCALES + 1):
+            resized = image if width == image.width else image.resize(
+                (width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+            data, fmt = _compress(resized, source_format, target_bytes, min_quality)
+            if len(data) <= target_bytes:
+                break
+            width = int(width * DOWNSCALE_FACTOR)
+    except Exception as e:
+        result['error'] = str(e)
+        return result
+
+    # 原图已经是可直接上传的格式且不比优化结果大时（如缩放后抗锯齿反而变大的截图），记录"使用原图"
+    keep_original = len(data) >= len(original) and source_format in ('JPEG', 'PNG')
+    suffix = '.jpg' if fmt == 'JPEG' else '.png'
+    output = Path(cache_dir) / f'{key}{suffix}'
+    tmp_path = output.with_name(f'{output.name}.{os.getpid()}.tmp')
+    try:
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+        if keep_original:
+            (Path(cache_dir) / f'{key}.orig').touch()
+            return result
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, output)
+    except OSError:
+        # 缓存目录不可写（只读HOME、磁盘已满等）：不缓存，优化结果写入临时目录
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+        if keep_original:
+            return result
+        try:
+            with tempfile.NamedTemporaryFile(prefix='wechat-optimized-', suffix=suffix, delete=False) as f:
+                f.write(data)
+            output = Path(f.name)
+        except OSError as e:
+            result['error'] = f'无法写入优化结果: {e}'
+            return result
+    result.update(output=str(output), optimized_bytes=len(data))
+    return result
+
+
+class ImageOptimizer:
+    """批量优化图片（多张时使用进程池）"""
+
+    def __init__(self, max_width: int = DEFAULT_MAX_WIDTH, target_bytes: int = DEFAULT_TARGET_BYTES,
+                 min_quality: int = DEFAULT_MIN_QUALITY, workers: Optional[int] = None,
+                 cache_dir: str = OPTIMIZE_CACHE_DIR):
+        self.max_width = max_width
+        self.target_bytes = target_bytes
+        self.min_quality = min_quality
+        self.workers = workers
+        self.cache_dir = cache_dir
+        if not PIL_AVAILABLE:
+            print("⚠ 未安装Pillow，跳过图片优化（pip install Pillow）")
+
+    def optimize_all(self, image_paths: List[Path]) -> Dict[Path, Dict[str, Any]]:
+        """优化多张图片，返回 原图路径 → 优化结果（未安装Pillow时返回空字典）"""
+        if not PIL_AVAILABLE or not image_paths:
+            return {}
+
+        args = [(str(path), self.max_width, self.target_bytes, self.min_quality, self.cache_dir)
+                for path in image_paths]
+        if len(image_paths) == 1 or self.workers == 1:
+            results = [optimize_image(*arg) for arg in args]
+        else:
+            try:
+                with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                    results = list(executor.map(optimize_image, *zip(*args)))
+            except (OSError, BrokenProcessPool) as e:
+                # 无法创建工作进程（受限环境）或工作进程异常退出时改为在当前进程中优化
+                print(f"  ⚠️ 图片优化进程池不可用，改为单进程优化: {e}")
+                results = [optimize_image(*arg) for arg in args]
+
+        for result in results:
+            if result['error']:
+                print(f"  ⚠️ 图片优化失败，使用原图 {os.path.basename(result['source'])}: {result['error']}")
+        return dict(zip(image_paths, results))
+
+    def optimize(self, image_path: str) -> str:
+        """优化一张图片，返回待上传的文件路径"""
+        results = self.optimize_all([Path(image_path)])
+        if not results:
+            return image_path
+        print_optimize_report(results.values())
+        return results[Path(image_path)]['output']
+
+
+def print_optimize_report(results) -> None:
+    """打印优化节省的字节数"""
+    results = list(results)
+    original = sum(r['original_bytes'] for r in results)
+    optimized = sum(r['optimized_bytes'] for r in results)
+    changed = sum(1 for r in results if r['output'] != r['source'])
+    cached = sum(1 for r in results if r['cached'])
+    if not original:
+        return
+    saved = original - optimized
+    print(f"  📉 图片优化: {changed}/{len(results)} 张已压缩（{cached} 张来自缓存），"
+          f"{original / 1024 / 1024:.2f}MB → {optimized / 1024 / 1024:.2f}MB，"
+          f"节省 {saved / 1024 / 1024:.2f}MB ({saved / original * 100:.0f}%)")
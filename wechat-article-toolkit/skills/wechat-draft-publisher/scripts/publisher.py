@@ -9,10 +9,64 @@ import os
 import sys
 import json
 import time
-import requests
 import argparse
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
+
+from wechat_transport import WeChatTransport, DEFAULT_TIMEOUT, DEFAULT_RETRIES, POOL_SIZE
+from upload_cache import UploadCache, content_hash, DEFAULT_MAX_AGE_DAYS
+from image_optimizer import (ImageOptimizer, print_optimize_report, DEFAULT_MAX_WIDTH, DEFAULT_TARGET_BYTES,
+                             DEFAULT_MIN_QUALITY)
+
+# 内容图片默认并发上传数
+DEFAULT_UPLOAD_WORKERS = 4
+
+# 正文图片接口（media/uploadimg）的限制：1MB以内的jpg/png
+CONTENT_IMAGE_MAX_BYTES = 1024 * 1024
+CONTENT_IMAGE_TYPES = ('image/jpeg', 'image/png')
+
+# 永久图片素材（封面）的限制：10MB以内的bmp/png/jpeg/gif
+MATERIAL_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+MATERIAL_IMAGE_TYPES = ('image/bmp', 'image/png', 'image/jpeg', 'image/gif')
+
+# 文件头 → MIME类型
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+)
+
+
+def detect_image_mime(data: bytes) -> Optional[str]:
+    """按文件头识别图片的MIME类型（不依赖扩展名），无法识别时返回None"""
+    for signature, mime in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return mime
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def needs_material_upload(image_path: str) -> bool:
+    """图片是否只能作为永久素材上传（永久素材接受、正文图片接口不接受的格式或大小）"""
+    try:
+        with open(image_path, 'rb') as f:
+            mime = detect_image_mime(f.read(16))
+        size = os.path.getsize(image_path)
+    except OSError:
+        return False
+    return mime in MATERIAL_IMAGE_TYPES and (mime not in CONTENT_IMAGE_TYPES or size > CONTENT_IMAGE_MAX_BYTES)
+
+
+def upload_name(original_path, upload_path) -> str:
+    """
+    上传使用的文件名：原图的文件名，扩展名取实际上传的文件
+
+    优化结果按哈希命名缓存，上传时仍用原图的名字；优化可能转换格式（如WebP转JPEG），扩展名以优化结果为准
+    """
+    return Path(original_path).stem + Path(upload_path).suffix
 
 
 class WeChatPublisher:
@@ -20,6 +74,7 @@ class WeChatPublisher:
 
     BASE_URL = "https://api.weixin.qq.com/cgi-bin"
     TOKEN_CACHE_FILE = os.path.expanduser("~/.wechat-publisher/token_cache.json")
+    UPLOAD_CACHE_DIR = os.path.expanduser("~/.wechat-publisher/upload_cache")
     CONFIG_FILE = os.path.expanduser("~/.wechat-publisher/config.json")
 
     # 微信API错误码映射
@@ -27,6 +82,9 @@ class WeChatPublisher:
         40001: "AppSecret错误或者AppSecret不属于这个AppID",
         40002: "请确保grant_type字段值为client_credential",
         40013: "不合法的AppID，请检查AppID是否正确",
+        40005: "不合法的文件类型（正文图片仅支持jpg/png）",
+        40007: "不合法的媒体文件id（素材可能已被删除）",
+        40009: "图片尺寸太大（正文图片不超过1MB）",
         40125: "无效的appsecret，请检查AppSecret是否正确",
         40164: "调用接口的IP地址不在白名单中",
         41001: "缺少access_token参数",
@@ -38,13 +96,33 @@ class WeChatPublisher:
         -1: "系统繁忙，请稍后重试"
     }
 
-    def __init__(self):
-        """初始化发布器"""
+    def __init__(self, transport: Optional[WeChatTransport] = None, upload_cache: bool = True,
+                 cache_max_age_days: Optional[float] = DEFAULT_MAX_AGE_DAYS,
+                 image_optimizer: Optional[ImageOptimizer] = None):
+        """
+        初始化发布器
+
+        Args:
+            transport: 共享的HTTP传输层（连接池、超时、重试、耗时统计），默认新建
+            upload_cache: 是否使用图片上传缓存（按内容哈希跳过已上传过的图片）
+            cache_max_age_days: 上传缓存记录的有效天数（None表示不过期）
+            image_optimizer: 上传前的图片优化（缩放、重新压缩），None表示上传原图
+        """
         self.appid = None
         self.appsecret = None
         self.access_token = None
+        self.transport = transport or WeChatTransport()
+        self.image_optimizer = image_optimizer
         self.load_config()
 
+        # 上传缓存按AppID分文件，不同公众号的素材互不混用
+        self.upload_cache = None
+        if upload_cache:
+            self.upload_cache = UploadCache(os.path.join(self.UPLOAD_CACHE_DIR, f"{self.appid}.json"),
+                                            max_age_days=cache_max_age_days)
+            if self.upload_cache.evicted:
+                print(f"✓ 已清理 {self.upload_cache.evicted} 条过期的图片上传缓存")
+
     def load_config(self):
         """加载配置文件，首次运行时启动配置向导"""
         if not os.path.exists(self.CONFIG_FILE):
@@ -175,8 +253,7 @@ class WeChatPublisher:
             'secret': self.appsecret
         }
 
-        response = requests.get(url, params=params)
-        result = response.json()
+        result = self.transport.get(url, params=params, idempotent=True)
 
         if 'errcode' in result:
             error_msg = self._handle_api_error(
@@ -203,23 +280,52 @@ class WeChatPublisher:
         print(f"✓ 获取access_token成功 (有效期: {expires_in}秒)")
         return access_token
 
-    def upload_image(self, image_path: str, return_url: bool = False):
+    def _read_image(self, image_path: str) -> Tuple[bytes, str]:
+        """读入图片（失败重试时可重新发送），返回 (内容, 按文件头识别的MIME类型)"""
+        if not os.path.exists(image_path):
+            raise FileNotFoundError(f"图片文件不存在: {image_path}")
+        with open(image_path, 'rb') as f:
+            image_data = f.read()
+        return image_data, detect_image_mime(image_data)
+
+    def upload_image(self, image_path: str, return_url: bool = False, access_token: Optional[str] = None,
+                     name: Optional[str] = None):
         """
-        上传图片到微信服务器
+        上传图片为永久素材（用于封面，得到 thumb_media_id；可在多个线程中同时调用）
+
+        正文中的图片请用 upload_content_image，不占用永久素材配额；正文图片接口不接受的
+        gif/bmp 和超过1MB的图片也用此方法上传，取返回的URL
 
         Args:
             image_path: 图片文件路径
-            return_url: 是否返回图片URL（用于内容图片）
+            return_url: 是否同时返回图片URL
+            access_token: 已取得的access_token（默认调用 get_access_token）
+            name: 上传和提示使用的文件名（上传优化后的文件时传原图的文件名，默认取 image_path 的文件名）
 
         Returns:
             media_id 或 (media_id, url) 元组
         """
-        if not os.path.exists(image_path):
-            raise FileNotFoundError(f"图片文件不存在: {image_path}")
-
-        print(f"→ 正在上传图片: {os.path.basename(image_path)}")
-
-        token = self.get_access_token()
+        image_data, mime = self._read_image(image_path)
+        name = name or os.path.basename(image_path)
+
+        if mime not in MATERIAL_IMAGE_TYPES:
+            raise ValueError(f"素材图片格式不支持: {name}（{mime or '未知格式'}），仅支持 bmp/png/jpeg/gif")
+        if len(image_data) > MATERIAL_IMAGE_MAX_BYTES:
+            raise ValueError(f"素材图片超过10MB: {name}（{len(image_data) / 1024 / 1024:.1f}MB）")
+
+        # 同样内容的图片上传过时直接使用缓存的media_id和URL
+        digest = content_hash(image_data)
+        if self.upload_cache is not None:
+            cached = self.upload_cache.get(digest, need_url=return_url, need_media_id=True)
+            if cached is not None:
+                print(f"✓ 图片已上传过，使用缓存: {name}")
+                if return_url:
+                    return cached['media_id'], cached['url']
+                return cached['media_id']
+
+        print(f"→ 正在上传图片: {name}")
+
+        token = access_token or self.get_access_token()
         url = f"{self.BASE_URL}/material/add_material"
 
         params = {
@@ -227,11 +333,8 @@ class WeChatPublisher:
             'type': 'image'
         }
 
-        with open(image_path, 'rb') as f:
-            files = {'media': (os.path.basename(image_path), f, 'image/jpeg')}
-            response = requests.post(url, params=params, files=files)
-
-        result = response.json()
+        files = {'media': (name, image_data, mime)}
+        result = self.transport.post(url, params=params, files=files)
 
         if 'errcode' in result and result['errcode'] != 0:
             error_msg = self._handle_api_error(
@@ -245,10 +348,107 @@ class WeChatPublisher:
         image_url = result.get('url', '')
         print(f"✓ 图片上传成功 (media_id: {media_id})")
 
+        if self.upload_cache is not None and media_id:
+            self.upload_cache.put(digest, media_id, image_url, name, len(image_data))
+
         if return_url:
             return media_id, image_url
         return media_id
 
+    def upload_content_image(self, image_path: str, access_token: Optional[str] = None,
+                             name: Optional[str] = None) -> str:
+        """
+        上传正文图片（media/uploadimg，不占用永久素材配额；可在多个线程中同时调用）
+
+        接口只接受1MB以内的jpg/png，发送前在本地检查（不符合的图片可用 upload_image 上传为永久素材）
+
+        Args:
+            image_path: 图片文件路径
+            access_token: 已取得的access_token（默认调用 get_access_token）
+            name: 上传和提示使用的文件名（默认取 image_path 的文件名）
+
+        Returns:
+            图片URL
+
+        Raises:
+            ValueError: 图片格式或大小不符合要求
+        """
+        image_data, mime = self._read_image(image_path)
+        name = name or os.path.basename(image_path)
+
+        if mime not in CONTENT_IMAGE_TYPES:
+            raise ValueError(f"正文图片仅支持jpg/png: {name}（{mime or '未知格式'}）")
+        if len(image_data) > CONTENT_IMAGE_MAX_BYTES:
+            raise ValueError(f"正文图片超过1MB: {name}（{len(image_data) / 1024:.0f}KB）")
+
+        digest = content_hash(image_data)
+        if self.upload_cache is not None:
+            cached = self.upload_cache.get(digest, need_url=True)
+            if cached is not None:
+                print(f"✓ 图片已上传过，使用缓存: {name}")
+                return cached['url']
+
+        print(f"→ 正在上传图片: {name}")
+
+        token = access_token or self.get_access_token()
+        url = f"{self.BASE_URL}/media/uploadimg"
+
+        files = {'media': (name, image_data, mime)}
+        result = self.transport.post(url, params={'access_token': token}, files=files)
+
+        if 'errcode' in result and result['errcode'] != 0:
+            error_msg = self._handle_api_error(
+                result['errcode'],
+                result.get('errmsg', 'Unknown error'),
+                context="上传正文图片"
+            )
+            raise Exception(error_msg)
+
+        image_url = result.get('url', '')
+        print(f"✓ 图片上传成功: {name}")
+
+        if self.upload_cache is not None and image_url:
+            self.upload_cache.put(digest, None, image_url, name, len(image_data))
+        return image_url
+
+    def verify_upload_cache(self, sample: int = 5) -> int:
+        """
+        抽查上传缓存：随机取 sample 条记录向素材接口确认素材仍然存在，已失效的从缓存中移除
+
+        Returns:
+            移除的记录数
+        """
+        import random
+
+        if self.upload_cache is None:
+            return 0
+        entries = [(digest, entry) for digest, entry in self.upload_cache.entries.items() if entry.get('media_id')]
+        if not entries:
+            print("✓ 上传缓存为空，无需检查")
+            return 0
+
+        picked = random.sample(entries, min(sample, len(entries)))
+        print(f"→ 正在抽查上传缓存 ({len(picked)}/{len(entries)} 条)...")
+        token = self.get_access_token()
+        url = f"{self.BASE_URL}/material/get_material"
+        removed = 0
+        for digest, entry in picked:
+            data = json.dumps({'media_id': entry['media_id']}).encode('utf-8')
+            result = self.transport.post(url, params={'access_token': token}, data=data,
+                                         idempotent=True, accept_binary=True)
+            errcode = result.get('errcode', 0)
+            if errcode == 0:
+                print(f"  ✓ {entry.get('name')} ({entry['media_id']})")
+            elif errcode == 40007:
+                # 不合法的media_id：素材已在后台被删除
+                self.upload_cache.remove(digest)
+                removed += 1
+                print(f"  ✗ {entry.get('name')} 素材已失效，已从缓存移除")
+            else:
+                print(f"  ⚠ {entry.get('name')} 检查失败: "
+                      f"{self._handle_api_error(errcode, result.get('errmsg', ''), '查询素材')}")
+        return removed
+
     def _remove_cover_image(self, content: str) -> str:
         """
         移除HTML中的封面图片
@@ -288,67 +488,106 @@ class WeChatPublisher:
 
         return content
 
-    def _upload_content_images(self, content: str, base_dir: str = ".") -> str:
+    def _upload_content_images(self, content: str, base_dir: str = ".",
+                               max_workers: int = DEFAULT_UPLOAD_WORKERS) -> str:
         """
         扫描HTML中的本地图片并上传到微信，替换为微信URL
 
+        先收集所有本地图片（同一文件只上传一次），在进程池中优化后并发上传，再一次性替换，
+        总耗时取决于最慢的一张而不是所有图片之和
+
         Args:
             content: HTML内容
             base_dir: 图片所在的基础目录
+            max_workers: 最多同时上传的图片数
 
         Returns:
             替换后的HTML内容
         """
         import re
         from pathlib import Path
+        from concurrent.futures import ThreadPoolExecutor
 
         # 正则匹配所有 <img src="本地路径"> 标签
-        img_pattern = r'<img([^>]*?)src=["\']([^"\']+)["\']([^>]*?)>'
-
-        uploaded_count = 0
+        img_pattern = re.compile(r'<img([^>]*?)src=["\']([^"\']+)["\']([^>]*?)>')
 
-        def replace_image(match):
-            nonlocal uploaded_count
-            before_src = match.group(1)
+        # 1. 收集需要上传的本地图片：src → 规范化的文件路径
+        sources: Dict[str, Path] = {}
+        for match in img_pattern.finditer(content):
             src = match.group(2)
-            after_src = match.group(3)
 
             # 跳过已经是HTTP/HTTPS的图片
             if src.startswith(('http://', 'https://')):
-                return match.group(0)
+                continue
 
             # 跳过封面图（已单独处理）
             if 'cover' in src.lower():
-                return match.group(0)
+                continue
+
+            if src in sources:
+                continue
 
             # 构建完整路径
             image_path = Path(base_dir) / src
 
             if not image_path.exists():
                 print(f"  ⚠️ 图片不存在，跳过: {src}")
-                return match.group(0)
+                continue
+            sources[src] = image_path.resolve()
 
-            try:
-                # 上传图片并获取URL
-                _, wechat_url = self.upload_image(str(image_path), return_url=True)
+        if not sources:
+            return content
 
-                if wechat_url:
-                    uploaded_count += 1
-                    # 替换为微信URL
-                    return f'<img{before_src}src="{wechat_url}"{after_src}>'
-                else:
-                    print(f"  ⚠️ 未获取到URL，保持原路径: {src}")
-                    return match.group(0)
+        unique_paths = sorted(set(sources.values()))
 
+        # 2. 上传前优化（缩放、重新压缩），失败或无需优化的图片上传原图
+        upload_paths = {path: path for path in unique_paths}
+        if self.image_optimizer is not None:
+            results = self.image_optimizer.optimize_all(unique_paths)
+            if results:
+                upload_paths.update((path, Path(result['output'])) for path, result in results.items())
+                print_optimize_report(results.values())
+
+        # 3. 按文件去重后并发上传（先取得token，避免各线程同时刷新）
+        token = self.get_access_token()
+
+        def upload(image_path: Path) -> Optional[str]:
+            upload_path = str(upload_paths[image_path])
+            name = upload_name(image_path, upload_path)
+            try:
+                if needs_material_upload(upload_path):
+                    # gif/bmp 或超过1MB的图片：正文图片接口不接受，改为上传永久素材并使用其URL
+                    print(f"  → 正文图片接口不支持，改为上传永久素材: {image_path.name}")
+                    _, wechat_url = self.upload_image(upload_path, return_url=True, access_token=token, name=name)
+                else:
+                    wechat_url = self.upload_content_image(upload_path, access_token=token, name=name)
             except Exception as e:
-                print(f"  ⚠️ 上传图片失败 {src}: {e}")
+                print(f"  ⚠️ 上传图片失败 {image_path.name}: {e}")
+                return None
+            if not wechat_url:
+                print(f"  ⚠️ 未获取到URL，保持原路径: {image_path.name}")
+            return wechat_url or None
+
+        hits_before = self.upload_cache.hits if self.upload_cache is not None else 0
+        print(f"  → 共 {len(unique_paths)} 张本地图片，并发上传（最多 {max_workers} 张同时进行）")
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            urls = dict(zip(unique_paths, executor.map(upload, unique_paths)))
+
+        # 4. 一次性替换为微信URL
+        def replace_image(match):
+            image_path = sources.get(match.group(2))
+            wechat_url = urls.get(image_path) if image_path else None
+            if not wechat_url:
                 return match.group(0)
+            return f'<img{match.group(1)}src="{wechat_url}"{match.group(3)}>'
 
-        # 执行替换
-        content = re.sub(img_pattern, replace_image, content)
+        content = img_pattern.sub(replace_image, content)
 
+        uploaded_count = sum(1 for url in urls.values() if url)
         if uploaded_count > 0:
-            print(f"  ✓ 成功上传 {uploaded_count} 张内容图片")
+            cached_count = self.upload_cache.hits - hits_before if self.upload_cache is not None else 0
+            cached_note = f"（其中 {cached_count} 张使用上传缓存）" if cached_count else ""
+            print(f"  ✓ 成功上传 {uploaded_count} 张内容图片{cached_note}")
 
         return content
 
@@ -636,7 +875,8 @@ class WeChatPublisher:
                     thumb_media_id: str = "",
                     digest: str = "",
                     show_cover_pic: int = 1,
-                    content_base_dir: str = ".") -> Dict[str, Any]:
+                    content_base_dir: str = ".",
+                    upload_workers: int = DEFAULT_UPLOAD_WORKERS) -> Dict[str, Any]:
         """
         创建草稿文章
 
@@ -648,6 +888,7 @@ class WeChatPublisher:
             digest: 摘要
             show_cover_pic: 是否显示封面，1显示，0不显示
             content_base_dir: 内容图片所在目录（默认当前目录）
+            upload_workers: 内容图片最多同时上传的数量
 
         Returns:
             创建结果
@@ -657,7 +898,7 @@ class WeChatPublisher:
 
         # 2. 上传内容中的其他图片并替换为微信URL
         print("\n→ 正在处理内容中的图片...")
-        content = self._upload_content_images(content, content_base_dir)
+        content = self._upload_content_images(content, content_base_dir, upload_workers)
 
         # 3. 修复微信编辑器的样式破坏问题
         content = self._fix_wechat_editor_issues(content)
@@ -744,8 +985,7 @@ class WeChatPublisher:
         headers = {'Content-Type': 'application/json; charset=utf-8'}
         # 手动序列化JSON，确保中文不被转义
         data = json.dumps(articles, ensure_ascii=False).encode('utf-8')
-        response = requests.post(url, data=data, headers=headers)
-        result = response.json()
+        result = self.transport.post(url, data=data, headers=headers)
 
         if 'errcode' in result and result['errcode'] != 0:
             # 如果是token过期，尝试刷新token后重试
@@ -755,8 +995,7 @@ class WeChatPublisher:
                 token = self.access_token
                 url = f"{self.BASE_URL}/draft/add?access_token={token}"
                 data = json.dumps(articles, ensure_ascii=False).encode('utf-8')
-                response = requests.post(url, data=data, headers=headers)
-                result = response.json()
+                result = self.transport.post(url, data=data, headers=headers)
 
                 if 'errcode' in result and result['errcode'] != 0:
                     error_msg = self._handle_api_error(
@@ -789,6 +1028,7 @@ def main():
   %(prog)s --title "文章标题" --content article.html
   %(prog)s --title "文章标题" --content article.html --cover cover.png --author "作者名"
   %(prog)s --interactive  # 交互式模式
+  %(prog)s --verify-cache 10  # 抽查10条图片上传缓存是否仍然有效
         """
     )
 
@@ -798,11 +1038,47 @@ def main():
     parser.add_argument('--cover', default='cover.png', help='封面图片路径（默认: cover.png）')
     parser.add_argument('-d', '--digest', help='文章摘要')
     parser.add_argument('--interactive', action='store_true', help='交互式模式')
+    parser.add_argument('--timeout', type=float, nargs=2, metavar=('CONNECT', 'READ'),
+                        default=DEFAULT_TIMEOUT, help='连接/读取超时秒数（默认: 5 30）')
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES,
+                        help=f'系统繁忙、5xx、连接失败时的最多重试次数（默认: {DEFAULT_RETRIES}）')
+    parser.add_argument('--metrics', action='store_true', help='结束时打印各API请求的耗时统计')
+    parser.add_argument('--upload-workers', type=int, default=DEFAULT_UPLOAD_WORKERS,
+                        help=f'内容图片最多同时上传的数量（默认: {DEFAULT_UPLOAD_WORKERS}）')
+    parser.add_argument('--no-upload-cache', action='store_true',
+                        help='不使用图片上传缓存（每张图片都重新上传）')
+    parser.add_argument('--cache-max-age', type=float, default=DEFAULT_MAX_AGE_DAYS, metavar='DAYS',
+                        help=f'图片上传缓存的有效天数，0表示不过期（默认: {DEFAULT_MAX_AGE_DAYS}）')
+    parser.add_argument('--verify-cache', type=int, nargs='?', const=5, metavar='N',
+                        help='向素材接口抽查N条上传缓存（默认5条），移除已失效的记录')
+    parser.add_argument('--no-optimize', action='store_true', help='不优化图片，直接上传原图')
+    parser.add_argument('--max-width', type=int, default=DEFAULT_MAX_WIDTH,
+                        help=f'图片缩放到的最大宽度（像素，默认: {DEFAULT_MAX_WIDTH}）')
+    parser.add_argument('--target-kb', type=int, default=DEFAULT_TARGET_BYTES // 1024,
+                        help=f'每张图片压缩的目标大小（KB，默认: {DEFAULT_TARGET_BYTES // 1024}）')
+    parser.add_argument('--min-quality', type=int, default=DEFAULT_MIN_QUALITY,
+                        help=f'JPEG压缩的最低质量（1-90，默认: {DEFAULT_MIN_QUALITY}）')
+    parser.add_argument('--optimize-workers', type=int, default=None,
+                        help='图片优化的进程数（默认: CPU核数）')
 
     args = parser.parse_args()
 
+    # 连接池不小于并发上传数，每个上传线程都能复用已建立的连接
+    transport = WeChatTransport(timeout=tuple(args.timeout), retries=args.retries,
+                                pool_size=max(POOL_SIZE, args.upload_workers))
     try:
-        publisher = WeChatPublisher()
+        image_optimizer = None
+        if not args.no_optimize:
+            image_optimizer = ImageOptimizer(max_width=args.max_width, target_bytes=args.target_kb * 1024,
+                                             min_quality=args.min_quality, workers=args.optimize_workers)
+        publisher = WeChatPublisher(transport=transport, upload_cache=not args.no_upload_cache,
+                                    cache_max_age_days=args.cache_max_age or None,
+                                    image_optimizer=image_optimizer)
+
+        if args.verify_cache is not None:
+            publisher.verify_upload_cache(args.verify_cache)
+            if not args.interactive and not args.title and not args.content:
+                return
 
         # 交互式模式
         if args.interactive:
@@ -842,7 +1118,10 @@ def main():
         # 上传封面（如果有）
         thumb_media_id = ""
         if cover and os.path.exists(cover):
-            thumb_media_id = publisher.upload_image(cover)
+            cover_name = os.path.basename(cover)
+            if image_optimizer is not None:
+                cover = image_optimizer.optimize(cover)
+            thumb_media_id = publisher.upload_image(cover, name=upload_name(cover_name, cover))
 
         # 创建草稿
         result = publisher.create_draft(
@@ -851,7 +1130,8 @@ def main():
             author=author,
             thumb_media_id=thumb_media_id,
             digest=digest,
-            content_base_dir=os.path.dirname(os.path.abspath(content_file)) or "."
+            content_base_dir=os.path.dirname(os.path.abspath(content_file)) or ".",
+            upload_workers=args.upload_workers
         )
 
         print(f"\n{'='*50}")
@@ -864,6 +1144,10 @@ def main():
     except Exception as e:
         print(f"\n✗ 错误: {e}")
         sys.exit(1)
+    finally:
+        if args.metrics:
+            transport.print_summary()
+        transport.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片上传缓存
+按图片内容哈希记录已上传的 media_id 和 URL，同一张图片再次发布时不再上传（节省带宽和永久素材配额）
+
+封面（永久素材）有 media_id 和 URL；正文图片（media/uploadimg）只有 URL，media_id 为 null
+
+每个AppID一个缓存文件（~/.wechat-publisher/upload_cache/<AppID>.json）：
+  {"version": 1, "entries": {"<sha256>": {"media_id": "...", "url": "...", "name": "a.png",
+                                         "size": 1234, "uploaded_at": 1700000000}}}
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Optional, Dict, Any
+
+# 缓存文件格式版本
+UPLOAD_CACHE_VERSION = 1
+
+# 默认的缓存有效天数（素材可能在公众号后台被删除，过旧的记录不再信任）
+DEFAULT_MAX_AGE_DAYS = 90
+
+
+def content_hash(data: bytes) -> str:
+    """图片内容哈希（缓存键）"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class UploadCache:
+    """图片上传缓存（线程安全，每次写入后立即落盘）"""
+
+    def __init__(self, path: str, max_age_days: Optional[float] = DEFAULT_MAX_AGE_DAYS):
+        self.path = path
+        self.max_age_days = max_age_days
+        self._lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = self._load()
+        self.hits = 0
+        self.evicted = self.evict_expired()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠ 读取上传缓存失败，将重新上传: {e}")
+            return {}
+        if cache.get('version') != UPLOAD_CACHE_VERSION:
+            return {}
+        return cache.get('entries', {})
+
+    def _save(self) -> None:
+        """
+        先写临时文件再原子替换（调用方持有锁）
+
+        缓存是可选的：写入失败（只读HOME、磁盘已满等）只提示，不影响已经成功的上传
+        """
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': UPLOAD_CACHE_VERSION, 'entries': self.entries}, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠ 写入上传缓存失败，本次不缓存: {e}")
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    def evict_expired(self) -> int:
+        """移除超过 max_age_days 的记录，返回移除数量"""
+        if not self.max_age_days:
+            return 0
+        cutoff = time.time() - self.max_age_days * 86400
+        with self._lock:
+            expired = [key for key, entry in self.entries.items() if entry.get('uploaded_at', 0) < cutoff]
+            for key in expired:
+                del self.entries[key]
+            if expired:
+                self._save()
+        return len(expired)
+
+    def get(self, digest: str, need_url: bool = False, need_media_id: bool = False) -> Optional[Dict[str, Any]]:
+        """查找缓存记录；need_url / need_media_id 时要求记录中有图片URL / media_id"""
+        with self._lock:
+            entry = self.entries.get(digest)
+            if entry is None or (need_url and not entry.get('url')) or (need_media_id and not entry.get('media_id')):
+                return None
+            self.hits += 1
+            return dict(entry)
+
+    def put(self, digest: str, media_id: Optional[str], url: str, name: str, size: int) -> None:
+        """
+        记录一次上传；同一图片先后作为正文图片和封面上传时，保留已有的 media_id
+
+        保留已有的 media_id 时也保留原来的上传时间，过期判断按该素材实际上传的时间计算
+        """
+        with self._lock:
+            previous = self.entries.get(digest, {})
+            keep_media_id = not media_id and previous.get('media_id')
+            self.entries[digest] = {
+                'media_id': media_id or previous.get('media_id'),
+                'url': url or previous.get('url', ''),
+                'name': name,
+                'size': size,
+                'uploaded_at': previous['uploaded_at'] if keep_media_id and 'uploaded_at' in previous
+                else int(time.time()),
+            }
+            self._save()
+
+    def remove(self, digest: str) -> None:
+        with self._lock:
+            if self.entries.pop(digest, None) is not None:
+                self._save()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+微信API HTTP传输层
+共享连接池（keep-alive复用TLS连接）、连接/读取超时、带抖动退避的有限重试、逐请求耗时统计
+"""
+
+import random
+import re
+import threading
+import time
+from typing import Optional, Dict, Any, List, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError, ConnectTimeoutError
+
+# 默认超时（秒）：连接超时, 读取超时
+DEFAULT_TIMEOUT = (5.0, 30.0)
+
+# 默认最多重试次数（不含第一次请求）
+DEFAULT_RETRIES = 3
+
+# 退避基数与上限（秒）：第n次重试前等待 random(0, min(上限, 基数 × 2^n))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+
+# 连接池大小（同一主机最多保持的连接数，应不小于并发上传数）
+POOL_SIZE = 10
+
+# 需要重试的微信错误码：系统繁忙
+RETRY_ERRCODES = {-1}
+
+
+class TransportError(Exception):
+    """请求在重试后仍然失败（超时、连接错误或服务器错误）"""
+
+
+def _failed_before_sending(error: requests.exceptions.ConnectionError) -> bool:
+    """连接阶段的失败（建立连接或TLS握手失败），请求没有发到服务器"""
+    if isinstance(error, requests.exceptions.SSLError):
+        return True
+    reason = error.args[0] if error.args else None
+    reason = getattr(reason, 'reason', reason)  # urllib3 的 MaxRetryError 包装了实际原因
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+class WeChatTransport:
+    """
+    微信API传输层（线程安全，可被多个线程共享）
+
+    重试策略：
+      - 幂等请求（idempotent=True）：连接失败、读取超时、5xx响应、errcode -1（系统繁忙）都重试
+      - 非幂等请求（创建草稿、上传素材等）：只在请求没有发到服务器时（连接超时、建立连接失败）重试；
+        5xx、系统繁忙、读取超时和发送后断开时服务器可能已处理，重试会重复创建草稿或素材
+    """
+
+    def __init__(self, timeout: Tuple[float, float] = DEFAULT_TIMEOUT, retries: int = DEFAULT_RETRIES,
+                 backoff: float = BACKOFF_BASE, max_backoff: float = BACKOFF_MAX, pool_size: int = POOL_SIZE):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # 逐请求记录：接口、状态、耗时、尝试次数、errcode
+        self.metrics: List[Dict[str, Any]] = []
+        self._metrics_lock = threading.Lock()
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> 'WeChatTransport':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _sleep_before_retry(self, attempt: int) -> None:
+        """全抖动指数退避，避免多个worker同时重试"""
+        time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+
+    def request(self, method: str, url: str, *, params: Optional[Dict[str, Any]] = None,
+                data: Optional[bytes] = None, files: Optional[Dict[str, Tuple[str, bytes, str]]] = None,
+                headers: Optional[Dict[str, str]] = None, idempotent: bool = False,
+                accept_binary: bool = False) -> Dict[str, Any]:
+        """
+        发送请求并解析JSON响应
+
+        Args:
+            files: 字段名 → (文件名, 内容, MIME类型)；使用bytes而不是文件对象，重试时可重新发送
+            idempotent: 重复执行无副作用（请求发出后失败也可重试）
+            accept_binary: 成功时返回文件内容而不是JSON的接口（如获取素材），
+                           返回 {'binary_size': 字节数}
+
+        Returns:
+            响应JSON（errcode非0的业务错误原样返回，由调用方处理）
+
+        Raises:
+            TransportError: 重试后仍然超时、连接失败、返回5xx或非JSON响应
+        """
+        endpoint = url.split('?', 1)[0].rsplit('/cgi-bin/', 1)[-1]
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            error = None
+            status = None
+            result = None
+            sent = True  # 请求是否可能已到达服务器
+            try:
+                response = self.session.request(method, url, params=params, data=data, files=files,
+                                                headers=headers, timeout=self.timeout)
+                status = response.status_code
+                if status >= 500:
+                    error = f'服务器错误 HTTP {status}'
+                else:
+                    try:
+                        result = response.json()
+                    except ValueError:
+                        if accept_binary and status == 200:
+                            result = {'binary_size': len(response.content)}
+                        else:
+                            error = f'无法解析的响应 (HTTP {status})'
+            except requests.exceptions.ConnectTimeout:
+                error = f'连接超时（{self.timeout[0]}秒）'
+                sent = False
+            except requests.exceptions.ReadTimeout:
+                error = f'读取超时（{self.timeout[1]}秒）'
+            except requests.exceptions.ConnectionError as e:
+                # 异常信息中含请求URL，隐去其中的access_token
+                error = '连接失败: ' + re.sub(r'access_token=[^&\s)]+', 'access_token=***', str(e))
+                sent = not _failed_before_sending(e)
+
+            retryable = error is not None or result.get('errcode') in RETRY_ERRCODES
+            # 非幂等请求发出后失败时服务器可能已处理，不重试
+            unsafe = retryable and sent and not idempotent
+            if not retryable or unsafe or attempt >= self.retries:
+                errcode = result.get('errcode') if result else None
+                self._record(endpoint, method, status, start, attempt + 1, error, errcode)
+                if error is not None and unsafe:
+                    raise TransportError(f'{endpoint} {error}，请求可能已被处理，未自动重试')
+                if error is not None:
+                    raise TransportError(f'{endpoint} {error}（已尝试 {attempt + 1} 次）')
+                return result
+
+            reason = error or f'errcode {result.get("errcode")}'
+            print(f"  ⚠ {endpoint} {reason}，第 {attempt + 1} 次重试...")
+            self._sleep_before_retry(attempt)
+            attempt += 1
+
+    def get(self, url: str, **kwargs) -> Dict[str, Any]:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> Dict[str, Any]:
+        return self.request('POST', url, **kwargs)
+
+    def _record(self, endpoint: str, method: str, status: Optional[int], start: float, attempts: int,
+                error: Optional[str] = None, errcode: Optional[int] = None) -> None:
+        entry = {
+            'endpoint': endpoint,
+            'method': method,
+            'status': status,
+            'elapsed': time.perf_counter() - start,
+            'attempts': attempts,
+            'errcode': errcode,
+            'error': error,
+        }
+        with self._metrics_lock:
+            self.metrics.append(entry)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """按接口汇总：请求数、重试次数、失败数、耗时（平均、最大，秒）"""
+        with self._metrics_lock:
+            metrics = list(self.metrics)
+        summary: Dict[str, Dict[str, Any]] = {}
+        for entry in metrics:
+            item = summary.setdefault(entry['endpoint'], {'count': 0, 'retries': 0, 'failed': 0,
+                                                          'total': 0.0, 'max': 0.0})
+            item['count'] += 1
+            item['retries'] += entry['attempts'] - 1
+            item['failed'] += bool(entry['error'] or entry['errcode'])
+            item['total'] += entry['elapsed']
+            item['max'] = max(item['max'], entry['elapsed'])
+        for item in summary.values():
+            item['avg'] = item['total'] / item['count']
+        return summary
+
+    def print_summary(self) -> None:
+        """打印请求耗时统计"""
+        summary = self.summary()
+        if not summary:
+            return
+        print("\n📊 API请求统计")
+        for endpoint, item in sorted(summary.items(), key=lambda kv: -kv[1]['total']):
+            print(f"  {endpoint:28s} {item['count']:3d} 次  平均 {item['avg'] * 1000:6.0f}ms  "
+                  f"最大 {item['max'] * 1000:6.0f}ms  重试 {item['retries']}  失败 {item['failed']}")